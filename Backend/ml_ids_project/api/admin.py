@@ -3,6 +3,7 @@ from django.urls import path, reverse
 from django.shortcuts import redirect
 from django.contrib import messages
 from .models import NetworkTraffic, ThreatIncident, ResponseRule, LogEntry
+from .rollups import clear_traffic
 
 
 @admin.register(NetworkTraffic)
@@ -25,7 +26,7 @@ class NetworkTrafficAdmin(admin.ModelAdmin):
 		return custom_urls + urls
 
 	def clear_all(self, request):
-		deleted_count, _ = NetworkTraffic.objects.all().delete()
+		deleted_count = clear_traffic()
 		messages.success(request, f"Deleted {deleted_count} traffic records.")
 		return redirect(reverse("admin:api_networktraffic_changelist"))
 
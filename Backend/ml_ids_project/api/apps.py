@@ -4,3 +4,24 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.conf import settings
+        from django.db.models.signals import post_delete, post_save, pre_save
+
+        from . import instrumentation
+        from .models import NetworkTraffic, ResponseRule
+        from .rollups import traffic_post_delete, traffic_post_save, traffic_pre_save
+        from .rule_engine import engine
+
+        instrumentation.registry.enabled = getattr(settings, "IDS_METRICS_ENABLED", True)
+
+        # Recompile the cached rule set whenever a rule changes
+        post_save.connect(engine.invalidate, sender=ResponseRule, dispatch_uid="rule_engine_save")
+        post_delete.connect(engine.invalidate, sender=ResponseRule, dispatch_uid="rule_engine_delete")
+
+        # Keep the traffic rollups in step with rows saved or deleted one at a time
+        # (the batched TrafficWriter path uses bulk_create and folds its rows in itself)
+        pre_save.connect(traffic_pre_save, sender=NetworkTraffic, dispatch_uid="rollups_pre_save")
+        post_save.connect(traffic_post_save, sender=NetworkTraffic, dispatch_uid="rollups_post_save")
+        post_delete.connect(traffic_post_delete, sender=NetworkTraffic, dispatch_uid="rollups_post_delete")
@@ -0,0 +1,443 @@
+"""
+Stage-by-stage throughput benchmark of the detection pipeline.
+
+Each stage times one step of the live path on the same synthetic traffic:
+
+    generate         building the synthetic Scapy packets and their frame bytes
+    extract          PacketFeatureExtractor.process_frame with Scapy dissection (the
+                     capture service's packet handler)
+    extract_fast     the same with the struct-based decoder
+    predict          KNNAnomalyDetector.predict, one record at a time
+    predict_batch    KNNAnomalyDetector.predict_batch, `batch_size` records per call
+    persist          save_traffic_and_incidents, one row (and incident) per call
+    persist_batched  save_traffic_and_incidents through a TrafficWriter
+
+Traffic is generated from a fixed seed, so every stage (and every run) sees
+the same packets. A stage reports packets per second, p50/p99/mean/max call
+latency and the peak RSS of the process that ran it; run_stages() gives every
+stage its own process so peak RSS is per stage. The persist stages write to a
+scratch database that is created and dropped around them, never to the
+configured one. Results are plain dicts (see benchmark_document) so runs can
+be stored as JSON and compared with compare_results().
+"""
+
+import asyncio
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from scapy.layers.inet import IP, TCP, UDP
+from scapy.layers.l2 import Ether
+from scapy.packet import Raw
+
+from .pipeline import PacketFeatureExtractor, apply_prediction
+from .utils.knn_classifier import KNNAnomalyDetector
+from .utils.neighbor_backends import build_neighbors_model
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGES = ("generate", "extract", "extract_fast", "predict", "predict_batch", "persist", "persist_batched")
+MODELS = ("auto", "shipped", "synthetic")
+# Version of the result document; bump when fields change meaning
+SCHEMA_VERSION = 1
+
+DEFAULT_PARAMS = {
+    "packets": 20000,
+    "flows": 500,
+    "seed": 42,
+    "batch_size": 64,
+    "model": "auto",
+    "reference_rows": 20000,
+    "anomaly_rate": 0.05,
+    "rules": 20,
+}
+
+_TCP_PORTS = (80, 443, 22, 25, 3306, 8080)
+_UDP_PORTS = (53, 123, 161, 5353)
+_TCP_FLAGS = ("A", "PA", "PA", "A", "FA")
+
+
+def synthetic_frames(count, flows=500, seed=42):
+    """
+    Build a deterministic mix of TCP and UDP traffic over a fixed set of flows.
+
+    Returns:
+        List of (link-layer class, frame bytes, capture timestamp)
+    """
+    return [frame for frame, _ in _synthetic_traffic(count, flows, seed)]
+
+
+def _synthetic_traffic(count, flows, seed):
+    """Yield ((Ether, frame bytes, timestamp), nanoseconds spent building the packet)."""
+    rng = random.Random(seed)
+    endpoints = []
+    for i in range(max(1, flows)):
+        client = f"10.{i // 250 % 250}.{i % 250}.{rng.randint(1, 254)}"
+        server = f"192.168.{rng.randint(0, 3)}.{rng.randint(1, 254)}"
+        if rng.random() < 0.7:
+            endpoints.append((TCP, client, server, rng.randint(20000, 60000), rng.choice(_TCP_PORTS)))
+        else:
+            endpoints.append((UDP, client, server, rng.randint(20000, 60000), rng.choice(_UDP_PORTS)))
+    started = set()
+    ts = 1700000000.0
+    for _ in range(count):
+        index = rng.randrange(len(endpoints))
+        transport, client, server, sport, dport = endpoints[index]
+        outbound = rng.random() < 0.6
+        payload = b"\x00" * rng.choice((0, 0, 64, 512, 1400))
+        ts += rng.expovariate(1000.0)
+        begin = time.perf_counter_ns()
+        if transport is TCP:
+            flags = _TCP_FLAGS[rng.randrange(len(_TCP_FLAGS))] if index in started else "S"
+            started.add(index)
+            layer = TCP(sport=sport, dport=dport, flags=flags) if outbound else TCP(sport=dport, dport=sport, flags=flags)
+        else:
+            layer = UDP(sport=sport, dport=dport) if outbound else UDP(sport=dport, dport=sport)
+        ip = IP(src=client, dst=server) if outbound else IP(src=server, dst=client)
+        frame = bytes(Ether() / ip / layer / Raw(payload))
+        yield (Ether, frame, ts), time.perf_counter_ns() - begin
+
+
+def synthetic_detector(features, reference_rows=20000, n_neighbors=7, seed=42):
+    """
+    A detector over random reference rows, for timing inference when no model is trained.
+
+    Its predictions are meaningless; only the search cost (reference set size,
+    feature count, neighbor backend) matters.
+    """
+    rng = np.random.default_rng(seed)
+    X = rng.lognormal(mean=2.0, sigma=1.5, size=(max(n_neighbors, reference_rows), len(features)))
+    detector = KNNAnomalyDetector()
+    detector.selected_features = list(features)
+    X = detector._vectorize([dict(zip(features, row)) for row in X], scale=False)
+    detector.scaler = StandardScaler().fit(X)
+    detector.model = build_neighbors_model("auto", n_neighbors=n_neighbors).fit(
+        detector.scaler.transform(X), rng.integers(0, 2, size=len(X))
+    )
+    detector.neighbor_backend = {"name": "auto"}
+    detector._plan = None
+    return detector
+
+
+def load_detector(model="auto", reference_rows=20000, seed=42):
+    """
+    The detector to benchmark and where it came from ("shipped" or "synthetic").
+
+    "auto" uses the trained model under model/unsw_tabular if it exists.
+    """
+    from .detector import DETECTOR_PATHS, features_path
+
+    if model != "synthetic" and all(os.path.exists(path) for path in DETECTOR_PATHS):
+        return KNNAnomalyDetector(*DETECTOR_PATHS), "shipped"
+    if model == "shipped":
+        raise FileNotFoundError(f"Model not found: {DETECTOR_PATHS[0]}")
+    if os.path.exists(features_path):
+        with open(features_path) as f:
+            features = json.load(f)["selected_features"]
+    else:
+        _, features, _, _ = KNNAnomalyDetector.build_feature_sets(None)
+        features = sorted(features)
+    return synthetic_detector(features, reference_rows=reference_rows, seed=seed), "synthetic"
+
+
+def latency_summary(latencies_ns):
+    """p50/p99/mean/max of call latencies, in milliseconds."""
+    if not latencies_ns:
+        return {"p50": None, "p99": None, "mean": None, "max": None}
+    values = np.asarray(latencies_ns, dtype=float) / 1e6
+    p50, p99 = np.percentile(values, [50, 99])
+    return {
+        "p50": round(float(p50), 4),
+        "p99": round(float(p99), 4),
+        "mean": round(float(values.mean()), 4),
+        "max": round(float(values.max()), 4),
+    }
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far (None where getrusage is unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _extracted_records(params):
+    extractor = PacketFeatureExtractor(decoder="fast")
+    records = []
+    for layer_cls, frame, ts in synthetic_frames(params["packets"], params["flows"], params["seed"]):
+        records.extend(extractor.process_frame(layer_cls, frame, ts))
+    return records
+
+
+def _time_calls(calls):
+    """Run zero-argument callables, returning (per-call latencies in ns, elapsed seconds)."""
+    latencies = []
+    started = time.perf_counter()
+    for call in calls:
+        begin = time.perf_counter_ns()
+        call()
+        latencies.append(time.perf_counter_ns() - begin)
+    return latencies, time.perf_counter() - started
+
+
+def _stage_generate(params):
+    latencies = []
+    started = time.perf_counter()
+    for _, elapsed_ns in _synthetic_traffic(params["packets"], params["flows"], params["seed"]):
+        latencies.append(elapsed_ns)
+    return {"packets": len(latencies)}, latencies, time.perf_counter() - started
+
+
+def _stage_extract(params, decoder="scapy"):
+    frames = synthetic_frames(params["packets"], params["flows"], params["seed"])
+    extractor = PacketFeatureExtractor(decoder=decoder)
+    records = 0
+
+    def call(frame):
+        def process():
+            nonlocal records
+            records += len(extractor.process_frame(*frame))
+        return process
+
+    latencies, elapsed = _time_calls(call(frame) for frame in frames)
+    return (
+        {"packets": len(frames), "records": records, "dissected_fallbacks": extractor.dissected_fallbacks},
+        latencies,
+        elapsed,
+    )
+
+
+def _stage_predict(params):
+    records = _extracted_records(params)
+    detector, source = load_detector(params["model"], params["reference_rows"], params["seed"])
+    latencies, elapsed = _time_calls(lambda record=record: detector.predict(record) for record in records)
+    return {"packets": len(records), "model": source}, latencies, elapsed
+
+
+def _stage_predict_batch(params):
+    records = _extracted_records(params)
+    detector, source = load_detector(params["model"], params["reference_rows"], params["seed"])
+    size = max(1, params["batch_size"])
+    batches = [records[i:i + size] for i in range(0, len(records), size)]
+    latencies, elapsed = _time_calls(lambda batch=batch: detector.predict_batch(batch) for batch in batches)
+    return {"packets": len(records), "model": source, "batch_size": size}, latencies, elapsed
+
+
+@contextmanager
+def scratch_database():
+    """Create and migrate a throwaway copy of the default database, dropping it afterwards."""
+    from django.db import connection
+
+    directory = tempfile.mkdtemp(prefix="ids-benchmark-")
+    old_name = connection.settings_dict["NAME"]
+    if connection.vendor == "sqlite":
+        # A file rather than Django's in-memory test database, like the real one
+        connection.settings_dict.setdefault("TEST", {})["NAME"] = os.path.join(directory, "benchmark.sqlite3")
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def _labelled_records(params):
+    """Extracted records with a fixed share marked anomalous, independent of the model."""
+    rng = random.Random(params["seed"])
+    records = []
+    for record in _extracted_records(params):
+        anomalous = rng.random() < params["anomaly_rate"]
+        records.append(apply_prediction(record, {
+            "label": "Anomalous" if anomalous else "Normal",
+            "prediction": int(anomalous),
+            "confidence": 1.0,
+        }))
+    return records
+
+
+def _create_rules(count):
+    from .models import ResponseRule
+
+    severities = ("critical", "high", "medium", "low")
+    threats = ("tcp", "udp", "dos/syn_flood", "dns_anomaly", "http_anomaly")
+    ResponseRule.objects.bulk_create(
+        ResponseRule(
+            name=f"benchmark-{i}",
+            condition=f"severity={severities[i % len(severities)]},threat_type={threats[i % len(threats)]}",
+            action="alert",
+            is_active=True,
+        )
+        for i in range(count)
+    )
+
+
+def _stage_persist(params, batched=False):
+    from django.conf import settings
+    from .db_utils import TrafficWriter, save_traffic_and_incidents
+    from .rule_engine import engine as rule_engine
+
+    records = _labelled_records(params)
+    with scratch_database():
+        _create_rules(params["rules"])
+        rule_engine.invalidate()
+        writer = TrafficWriter.from_settings(settings) if batched else None
+        if writer is not None:
+            writer.start()
+        loop = asyncio.new_event_loop()
+        incidents = 0
+
+        def call(record):
+            def save():
+                nonlocal incidents
+                if loop.run_until_complete(save_traffic_and_incidents(record, writer=writer)):
+                    incidents += 1
+            return save
+
+        try:
+            latencies, elapsed = _time_calls(call(record) for record in records)
+            # Rows still buffered count towards the stage's time
+            started = time.perf_counter()
+            if writer is not None:
+                writer.stop()
+            rule_engine.flush()
+            elapsed += time.perf_counter() - started
+        finally:
+            loop.close()
+        extra = {"packets": len(records), "incidents": incidents}
+        if writer is not None:
+            extra.update(dropped=writer.dropped, batches=writer.batches)
+    rule_engine.invalidate()
+    return extra, latencies, elapsed
+
+
+_STAGE_FUNCTIONS = {
+    "generate": _stage_generate,
+    "extract": _stage_extract,
+    "extract_fast": lambda params: _stage_extract(params, decoder="fast"),
+    "predict": _stage_predict,
+    "predict_batch": _stage_predict_batch,
+    "persist": _stage_persist,
+    "persist_batched": lambda params: _stage_persist(params, batched=True),
+}
+
+
+def run_stage(stage, params=None):
+    """
+    Run one benchmark stage in this process.
+
+    Args:
+        stage: One of STAGES
+        params: Overrides of DEFAULT_PARAMS
+
+    Returns:
+        Stage result dict (packets, packets_per_s, latency_ms, peak_rss_mb, ...)
+    """
+    if stage not in _STAGE_FUNCTIONS:
+        raise ValueError(f"Unknown benchmark stage '{stage}' (expected one of {', '.join(STAGES)})")
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    extra, latencies, elapsed = _STAGE_FUNCTIONS[stage](params)
+    packets = extra.pop("packets")
+    return {
+        "stage": stage,
+        "packets": packets,
+        "calls": len(latencies),
+        "elapsed_s": round(elapsed, 4),
+        "packets_per_s": round(packets / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": latency_summary(latencies),
+        "peak_rss_mb": peak_rss_mb(),
+        **extra,
+    }
+
+
+def _run_isolated_stage(stage, params):
+    import django
+    django.setup()
+    return run_stage(stage, params)
+
+
+def run_stages(stages=STAGES, params=None, isolate=True):
+    """
+    Run several stages in order.
+
+    With `isolate`, each stage runs in a fresh spawned process so its peak RSS
+    is its own; otherwise they share this process and peak RSS only grows.
+    """
+    results = []
+    for stage in stages:
+        if isolate:
+            # Executor workers are not daemonic, so scikit-learn may still parallelize
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                results.append(pool.submit(_run_isolated_stage, stage, params).result())
+        else:
+            results.append(run_stage(stage, params))
+    return results
+
+
+def benchmark_document(results, params=None):
+    """The JSON document of a benchmark run: environment, parameters and stage results."""
+    return {
+        "schema": SCHEMA_VERSION,
+        "benchmark": "pipeline",
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "params": {**DEFAULT_PARAMS, **(params or {})},
+        "stages": results,
+    }
+
+
+def compare_results(results, baseline, tolerance=0.2):
+    """
+    Stage metrics that regressed against a baseline document.
+
+    A stage regresses when its packets/s falls, or its p99 latency grows, by
+    more than `tolerance` (a fraction) relative to the baseline. Stages missing
+    from either side are skipped.
+
+    Returns:
+        List of {"stage", "metric", "baseline", "current", "change"} dicts
+    """
+    previous = {result["stage"]: result for result in baseline.get("stages", ())}
+    regressions = []
+    for result in results:
+        before = previous.get(result["stage"])
+        if before is None:
+            continue
+        checks = (
+            ("packets_per_s", before.get("packets_per_s"), result.get("packets_per_s"), -1),
+            ("p99_ms", (before.get("latency_ms") or {}).get("p99"), (result.get("latency_ms") or {}).get("p99"), 1),
+        )
+        for metric, old, new, direction in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change * direction > tolerance:
+                regressions.append({
+                    "stage": result["stage"],
+                    "metric": metric,
+                    "baseline": old,
+                    "current": new,
+                    "change": round(change, 4),
+                })
+    return regressions
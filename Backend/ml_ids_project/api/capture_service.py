@@ -0,0 +1,330 @@
+"""
+Long-lived capture/detection service shared by all WebSocket clients.
+
+One service per process sniffs, extracts features, classifies, persists and
+publishes every record to the TRAFFIC_GROUP channel-layer group. WebSocket
+consumers only subscribe to that group, so CPU use does not depend on how many
+dashboards are open. The service starts with the ASGI app on the first client
+connection (IDS_CAPTURE_AUTOSTART) or standalone via `manage.py run_capture`.
+"""
+
+import asyncio
+import atexit
+import threading
+import time
+from collections import deque
+
+from channels.layers import get_channel_layer
+from django.conf import settings
+from scapy.all import conf, sniff
+
+from . import instrumentation as metrics
+from .db_utils import TrafficWriter, save_traffic_and_incidents  # pyright: ignore[reportMissingImports]
+from .detector import DETECTOR_PATHS, detector_handle, get_detector
+from .pipeline import PacketFeatureExtractor, ShardedPipeline, apply_prediction, extractor_config
+from .rule_engine import engine as rule_engine
+from .utils.inference_batcher import InferenceBatcher
+
+
+TRAFFIC_GROUP = "traffic"
+
+# Live buffer of enriched items for REST exposure
+live_buffer = deque(maxlen=1000)
+
+
+def load_detector():
+    """Handle on the shared detector (follows model reloads), or None if there is no model."""
+    try:
+        get_detector()
+        return detector_handle()
+    except Exception:
+        # If model not found, run without a detector
+        # (will be used for packet collection, not classification)
+        return None
+
+
+class CaptureService:
+    """Sniff, classify, persist and publish live traffic once for all subscribers."""
+
+    def __init__(self, loop, channel_layer=None, iface=None, bpf_filter="ip"):
+        """
+        Initialize the service.
+
+        Args:
+            loop: Event loop that runs persistence and channel-layer publishing
+            channel_layer: Channels layer to publish to (defaults to the configured one)
+            iface: Interface to sniff on (defaults to Scapy's default interface)
+            bpf_filter: BPF capture filter
+        """
+        self.loop = loop
+        self.channel_layer = channel_layer or get_channel_layer()
+        self.iface = iface
+        self.bpf_filter = bpf_filter
+        self.detector = load_detector()
+        self.extractor = PacketFeatureExtractor.from_settings(settings)
+        # Traffic rows are written in bulk batches off the event loop
+        self.writer = TrafficWriter.from_settings(settings)
+        self.batcher = None
+        self.pipeline = None
+        # Records scheduled on the loop but not dispatched yet, at most publish_limit
+        self.publish_limit = getattr(settings, "IDS_PUBLISH_MAX_PENDING", 10000)
+        self.publish_dropped = 0
+        self._publishing = 0
+        self._publish_cond = threading.Condition()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    def start(self):
+        workers = getattr(settings, "IDS_PIPELINE_WORKERS", 0)
+        batch_size = getattr(settings, "IDS_INFERENCE_BATCH_SIZE", 64)
+        max_wait_ms = getattr(settings, "IDS_INFERENCE_MAX_WAIT_MS", 20)
+        self.writer.start()
+        # Flush buffered traffic rows even if the process exits without stop()
+        atexit.register(self.stop)
+        if workers > 0:
+            # Feature extraction and classification run in worker processes
+            self.pipeline = ShardedPipeline(
+                workers,
+                on_record=self._publish,
+                detector_paths=DETECTOR_PATHS if self.detector is not None else None,
+                config=extractor_config(settings),
+                batch_size=batch_size,
+                max_wait_ms=max_wait_ms,
+                collect_metrics=metrics.registry.enabled,
+            ).start()
+        else:
+            # Micro-batched KNN inference between capture and publishing
+            self.batcher = InferenceBatcher(
+                self.detector,
+                on_result=self._on_prediction,
+                max_batch_size=batch_size,
+                max_wait_ms=max_wait_ms,
+                on_batch=self._on_inference_batch,
+            ).start()
+            if self.extractor.classify_mode == "flow":
+                self._start_thread(self._expire_flows, "ids-flow-expiry")
+        self._register_metrics()
+        self._start_thread(self._sniff, "ids-capture")
+        print("Capture service started. Live packet capture (Scapy) running...")
+        return self
+
+    def stop(self):
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        if self.batcher is not None:
+            self.batcher.stop(timeout=5.0)
+        if self.pipeline is not None:
+            self.pipeline.stop()
+        # Records the batcher or workers just flushed still have to reach the writer
+        self._wait_published(timeout=5.0)
+        self.writer.stop(timeout=10.0)
+        # Write rule matches still buffered
+        try:
+            rule_engine.flush()
+        except Exception as e:
+            metrics.ERRORS.labels("rule_flush").inc()
+            print(f"Failed to flush rule matches: {e}")
+
+    def _extractor_stats(self):
+        """PacketFeatureExtractor.stats of this process, or summed over the pipeline workers."""
+        if self.pipeline is not None:
+            return self.pipeline.extractor_stats()
+        return self.extractor.stats
+
+    def _queue_depths(self):
+        depths = {
+            "publish": self._publishing,
+            "db_writer": self.writer.stats["pending"],
+            "rule_matches": rule_engine.pending,
+        }
+        if self.pipeline is not None:
+            depths.update(self.pipeline.queue_depths())
+        if self.batcher is not None:
+            depths["inference"] = self.batcher.qsize()
+        return depths
+
+    def _register_metrics(self):
+        """Have the scrape read the counts the pipeline already keeps."""
+        def stat(key):
+            return lambda: self._extractor_stats().get(key, 0)
+
+        metrics.PACKETS_PROCESSED.set_function(stat("packets"))
+        metrics.PACKETS_DISSECTED.set_function(stat("dissected_fallbacks"))
+        metrics.FLOWS_ACTIVE.set_function(stat("flows_live"))
+        for event in ("created", "finished", "dropped"):
+            metrics.FLOWS.labels(event).set_function(stat(f"flows_{event}"))
+        if self.pipeline is not None:
+            metrics.PACKETS_DROPPED.labels("queue_full").set_function(lambda: self.pipeline.dropped)
+        for outcome in ("written", "dropped", "failed"):
+            metrics.DB_ROWS.labels(outcome).set_function(lambda outcome=outcome: self.writer.stats[outcome])
+        for name in self._queue_depths():
+            metrics.QUEUE_DEPTH.labels(name).set_function(lambda name=name: self._queue_depths()[name])
+
+    def _on_inference_batch(self, size, seconds, failed):
+        metrics.INFERENCE_SECONDS.observe(seconds)
+        if failed:
+            metrics.ERRORS.labels("inference").inc()
+
+    def _start_thread(self, target, name):
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _sniff(self):
+        if self.extractor.decoder == "fast":
+            self._capture_frames()
+            return
+        prn = self.pipeline.submit if self.pipeline is not None else self._handle_packet
+        # Start Scapy sniffing (requires admin privileges and Npcap on Windows)
+        sniff(
+            filter=self.bpf_filter,
+            iface=self.iface,
+            prn=prn,
+            store=False,
+            stop_filter=lambda _: self._stopping.is_set(),
+        )
+
+    def _capture_frames(self):
+        """Read raw frames without Scapy dissection (IDS_PACKET_DECODER = "fast")."""
+        handle = self.pipeline.submit_frame if self.pipeline is not None else self._handle_frame
+        sock = conf.L2listen(iface=self.iface, filter=self.bpf_filter)
+        try:
+            while not self._stopping.is_set():
+                if not sock.select([sock], 0.5):
+                    continue
+                layer_cls, frame, _ = sock.recv_raw()
+                if frame is not None:
+                    handle(layer_cls, frame)
+        finally:
+            sock.close()
+
+    def _handle_packet(self, pkt):
+        metrics.PACKETS_CAPTURED.inc()
+        started = metrics.registry.clock()
+        try:
+            records = self.extractor.process(pkt)
+            metrics.EXTRACT_SECONDS.observe_since(started)
+            self._submit_records(records)
+        except Exception as e:
+            metrics.PACKET_ERRORS.inc()
+            print(f"Error processing a Scapy packet: {e}")
+
+    def _handle_frame(self, layer_cls, frame):
+        metrics.PACKETS_CAPTURED.inc()
+        started = metrics.registry.clock()
+        try:
+            records = self.extractor.process_frame(layer_cls, frame)
+            metrics.EXTRACT_SECONDS.observe_since(started)
+            self._submit_records(records)
+        except Exception as e:
+            metrics.PACKET_ERRORS.inc()
+            print(f"Error processing a captured frame: {e}")
+
+    def _submit_records(self, records):
+        for record in records:
+            # Classify against the record's flow metrics in the next micro-batch
+            self.batcher.submit(record, record)
+
+    def _expire_flows(self):
+        """Expire idle flows even when no new packets arrive to trigger it."""
+        while not self._stopping.wait(1.0):
+            for record in self.extractor.expire(time.time()):
+                self.batcher.submit(record, record)
+
+    def _on_prediction(self, data, result):
+        """Apply a batched KNN result to its record and publish it (batcher thread)."""
+        self._publish(apply_prediction(data, result))
+
+    def _publish(self, data):
+        with self._publish_cond:
+            if self._publishing >= self.publish_limit:
+                # The event loop is not keeping up; don't queue coroutines without bound
+                self.publish_dropped += 1
+                metrics.RECORDS_DROPPED.inc()
+                return
+            self._publishing += 1
+        if metrics.registry.enabled:
+            metrics.RECORDS.labels(data.get("status") or "Unclassified").inc()
+        # Add to live buffer for REST exposure
+        try:
+            live_buffer.append(dict(data))
+        except Exception:
+            pass
+
+        try:
+            asyncio.run_coroutine_threadsafe(self._dispatch(data), self.loop)
+        except RuntimeError:
+            # Event loop is shutting down or closed (e.g., during reload/stop).
+            self._published()
+            return
+        except Exception as e:
+            # Log and continue; we don't want a background packet to crash capture
+            self._published()
+            metrics.ERRORS.labels("publish").inc()
+            print(f"Failed to schedule record publishing: {e}")
+
+    def _published(self):
+        with self._publish_cond:
+            self._publishing -= 1
+            if not self._publishing:
+                self._publish_cond.notify_all()
+
+    def _wait_published(self, timeout):
+        """Wait until every scheduled record has been dispatched (unless called on the loop itself)."""
+        try:
+            if asyncio.get_running_loop() is self.loop:
+                return
+        except RuntimeError:
+            pass
+        if not self.loop.is_running():
+            return
+        with self._publish_cond:
+            self._publish_cond.wait_for(lambda: not self._publishing, timeout)
+
+    async def _dispatch(self, data):
+        try:
+            await self._send_and_persist(data)
+        finally:
+            self._published()
+
+    async def _send_and_persist(self, data):
+        # Send traffic to subscribers (flat dict with top-level timestamp)
+        started = metrics.registry.clock()
+        await self.channel_layer.group_send(TRAFFIC_GROUP, {"type": "traffic.record", "record": data})
+        metrics.PUBLISH_SECONDS.observe_since(started)
+        # Persist to DB and emit incident live if created
+        try:
+            started = metrics.registry.clock()
+            incident = await save_traffic_and_incidents(data, writer=self.writer)
+            metrics.PERSIST_SECONDS.observe_since(started)
+            if incident:
+                metrics.INCIDENTS.inc()
+                # Send incident as a flat dict with a _type so the frontend can treat it
+                # the same way as traffic rows (it will have a top-level timestamp)
+                incident["_type"] = "incident"
+                await self.channel_layer.group_send(TRAFFIC_GROUP, {"type": "traffic.record", "record": incident})
+        except Exception as e:
+            metrics.ERRORS.labels("persist").inc()
+            print(f"Error saving traffic/incidents: {e}")
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """The running capture service of this process, if any."""
+    return _service
+
+
+def ensure_started(loop, **options):
+    """Start this process's capture service on `loop` unless it is already running.
+
+    Keyword options are passed to CaptureService.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CaptureService(loop, **options).start()
+        return _service
@@ -1,27 +1,203 @@
+import threading
+import time
+import uuid
+from collections import deque
+
 from asgiref.sync import sync_to_async
+from django.db import connections, transaction
 from django.utils import timezone
-from .models import NetworkTraffic, ThreatIncident, ResponseRule, LogEntry
+from . import instrumentation as metrics
+from .models import NetworkTraffic, ThreatIncident
+from .rollups import apply_rollups
+from .rule_engine import engine as rule_engine, incident_values
+
+
+def traffic_row(packet_data: dict, timestamp=None):
+	"""Build an unsaved NetworkTraffic row for a live traffic record."""
+	row = NetworkTraffic(
+		id=packet_data.get("id") or uuid.uuid4(),
+		timestamp=timestamp or timezone.now(),
+		source_ip=packet_data.get("source_ip", ""),
+		destination_ip=packet_data.get("destination_ip", ""),
+		protocol=packet_data.get("protocol", ""),
+		bytes=packet_data.get("bytes", 0),
+		status=packet_data.get("status", "Normal"),
+		severity=packet_data.get("severity"),
+	)
+	# bulk_create bypasses save(), so fill the search columns here
+	row.set_ip_numbers()
+	return row
+
+
+class TrafficWriter:
+	"""Buffer live traffic rows and write them with one bulk_create per batch.
+
+	A background thread flushes once `batch_size` rows are pending or the oldest
+	pending row has waited `flush_interval` seconds, each batch in a single
+	transaction. At most `max_pending` rows are buffered; further rows are
+	dropped and counted so a slow database cannot grow memory without bound.
+	`stop()` writes everything still pending.
+
+	The same thread writes the response rule matches buffered by `rules` once
+	they are due, so they reach the database even when no more traffic comes.
+	"""
+
+	def __init__(self, batch_size=500, flush_interval=1.0, max_pending=50000, rules=None):
+		self.batch_size = batch_size
+		self.flush_interval = flush_interval
+		self.max_pending = max_pending
+		self.rules = rules if rules is not None else rule_engine
+		self._pending = deque()
+		self._cond = threading.Condition()
+		self._flush_lock = threading.Lock()
+		self._thread = None
+		self._stopping = False
+		self.written = 0
+		self.dropped = 0
+		self.batches = 0
+		self.failed = 0
+		self.high_water = 0
+		self.last_flush_ms = 0.0
+
+	@classmethod
+	def from_settings(cls, settings):
+		return cls(
+			batch_size=getattr(settings, "IDS_DB_BATCH_SIZE", 500),
+			flush_interval=getattr(settings, "IDS_DB_FLUSH_INTERVAL", 1.0),
+			max_pending=getattr(settings, "IDS_DB_MAX_PENDING", 50000),
+		)
+
+	@property
+	def stats(self):
+		"""Backpressure metrics: pending rows, high-water mark, rows written/dropped/failed, batches."""
+		return {
+			"pending": len(self._pending),
+			"high_water": self.high_water,
+			"written": self.written,
+			"dropped": self.dropped,
+			"failed": self.failed,
+			"batches": self.batches,
+			"last_flush_ms": self.last_flush_ms,
+		}
+
+	def start(self):
+		if self._thread is None:
+			self._stopping = False
+			self._thread = threading.Thread(target=self._run, name="ids-db-writer", daemon=True)
+			self._thread.start()
+		return self
 
+	def stop(self, timeout=None):
+		"""Stop the writer thread and flush every pending row."""
+		with self._cond:
+			self._stopping = True
+			self._cond.notify()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+		# Rows submitted after the thread exited (or if it was never started)
+		self.flush()
 
-async def save_traffic_and_incidents(packet_data: dict):
+	def submit(self, packet_data: dict, timestamp=None):
+		"""Queue a traffic record for the next batch; returns False if it was dropped."""
+		row = traffic_row(packet_data, timestamp)
+		with self._cond:
+			if self.max_pending is not None and len(self._pending) >= self.max_pending:
+				self.dropped += 1
+				return False
+			self._pending.append(row)
+			self.high_water = max(self.high_water, len(self._pending))
+			# Wake the writer on the first row (it starts the flush interval) and on a full batch
+			if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+				self._cond.notify()
+		return True
+
+	def wake(self):
+		"""Have the writer thread look at the rule match timer again (call after buffering matches)."""
+		with self._cond:
+			self._cond.notify()
+
+	def flush(self):
+		"""Write every pending row on the calling thread."""
+		while self._write_batch():
+			pass
+
+	def _take_batch(self):
+		with self._cond:
+			count = min(self.batch_size, len(self._pending))
+			return [self._pending.popleft() for _ in range(count)]
+
+	def _write_batch(self):
+		with self._flush_lock:
+			batch = self._take_batch()
+			if not batch:
+				return False
+			started = time.perf_counter()
+			try:
+				with transaction.atomic():
+					NetworkTraffic.objects.bulk_create(batch, batch_size=self.batch_size)
+					# Same transaction, so rollups never count rows that were not written
+					apply_rollups(batch)
+				self.written += len(batch)
+				self.batches += 1
+			except Exception as e:
+				self.failed += len(batch)
+				metrics.ERRORS.labels("db_write").inc()
+				print(f"Error writing traffic batch: {e}")
+			elapsed = time.perf_counter() - started
+			self.last_flush_ms = elapsed * 1000.0
+			metrics.DB_WRITE_SECONDS.observe(elapsed)
+			return True
+
+	def _flush_rules(self):
+		if not self.rules.flush_due():
+			return
+		try:
+			self.rules.flush()
+		except Exception as e:
+			metrics.ERRORS.labels("rule_flush").inc()
+			print(f"Failed to flush rule matches: {e}")
+
+	def _run(self):
+		try:
+			while True:
+				with self._cond:
+					if not self._pending and not self._stopping:
+						# Idle until a row arrives or buffered rule matches fall due
+						self._cond.wait(self.rules.flush_wait())
+					if self._pending and len(self._pending) < self.batch_size and not self._stopping:
+						# Give a partial batch until the flush interval to fill up
+						self._cond.wait(self.flush_interval)
+					stopping = self._stopping
+				self.flush()
+				self._flush_rules()
+				if stopping:
+					return
+		finally:
+			connections.close_all()
+
+
+def _save_traffic_row(row):
+	# The post_save handler folds the row into the rollups in the same transaction
+	with transaction.atomic():
+		row.save(force_insert=True)
+
+
+async def save_traffic_and_incidents(packet_data: dict, writer: TrafficWriter = None, timestamp=None):
 	"""Persist live traffic to DB and create incident rows for anomalies.
 
 	Args:
 		packet_data: Dict with keys id, timestamp, source_ip, destination_ip, protocol, bytes, status, severity
+		writer: Optional TrafficWriter that batches the traffic row; it is saved immediately otherwise
+		timestamp: Capture time of the record (aware datetime); defaults to now
 	Returns:
 		Optional[dict]: Incident payload if created, else None.
 	"""
 	# Save traffic row
-	traffic = await sync_to_async(NetworkTraffic.objects.create)(
-		id=packet_data.get("id"),
-		timestamp=timezone.now(),
-		source_ip=packet_data.get("source_ip", ""),
-		destination_ip=packet_data.get("destination_ip", ""),
-		protocol=packet_data.get("protocol", ""),
-		bytes=packet_data.get("bytes", 0),
-		status=packet_data.get("status", "Normal"),
-		severity=packet_data.get("severity"),
-	)
+	if writer is not None:
+		writer.submit(packet_data, timestamp)
+	else:
+		await sync_to_async(_save_traffic_row)(traffic_row(packet_data, timestamp))
 	status = packet_data.get("status", "Normal")
 	label = packet_data.get("label")
 	rate = float(packet_data.get("rate") or 0.0)
@@ -65,6 +241,7 @@ async def save_traffic_and_incidents(packet_data: dict):
 		description = f"Detected {status.lower()} traffic from {packet_data.get('source_ip')} to {packet_data.get('destination_ip')} via {packet_data.get('protocol')}"
 		incident_status = "Blocked" if status == "Blocked" else "Active"
 		created = await sync_to_async(ThreatIncident.objects.create)(
+			timestamp=timestamp or timezone.now(),
 			source_ip=packet_data.get("source_ip", ""),
 			destination_ip=packet_data.get("destination_ip", ""),
 			threat_type=threat_type,
@@ -86,47 +263,18 @@ async def save_traffic_and_incidents(packet_data: dict):
 			"confidence": created.confidence,
 		}
 
-		# Evaluate active response rules (comma-separated key=value, all clauses must match)
+		# Evaluate active response rules (compiled and indexed; matches are written in batches)
 		try:
-			active_rules = await sync_to_async(list)(ResponseRule.objects.filter(is_active=True))
-			for rule in active_rules:
-				cond = (rule.condition or "").strip()
-				if not cond:
-					continue
-				matched = True
-				for clause in cond.split(','):
-					cl = clause.strip()
-					if not cl:
-						continue
-					if '=' not in cl:
-						matched = False
-						break
-					k, v = [p.strip() for p in cl.split('=', 1)]
-					# compare string representations (case-insensitive)
-					val = incident_payload.get(k)
-					if val is None:
-						val = getattr(created, k, None)
-					if val is None:
-						matched = False
-						break
-					if str(val).lower() != str(v).lower():
-						matched = False
-						break
-				if matched:
-					# create a log entry and increment triggered_count
-					try:
-						await sync_to_async(LogEntry.objects.create)(
-							action=rule.action or "rule_trigger",
-							target=str(getattr(created, 'id', '')),
-							result="Success",
-							details=f"Rule '{rule.name}' triggered for incident {getattr(created, 'id', None)}",
-							severity="Info",
-						)
-						rule.triggered_count = (rule.triggered_count or 0) + 1
-						await sync_to_async(rule.save)()
-					except Exception:
-						# ignore logging errors to avoid breaking incident creation
-						continue
+			rules = rule_engine.current()
+			if rules is None:
+				rules = await sync_to_async(rule_engine.rules)()
+			matches = rules.match(incident_values({**incident_payload, "description": created.description}))
+			rule_engine.record(matches, incident_payload["id"])
+			if writer is None or rule_engine.flush_due():
+				await sync_to_async(rule_engine.flush)()
+			elif matches:
+				# The writer thread writes them once the flush interval has passed
+				writer.wake()
 		except Exception:
 			# don't let rule engine failure prevent incident flow
 			pass
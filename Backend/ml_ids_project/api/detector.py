@@ -0,0 +1,109 @@
+"""
+The shipped KNN detector, shared by the REST API and the capture service.
+
+Artifacts live in model/unsw_tabular and are served through the process-wide
+model registry, so they are loaded once and reloaded when they change.
+"""
+
+import math
+import os
+
+from django.conf import settings
+
+from .utils.model_registry import registry
+
+
+model_dir = os.path.join(settings.BASE_DIR, '..', '..', 'model', 'unsw_tabular')
+model_path = os.path.join(model_dir, 'model_knn.pkl')
+features_path = os.path.join(model_dir, 'features_knn.json')
+scaler_path = os.path.join(model_dir, 'scaler_knn.pkl')
+DETECTOR_PATHS = (model_path, features_path, scaler_path)
+
+registry.check_interval = getattr(settings, "IDS_MODEL_CHECK_INTERVAL", 2.0)
+
+
+def get_detector():
+    """The current detector; raises FileNotFoundError if the model was never trained."""
+    return registry.get(*DETECTOR_PATHS)
+
+
+def detector_handle():
+    """A handle that follows model reloads, for long-lived consumers such as the capture service."""
+    return registry.handle(*DETECTOR_PATHS)
+
+
+def model_version():
+    return registry.version(*DETECTOR_PATHS)
+
+
+def _severity(label):
+    return 'Critical' if label == 'Anomalous' else 'Low'
+
+
+def _coerce(record, features):
+    """Selected features of a raw record as floats (None if missing); raises ValueError."""
+    row = {}
+    for feat in features:
+        value = record.get(feat)
+        if value is not None:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"feature '{feat}' is not a number: {value!r}")
+            if not math.isfinite(value):
+                raise ValueError(f"feature '{feat}' is not finite")
+        row[feat] = value
+    return row
+
+
+def score_records(detector, items, chunk_size=1000):
+    """
+    Score uploaded records in chunks through the detector's vectorized predict_batch.
+
+    Records get the same log preprocessing and scaling as a single detect-anomaly
+    request. Results are yielded in input order as soon as their chunk is scored.
+
+    Args:
+        detector: Loaded KNNAnomalyDetector
+        items: Iterable of (index, record, error) as yielded by read_records
+        chunk_size: Records per predict_batch call
+
+    Yields:
+        {"index", "label", "prediction", "confidence", "probabilities", "severity"},
+        or {"index", "error"} for a record that could not be scored
+    """
+    features = detector.selected_features
+    pending = []  # (index, coerced record or None, error) in input order
+
+    def flush():
+        rows = [row for _, row, _ in pending if row is not None]
+        scored = iter(())
+        if rows:
+            batch = detector.predict_batch(rows)
+            scored = zip(batch['predictions'], batch['labels'], batch['confidences'], batch['probabilities'])
+        for index, row, error in pending:
+            if row is None:
+                yield {'index': index, 'error': error}
+                continue
+            prediction, label, confidence, probabilities = next(scored)
+            yield {
+                'index': index,
+                'prediction': prediction,
+                'label': label,
+                'confidence': confidence,
+                'probabilities': probabilities,
+                'severity': _severity(label),
+            }
+        pending.clear()
+
+    for index, record, error in items:
+        if record is not None:
+            try:
+                record = _coerce(record, features)
+            except ValueError as e:
+                record, error = None, str(e)
+        pending.append((index, record, error))
+        if len(pending) >= chunk_size:
+            yield from flush()
+    if pending:
+        yield from flush()
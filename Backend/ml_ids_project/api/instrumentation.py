@@ -0,0 +1,66 @@
+"""
+Metrics of the live capture -> extract -> classify -> persist -> publish pipeline.
+
+Every metric of this process lives on `registry` and is served in the
+Prometheus text format at GET /metrics (and by `run_capture --metrics-port`).
+IDS_METRICS_ENABLED turns recording on; while it is off the calls below are
+no-ops. Counts the pipeline already keeps (flow table, DB writer, queues) are
+read at scrape time by the capture service (see CaptureService._register_metrics)
+rather than counted twice. Pipeline worker processes record into their own
+registry and ship the increments back with their results.
+
+This module does not depend on Django so pipeline workers can import it.
+"""
+
+from .utils.metrics import MetricsRegistry
+
+
+registry = MetricsRegistry()
+
+# Packets and flows
+PACKETS_CAPTURED = registry.counter(
+    "ids_packets_captured_total", "Packets handed to the pipeline by the capture thread")
+PACKETS_PROCESSED = registry.counter(
+    "ids_packets_processed_total", "Packets through feature extraction")
+PACKETS_DISSECTED = registry.counter(
+    "ids_packets_dissected_fallback_total", "Frames the fast decoder left to Scapy dissection")
+PACKETS_DROPPED = registry.counter(
+    "ids_packets_dropped_total", "Packets not processed: extraction failed (error) or worker queue full (queue_full)",
+    ["reason"])
+FLOWS = registry.counter(
+    "ids_flows_total", "Flows created, finished, or dropped at the flow table cap", ["event"])
+FLOWS_ACTIVE = registry.gauge("ids_flows_active", "Live flows in the flow table")
+
+# Classification, persistence and publishing
+RECORDS = registry.counter("ids_records_total", "Records published, by classification status", ["status"])
+RECORDS_DROPPED = registry.counter(
+    "ids_records_dropped_total", "Records not published because IDS_PUBLISH_MAX_PENDING were already waiting")
+INCIDENTS = registry.counter("ids_incidents_total", "Threat incidents created")
+RULE_MATCHES_DROPPED = registry.counter(
+    "ids_rule_matches_dropped_total",
+    "Rule matches not logged: their write failed while IDS_RULE_MAX_PENDING were already buffered")
+DB_ROWS = registry.counter(
+    "ids_db_rows_total", "Traffic rows by outcome: written, dropped (writer buffer full) or failed", ["outcome"])
+ERRORS = registry.counter("ids_errors_total", "Exceptions caught and logged, by pipeline stage", ["stage"])
+QUEUE_DEPTH = registry.gauge("ids_queue_depth", "Items waiting in a pipeline queue", ["queue"])
+STAGE_SECONDS = registry.histogram(
+    "ids_stage_seconds",
+    "Latency of one call of a pipeline stage: extract (per packet), inference (per micro-batch), "
+    "persist and publish (per record), db_write (per bulk batch), ws_send (per WebSocket frame)",
+    ["stage"],
+)
+
+# WebSocket clients
+WS_CLIENTS = registry.gauge("ids_ws_clients", "Connected live-traffic WebSocket clients")
+WS_FRAMES = registry.counter("ids_ws_frames_total", "Batch frames sent to WebSocket clients")
+WS_RECORDS_DROPPED = registry.counter(
+    "ids_ws_records_dropped_total", "Records discarded because a WebSocket client fell behind")
+
+# Children used on hot paths, bound once
+PACKET_ERRORS = PACKETS_DROPPED.labels("error")
+EXTRACT_SECONDS = STAGE_SECONDS.labels("extract")
+INFERENCE_SECONDS = STAGE_SECONDS.labels("inference")
+PERSIST_SECONDS = STAGE_SECONDS.labels("persist")
+PUBLISH_SECONDS = STAGE_SECONDS.labels("publish")
+DB_WRITE_SECONDS = STAGE_SECONDS.labels("db_write")
+WS_SEND_SECONDS = STAGE_SECONDS.labels("ws_send")
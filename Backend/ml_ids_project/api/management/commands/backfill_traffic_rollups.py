@@ -0,0 +1,43 @@
+"""
+Django Management Command to Rebuild the Traffic Rollups from Raw Rows
+Usage: python manage.py backfill_traffic_rollups [--hours N]
+
+Recomputes the per-minute and per-hour rollups from NetworkTraffic, for all
+of history or for the last N hours. Existing rollups in that range are
+replaced, so the command can be re-run safely.
+"""
+
+import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from api.rollups import backfill
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the per-minute and per-hour traffic rollups from raw traffic rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours',
+            type=int,
+            default=None,
+            help='Only rebuild the last N hours (default: all of history)'
+        )
+
+    def handle(self, *args, **options):
+        since = None
+        if options['hours'] is not None:
+            if options['hours'] <= 0:
+                raise CommandError('--hours must be positive')
+            # Align to an hour so no hour bucket is rebuilt from part of its rows
+            current_hour = timezone.now().replace(minute=0, second=0, microsecond=0)
+            since = current_hour - datetime.timedelta(hours=options['hours'] - 1)
+            self.stdout.write(f'Rebuilding rollups since {since.isoformat()}...')
+        else:
+            self.stdout.write('Rebuilding rollups for all traffic...')
+
+        written = backfill(since=since)
+
+        for name, count in written.items():
+            self.stdout.write(f'  {name}: {count} rows')
+        self.stdout.write(self.style.SUCCESS('Rollups rebuilt.'))
@@ -0,0 +1,184 @@
+"""
+Django Management Command to Benchmark KNN Neighbor-Search Backends
+Usage: python manage.py benchmark_knn_backends [--data-path PATH] [--backends NAME ...] [--output FILE]
+
+Trains every backend on the same split as train_knn_model and reports query
+throughput plus accuracy drift against the exact (brute-force) model.
+"""
+
+import os
+import json
+import time
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+import numpy as np
+import pandas as pd
+from api.utils.knn_classifier import KNNAnomalyDetector
+from api.utils.neighbor_backends import (
+    NEIGHBOR_BACKENDS,
+    DEFAULT_LEAF_SIZE,
+    DEFAULT_IVF_LISTS,
+    DEFAULT_IVF_PROBE,
+    build_neighbors_model,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark KNN neighbor-search backends (queries/sec and accuracy drift)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--data-path',
+            type=str,
+            default='UNSW_Train_Test Datasets/UNSW_NB15_training-set.csv',
+            help='Path to UNSW training dataset'
+        )
+        parser.add_argument(
+            '--n-neighbors',
+            type=int,
+            default=7,
+            help='Number of neighbors for KNN'
+        )
+        parser.add_argument(
+            '--backends',
+            nargs='+',
+            choices=NEIGHBOR_BACKENDS,
+            default=['brute', 'kd_tree', 'ball_tree', 'ivf'],
+            help='Backends to benchmark'
+        )
+        parser.add_argument(
+            '--leaf-size',
+            type=int,
+            default=DEFAULT_LEAF_SIZE,
+            help='Leaf size for the kd_tree/ball_tree backends'
+        )
+        parser.add_argument(
+            '--ivf-lists',
+            type=int,
+            default=DEFAULT_IVF_LISTS,
+            help='Number of k-means buckets for the ivf backend'
+        )
+        parser.add_argument(
+            '--ivf-probe',
+            type=int,
+            nargs='+',
+            default=[1, 4, DEFAULT_IVF_PROBE, 16],
+            help='Probe counts to sweep for the ivf backend'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=5000,
+            help='Number of held-out rows to query'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=64,
+            help='Rows per query call (1 = per-packet inference)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Optional JSON file for the results'
+        )
+
+    def handle(self, *args, **options):
+        data_path = options['data_path']
+        data_path = Path(settings.BASE_DIR) / data_path if not os.path.isabs(data_path) else data_path
+        if not os.path.exists(data_path):
+            raise CommandError(f'Data file not found: {data_path}')
+
+        n_neighbors = options['n_neighbors']
+        batch_size = max(1, options['batch_size'])
+
+        self.stdout.write(f'Loading data from: {data_path}')
+        detector = KNNAnomalyDetector()
+        X_train, X_test, y_train, y_test = detector.prepare_training_data(pd.read_csv(data_path))
+
+        rng = np.random.default_rng(42)
+        sample = rng.choice(len(X_test), size=min(options['queries'], len(X_test)), replace=False)
+        X_query = X_test[sample]
+        y_query = np.asarray(y_test)[sample]
+
+        configs = []
+        for backend in options['backends']:
+            if backend == 'ivf':
+                configs += [('ivf', {'n_lists': options['ivf_lists'], 'n_probe': p}) for p in options['ivf_probe']]
+            elif backend in ('kd_tree', 'ball_tree'):
+                configs.append((backend, {'leaf_size': options['leaf_size']}))
+            else:
+                configs.append((backend, {}))
+
+        # Exact reference: predictions and neighbor sets of the brute-force model
+        detector.model = build_neighbors_model('brute', n_neighbors=n_neighbors).fit(X_train, y_train)
+        exact_pred, _ = detector._classify(X_query)
+        exact_neighbors = detector.model.kneighbors(X_query, return_distance=False)
+        exact_accuracy = float(np.mean(exact_pred == y_query))
+
+        results = []
+        ivf_model = None
+        for backend, params in configs:
+            fit_start = time.perf_counter()
+            if backend == 'ivf' and ivf_model is not None and ivf_model.n_lists == params['n_lists']:
+                # The probe count is a query-time knob; reuse the built index
+                ivf_model.n_probe = params['n_probe']
+                model = ivf_model
+            else:
+                model = build_neighbors_model(backend, n_neighbors=n_neighbors, **params).fit(X_train, y_train)
+                if backend == 'ivf':
+                    ivf_model = model
+            fit_seconds = time.perf_counter() - fit_start
+            detector.model = model
+
+            predictions = []
+            query_start = time.perf_counter()
+            for start in range(0, len(X_query), batch_size):
+                pred, _ = detector._classify(X_query[start:start + batch_size])
+                predictions.append(pred)
+            query_seconds = time.perf_counter() - query_start
+            predictions = np.concatenate(predictions)
+
+            neighbors = model.kneighbors(X_query, return_distance=False)
+            recall = np.mean([
+                len(np.intersect1d(a, b, assume_unique=True)) / n_neighbors
+                for a, b in zip(neighbors, exact_neighbors)
+            ])
+            accuracy = float(np.mean(predictions == y_query))
+            results.append({
+                'backend': backend,
+                'params': params,
+                'fit_seconds': fit_seconds,
+                'queries_per_sec': len(X_query) / query_seconds if query_seconds > 0 else float('inf'),
+                'accuracy': accuracy,
+                'accuracy_drift': accuracy - exact_accuracy,
+                'agreement_with_exact': float(np.mean(predictions == exact_pred)),
+                'neighbor_recall': float(recall),
+            })
+
+        self.stdout.write(self.style.SUCCESS('='*60))
+        self.stdout.write(self.style.SUCCESS('KNN BACKEND BENCHMARK'))
+        self.stdout.write(self.style.SUCCESS('='*60))
+        self.stdout.write(f'Training rows: {len(X_train)}, queries: {len(X_query)}, batch size: {batch_size}')
+        self.stdout.write(f'Exact (brute) accuracy: {exact_accuracy:.4f}\n')
+        self.stdout.write(f'{"backend":<28}{"q/s":>12}{"accuracy":>10}{"drift":>9}{"agree":>8}{"recall":>8}')
+        for r in results:
+            name = r['backend'] + ''.join(f' {k}={v}' for k, v in r['params'].items())
+            self.stdout.write(
+                f'{name:<28}{r["queries_per_sec"]:>12.1f}{r["accuracy"]:>10.4f}'
+                f'{r["accuracy_drift"]:>+9.4f}{r["agreement_with_exact"]:>8.4f}{r["neighbor_recall"]:>8.4f}'
+            )
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump({
+                    'training_rows': len(X_train),
+                    'queries': len(X_query),
+                    'batch_size': batch_size,
+                    'n_neighbors': n_neighbors,
+                    'exact_accuracy': exact_accuracy,
+                    'results': results,
+                }, f, indent=2)
+            self.stdout.write(f'\nResults written to: {options["output"]}')
@@ -0,0 +1,150 @@
+"""
+Django Management Command to Benchmark the Detection Pipeline Stage by Stage
+Usage: python manage.py benchmark_pipeline [--stages NAME ...] [--packets N] [--batch-size N]
+                                           [--model auto|shipped|synthetic] [--output FILE]
+                                           [--baseline FILE] [--tolerance X] [--no-isolate]
+
+Times synthetic packet generation, feature extraction (Scapy and fast
+decoders), per-record and batched KNN inference, and persistence (direct and
+batched) on the same seeded traffic. Reports packets/sec, p50/p99 latency and
+peak RSS per stage; --output stores the run as JSON and --baseline fails the
+command when a stage regressed against a stored run.
+"""
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import (
+    DEFAULT_PARAMS,
+    MODELS,
+    STAGES,
+    benchmark_document,
+    compare_results,
+    run_stages,
+)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark packet generation, feature extraction, KNN inference and persistence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--stages',
+            nargs='+',
+            choices=STAGES,
+            default=list(STAGES),
+            help='Stages to run, in order (default: all)'
+        )
+        parser.add_argument(
+            '--packets',
+            type=int,
+            default=DEFAULT_PARAMS['packets'],
+            help='Synthetic packets per stage'
+        )
+        parser.add_argument(
+            '--flows',
+            type=int,
+            default=DEFAULT_PARAMS['flows'],
+            help='Distinct flows the synthetic packets are spread over'
+        )
+        parser.add_argument('--seed', type=int, default=DEFAULT_PARAMS['seed'], help='Traffic generator seed')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_PARAMS['batch_size'],
+            help='Records per predict_batch call'
+        )
+        parser.add_argument(
+            '--model',
+            choices=MODELS,
+            default=DEFAULT_PARAMS['model'],
+            help='Trained model, a synthetic one, or the trained one if present (default)'
+        )
+        parser.add_argument(
+            '--reference-rows',
+            type=int,
+            default=DEFAULT_PARAMS['reference_rows'],
+            help='Reference set size of the synthetic model'
+        )
+        parser.add_argument(
+            '--anomaly-rate',
+            type=float,
+            default=DEFAULT_PARAMS['anomaly_rate'],
+            help='Share of records persisted as anomalous (creating incidents)'
+        )
+        parser.add_argument(
+            '--rules',
+            type=int,
+            default=DEFAULT_PARAMS['rules'],
+            help='Response rules created in the scratch database for the persist stages'
+        )
+        parser.add_argument(
+            '--no-isolate',
+            action='store_false',
+            dest='isolate',
+            help='Run every stage in this process (peak RSS then accumulates across stages)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Optional JSON file for the results'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=None,
+            help='JSON results of an earlier run to check for regressions'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.2,
+            help='Allowed relative drop in packets/sec or growth in p99 latency against --baseline'
+        )
+
+    def handle(self, *args, **options):
+        if options['packets'] < 1:
+            raise CommandError('--packets must be at least 1')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f'Cannot read baseline {options["baseline"]}: {e}')
+
+        params = {key: options[key] for key in DEFAULT_PARAMS}
+        results = run_stages(options['stages'], params, isolate=options['isolate'])
+
+        self.stdout.write(self.style.SUCCESS('='*60))
+        self.stdout.write(self.style.SUCCESS('PIPELINE BENCHMARK'))
+        self.stdout.write(self.style.SUCCESS('='*60))
+        self.stdout.write(f'Packets: {params["packets"]}, flows: {params["flows"]}, batch size: {params["batch_size"]}\n')
+        self.stdout.write(f'{"stage":<18}{"packets/s":>12}{"p50 ms":>10}{"p99 ms":>10}{"RSS MB":>9}')
+        for r in results:
+            latency = r['latency_ms']
+            self.stdout.write(
+                f'{r["stage"]:<18}{r["packets_per_s"] or 0:>12.1f}{latency["p50"] or 0:>10.4f}'
+                f'{latency["p99"] or 0:>10.4f}{r["peak_rss_mb"] or 0:>9.1f}'
+            )
+        models = sorted({r['model'] for r in results if 'model' in r})
+        if models:
+            self.stdout.write(f'\nModel: {", ".join(models)}')
+
+        document = benchmark_document(results, params)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(document, f, indent=2)
+            self.stdout.write(f'\nResults written to: {options["output"]}')
+
+        if baseline is not None:
+            regressions = compare_results(results, baseline, options['tolerance'])
+            for r in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f'{r["stage"]}: {r["metric"]} {r["baseline"]} -> {r["current"]} ({r["change"]:+.1%})'
+                ))
+            if regressions:
+                raise CommandError(f'{len(regressions)} regression(s) against {options["baseline"]}')
+            self.stdout.write(self.style.SUCCESS(f'No regressions against {options["baseline"]}'))
@@ -0,0 +1,90 @@
+"""
+Django Management Command to Build the Free-Text Traffic Search Index
+Usage: python manage.py build_search_index [--drop]
+
+Creates an SQLite FTS5 table with the trigram tokenizer over the traffic
+address, protocol, status and severity columns, keeps it in sync with
+triggers and fills it from the existing rows. Free-text terms in traffic
+search then become index lookups instead of table scans. The index is keyed
+on the NetworkTraffic.fts_rowid column, which the insert trigger numbers,
+since the implicit rowid of a table with a UUID primary key can change on
+VACUUM. A migration that rebuilds the traffic table drops the triggers:
+search then falls back to scanning and reports the stale index until this
+command is run again. Requires SQLite 3.34 or newer; --drop removes the
+index and its triggers.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from api.search import FTS_COLUMNS, FTS_ROWID, FTS_TABLE, FTS_TRIGGERS, TRAFFIC_TABLE, fts_status
+
+
+def _statements():
+    columns = ", ".join(FTS_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+    ai, ad, au, key = FTS_TRIGGERS
+    return [
+        # Rows written while the index was missing have no key yet; number them after the others
+        f"UPDATE {TRAFFIC_TABLE} SET {FTS_ROWID} = "
+        f"(SELECT COALESCE(MAX({FTS_ROWID}), 0) FROM {TRAFFIC_TABLE}) + rowid WHERE {FTS_ROWID} IS NULL",
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({columns}, "
+        f"content='{TRAFFIC_TABLE}', content_rowid='{FTS_ROWID}', tokenize='trigram')",
+        # Number the new row, then index it under that number
+        f"CREATE TRIGGER {ai} AFTER INSERT ON {TRAFFIC_TABLE} BEGIN "
+        f"UPDATE {TRAFFIC_TABLE} SET {FTS_ROWID} = (SELECT COALESCE(MAX({FTS_ROWID}), 0) + 1 FROM {TRAFFIC_TABLE}) "
+        f"WHERE rowid = new.rowid; "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) "
+        f"SELECT {FTS_ROWID}, {columns} FROM {TRAFFIC_TABLE} WHERE rowid = new.rowid; END",
+        f"CREATE TRIGGER {ad} AFTER DELETE ON {TRAFFIC_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.{FTS_ROWID}, {old_values}); END",
+        # Only changes of indexed columns (not the numbering above) touch the index. The key
+        # never changes once numbered (see the next trigger), so both sides use old's
+        f"CREATE TRIGGER {au} AFTER UPDATE OF {columns} ON {TRAFFIC_TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) VALUES ('delete', old.{FTS_ROWID}, {old_values}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (old.{FTS_ROWID}, {new_values}); END",
+        # save() of an instance created in this process writes back the NULL key it was created
+        # with: keep the number the insert trigger gave the row
+        f"CREATE TRIGGER {key} AFTER UPDATE OF {FTS_ROWID} ON {TRAFFIC_TABLE} "
+        f"WHEN new.{FTS_ROWID} IS NULL AND old.{FTS_ROWID} IS NOT NULL BEGIN "
+        f"UPDATE {TRAFFIC_TABLE} SET {FTS_ROWID} = old.{FTS_ROWID} WHERE rowid = new.rowid; END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def _drop_statements():
+    return [f"DROP TRIGGER IF EXISTS {name}" for name in FTS_TRIGGERS] + [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+
+class Command(BaseCommand):
+    help = 'Build (or drop) the FTS5 trigram index used for free-text traffic search'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--drop',
+            action='store_true',
+            help='Remove the index and its triggers'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('The FTS5 search index is only available on SQLite')
+
+        if fts_status() == 'stale' and not options['drop']:
+            self.stdout.write(self.style.WARNING(
+                f'Search index {FTS_TABLE} had lost its triggers (traffic table rebuilt); rebuilding it.'
+            ))
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Rebuilding replaces any existing index
+            for sql in _drop_statements():
+                cursor.execute(sql)
+            if options['drop']:
+                self.stdout.write(self.style.SUCCESS('Search index dropped.'))
+                return
+            try:
+                for sql in _statements():
+                    cursor.execute(sql)
+            except Exception as e:
+                raise CommandError(f'Could not build the FTS5 trigram index (SQLite 3.34+ required): {e}')
+
+        self.stdout.write(self.style.SUCCESS(f'Search index {FTS_TABLE} built.'))
@@ -0,0 +1,72 @@
+"""
+Django Management Command to Run the Live Capture/Detection Service
+Usage: python manage.py run_capture [--iface NAME] [--filter BPF] [--metrics-port PORT]
+
+Runs capture, classification and persistence in this process and publishes
+records to the channel layer. WebSocket servers in other processes receive them
+only through a shared layer such as channels_redis; set IDS_CAPTURE_AUTOSTART = False
+there so they do not start a capture of their own. With --metrics-port the
+pipeline metrics of this process are served at http://HOST:PORT/metrics.
+"""
+
+import asyncio
+from django.core.management.base import BaseCommand, CommandError
+from channels.layers import InMemoryChannelLayer, get_channel_layer
+from api import capture_service
+from api.instrumentation import registry as metrics_registry
+from api.utils.metrics import start_http_server
+
+
+class Command(BaseCommand):
+    help = 'Run the live capture/detection service and publish results to the channel layer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iface',
+            type=str,
+            default=None,
+            help='Interface to sniff on (defaults to Scapy\'s default interface)'
+        )
+        parser.add_argument(
+            '--filter',
+            type=str,
+            default='ip',
+            help='BPF capture filter'
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=None,
+            help='Serve Prometheus metrics at /metrics on this port (needs IDS_METRICS_ENABLED)'
+        )
+
+    def handle(self, *args, **options):
+        if isinstance(get_channel_layer(), InMemoryChannelLayer):
+            self.stdout.write(self.style.WARNING(
+                'CHANNEL_LAYERS uses the in-memory layer: WebSocket servers in other processes '
+                'will not receive records. Configure channels_redis to share them.'
+            ))
+
+        if options['metrics_port'] is not None:
+            if not metrics_registry.enabled:
+                raise CommandError('--metrics-port needs IDS_METRICS_ENABLED = True')
+            try:
+                start_http_server(metrics_registry, options['metrics_port'])
+            except OSError as e:
+                raise CommandError(f'Cannot serve metrics on port {options["metrics_port"]}: {e}')
+            self.stdout.write(f'Metrics served at http://localhost:{options["metrics_port"]}/metrics')
+
+        async def main():
+            service = capture_service.ensure_started(
+                asyncio.get_running_loop(), iface=options['iface'], bpf_filter=options['filter']
+            )
+            try:
+                await asyncio.Event().wait()
+            finally:
+                # Stopping flushes buffered traffic rows through the ORM, so keep it off the loop
+                await asyncio.to_thread(service.stop)
+
+        try:
+            asyncio.run(main())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.SUCCESS('\nCapture service stopped.'))
@@ -1,6 +1,6 @@
 """
 Django Management Command to Train KNN Anomaly Detection Model
-Usage: python manage.py train_knn_model [--data-path PATH] [--output-dir DIR]
+Usage: python manage.py train_knn_model [--data-path PATH] [--output-dir DIR] [--backend NAME]
 """
 
 import os
@@ -10,6 +10,13 @@ from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 import pandas as pd
 from api.utils.knn_classifier import KNNAnomalyDetector
+from api.utils.condensation import CONDENSATION_METHODS
+from api.utils.neighbor_backends import (
+    NEIGHBOR_BACKENDS,
+    DEFAULT_LEAF_SIZE,
+    DEFAULT_IVF_LISTS,
+    DEFAULT_IVF_PROBE,
+)
 
 
 class Command(BaseCommand):
@@ -34,6 +41,42 @@ class Command(BaseCommand):
             default=7,
             help='Number of neighbors for KNN'
         )
+        parser.add_argument(
+            '--backend',
+            choices=NEIGHBOR_BACKENDS,
+            default='auto',
+            help='Neighbor-search backend (ivf is approximate)'
+        )
+        parser.add_argument(
+            '--leaf-size',
+            type=int,
+            default=DEFAULT_LEAF_SIZE,
+            help='Leaf size for the kd_tree/ball_tree backends'
+        )
+        parser.add_argument(
+            '--ivf-lists',
+            type=int,
+            default=DEFAULT_IVF_LISTS,
+            help='Number of k-means buckets for the ivf backend'
+        )
+        parser.add_argument(
+            '--ivf-probe',
+            type=int,
+            default=DEFAULT_IVF_PROBE,
+            help='Buckets scanned per query by the ivf backend (higher = better recall, slower)'
+        )
+        parser.add_argument(
+            '--condense',
+            choices=CONDENSATION_METHODS,
+            default=None,
+            help='Shrink the stored reference set with prototype selection'
+        )
+        parser.add_argument(
+            '--condense-budget',
+            type=float,
+            default=0.01,
+            help='Maximum accuracy drop accepted from condensation'
+        )
 
     def handle(self, *args, **options):
         data_path = options['data_path']
@@ -41,6 +84,13 @@ class Command(BaseCommand):
             settings.BASE_DIR, '..', '..', 'model', 'unsw_tabular'
         )
         n_neighbors = options['n_neighbors']
+        backend = options['backend']
+        backend_options = {}
+        if backend in ('kd_tree', 'ball_tree'):
+            backend_options['leaf_size'] = options['leaf_size']
+        elif backend == 'ivf':
+            backend_options['n_lists'] = options['ivf_lists']
+            backend_options['n_probe'] = options['ivf_probe']
 
         # Resolve paths
         data_path = Path(settings.BASE_DIR) / data_path if not os.path.isabs(data_path) else data_path
@@ -65,8 +115,20 @@ class Command(BaseCommand):
             detector = KNNAnomalyDetector()
 
             # Train model
-            self.stdout.write(f'Training KNN model with n_neighbors={n_neighbors}...')
-            metrics = detector.train(df, n_neighbors=n_neighbors)
+            self.stdout.write(f'Training KNN model with n_neighbors={n_neighbors}, backend={backend}...')
+            if options['condense']:
+                self.stdout.write(
+                    f'Condensing reference set with {options["condense"]} '
+                    f'(accuracy budget {options["condense_budget"]})...'
+                )
+            metrics = detector.train(
+                df,
+                n_neighbors=n_neighbors,
+                backend=backend,
+                condense=options['condense'],
+                condense_budget=options['condense_budget'],
+                **backend_options
+            )
 
             # Save model
             output_dir.mkdir(parents=True, exist_ok=True)
@@ -93,6 +155,24 @@ class Command(BaseCommand):
             self.stdout.write(f'  Recall:    {metrics["recall"]:.4f}')
             self.stdout.write(f'  F1-Score:  {metrics["f1"]:.4f}')
 
+            condensation = metrics.get('condensation')
+            if condensation:
+                self.stdout.write(f'\nCondensation ({condensation["method"]}):')
+                if condensation['accepted']:
+                    self.stdout.write(
+                        f'  Reference set: {condensation["reference_size_before"]} -> '
+                        f'{condensation["reference_size_after"]} '
+                        f'({condensation["size_reduction"]:.1%} smaller)'
+                    )
+                    if condensation.get('inference_speedup'):
+                        self.stdout.write(f'  Inference speedup: {condensation["inference_speedup"]:.2f}x')
+                    for key, delta in condensation['metric_deltas'].items():
+                        self.stdout.write(f'  {key} delta: {delta:+.4f}')
+                else:
+                    self.stdout.write(self.style.WARNING(
+                        '  No condensed set met the accuracy budget; kept the full reference set'
+                    ))
+
             self.stdout.write(self.style.SUCCESS('\nModel ready for deployment!'))
 
         except Exception as e:
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-17 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='threatincident',
+            name='threat_type',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+    ]
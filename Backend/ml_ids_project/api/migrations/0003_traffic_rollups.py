@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-17 10:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_stats_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrafficRollupHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('protocol', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=50)),
+                ('severity', models.CharField(blank=True, default='', max_length=50)),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['bucket'], name='trafficrolluphour_bucket')],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'protocol', 'status', 'severity'), name='trafficrolluphour_unique_key')],
+            },
+        ),
+        migrations.CreateModel(
+            name='TrafficRollupMinute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('protocol', models.CharField(max_length=50)),
+                ('status', models.CharField(max_length=50)),
+                ('severity', models.CharField(blank=True, default='', max_length=50)),
+                ('packets', models.BigIntegerField(default=0)),
+                ('bytes', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['bucket'], name='trafficrollupminute_bucket')],
+                'constraints': [models.UniqueConstraint(fields=('bucket', 'protocol', 'status', 'severity'), name='trafficrollupminute_unique_key')],
+            },
+        ),
+    ]
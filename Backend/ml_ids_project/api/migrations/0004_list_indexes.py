@@ -0,0 +1,53 @@
+# Generated by Django 5.0.4 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_traffic_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['timestamp', 'id'], name='traffic_ts_id'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['status', 'timestamp'], name='traffic_status_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['source_ip', 'timestamp'], name='traffic_src_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['destination_ip', 'timestamp'], name='traffic_dst_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='threatincident',
+            index=models.Index(fields=['timestamp', 'id'], name='incident_ts_id'),
+        ),
+        migrations.AddIndex(
+            model_name='threatincident',
+            index=models.Index(fields=['status', 'timestamp'], name='incident_status_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='threatincident',
+            index=models.Index(fields=['source_ip', 'timestamp'], name='incident_src_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='threatincident',
+            index=models.Index(fields=['destination_ip', 'timestamp'], name='incident_dst_ts'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['timestamp', 'id'], name='log_ts_id'),
+        ),
+        migrations.AddIndex(
+            model_name='logentry',
+            index=models.Index(fields=['severity', 'timestamp'], name='log_severity_ts'),
+        ),
+    ]
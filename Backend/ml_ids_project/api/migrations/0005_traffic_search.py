@@ -0,0 +1,59 @@
+# Generated by Django 5.0.4 on 2026-10-17 12:00
+
+import ipaddress
+from django.db import migrations, models
+
+
+def ipv4_to_int(value):
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return int(address) if address.version == 4 else None
+
+
+def fill_ip_numbers(apps, schema_editor):
+    NetworkTraffic = apps.get_model('api', 'NetworkTraffic')
+    batch = []
+    for row in NetworkTraffic.objects.only('id', 'source_ip', 'destination_ip').iterator(chunk_size=2000):
+        row.source_ip_num = ipv4_to_int(row.source_ip)
+        row.destination_ip_num = ipv4_to_int(row.destination_ip)
+        batch.append(row)
+        if len(batch) >= 2000:
+            NetworkTraffic.objects.bulk_update(batch, ['source_ip_num', 'destination_ip_num'])
+            batch = []
+    if batch:
+        NetworkTraffic.objects.bulk_update(batch, ['source_ip_num', 'destination_ip_num'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networktraffic',
+            name='destination_ip_num',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='networktraffic',
+            name='source_ip_num',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['source_ip_num'], name='traffic_src_num'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['destination_ip_num'], name='traffic_dst_num'),
+        ),
+        migrations.AddIndex(
+            model_name='networktraffic',
+            index=models.Index(fields=['severity', 'timestamp'], name='traffic_severity_ts'),
+        ),
+        migrations.RunPython(fill_ip_numbers, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.4 on 2026-10-17 01:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_capture_timestamps'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='networktraffic',
+            name='fts_rowid',
+            field=models.BigIntegerField(blank=True, editable=False, null=True, unique=True),
+        ),
+    ]
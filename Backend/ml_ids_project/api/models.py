@@ -2,28 +2,65 @@ from django.db import models
 # api/models.py
 import uuid
 from django.db import models
+from django.utils import timezone
+from .utils.ip_codec import ipv4_to_int
 
 class NetworkTraffic(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # A default rather than auto_now_add, so replayed captures keep their packet timestamps
+    timestamp = models.DateTimeField(default=timezone.now)
     source_ip = models.CharField(max_length=100)
     destination_ip = models.CharField(max_length=100)
     protocol = models.CharField(max_length=50)
     bytes = models.IntegerField()
     status = models.CharField(max_length=50, choices=[('Normal', 'Normal'), ('Anomalous', 'Anomalous'), ('Blocked', 'Blocked')])
     severity = models.CharField(max_length=50, choices=[('Low', 'Low'), ('Medium', 'Medium'), ('High', 'High'), ('Critical', 'Critical')], null=True, blank=True)
+    # IPv4 addresses as integers, for CIDR range search (NULL for IPv6)
+    source_ip_num = models.BigIntegerField(null=True, blank=True, editable=False)
+    destination_ip_num = models.BigIntegerField(null=True, blank=True, editable=False)
+    # Integer key of the optional FTS5 search index, numbered by its insert trigger (see
+    # build_search_index): the primary key is a UUID and the implicit rowid may change on VACUUM
+    fts_rowid = models.BigIntegerField(null=True, blank=True, unique=True, editable=False)
+
+    class Meta:
+        # (timestamp, id) serves cursor pagination; the others serve filtered, newest-first lists
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='traffic_ts_id'),
+            models.Index(fields=['status', 'timestamp'], name='traffic_status_ts'),
+            models.Index(fields=['source_ip', 'timestamp'], name='traffic_src_ts'),
+            models.Index(fields=['destination_ip', 'timestamp'], name='traffic_dst_ts'),
+            models.Index(fields=['source_ip_num'], name='traffic_src_num'),
+            models.Index(fields=['destination_ip_num'], name='traffic_dst_num'),
+            models.Index(fields=['severity', 'timestamp'], name='traffic_severity_ts'),
+        ]
+
+    def set_ip_numbers(self):
+        self.source_ip_num = ipv4_to_int(self.source_ip)
+        self.destination_ip_num = ipv4_to_int(self.destination_ip)
+
+    def save(self, *args, **kwargs):
+        self.set_ip_numbers()
+        super().save(*args, **kwargs)
 
 class ThreatIncident(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(default=timezone.now)
     source_ip = models.CharField(max_length=100)
     destination_ip = models.CharField(max_length=100)
-    threat_type = models.CharField(max_length=100)
+    threat_type = models.CharField(max_length=100, db_index=True)
     severity = models.CharField(max_length=50)
     status = models.CharField(max_length=50)
     description = models.TextField()
     confidence = models.IntegerField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='incident_ts_id'),
+            models.Index(fields=['status', 'timestamp'], name='incident_status_ts'),
+            models.Index(fields=['source_ip', 'timestamp'], name='incident_src_ts'),
+            models.Index(fields=['destination_ip', 'timestamp'], name='incident_dst_ts'),
+        ]
+
 class ResponseRule(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     name = models.CharField(max_length=255)
@@ -40,4 +77,32 @@ class LogEntry(models.Model):
     target = models.CharField(max_length=255)
     result = models.CharField(max_length=50, choices=[('Success', 'Success'), ('Failed', 'Failed')])
     details = models.TextField()
-    severity = models.CharField(max_length=50, choices=[('Info', 'Info'), ('Warning', 'Warning'), ('Error', 'Error')])
\ No newline at end of file
+    severity = models.CharField(max_length=50, choices=[('Info', 'Info'), ('Warning', 'Warning'), ('Error', 'Error')])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['timestamp', 'id'], name='log_ts_id'),
+            models.Index(fields=['severity', 'timestamp'], name='log_severity_ts'),
+        ]
+
+class TrafficRollup(models.Model):
+    """Traffic counters for one time bucket and protocol/status/severity combination."""
+    bucket = models.DateTimeField()
+    protocol = models.CharField(max_length=50)
+    status = models.CharField(max_length=50)
+    severity = models.CharField(max_length=50, blank=True, default='')
+    packets = models.BigIntegerField(default=0)
+    bytes = models.BigIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'protocol', 'status', 'severity'], name='%(class)s_unique_key'),
+        ]
+        indexes = [models.Index(fields=['bucket'], name='%(class)s_bucket')]
+
+class TrafficRollupMinute(TrafficRollup):
+    pass
+
+class TrafficRollupHour(TrafficRollup):
+    pass
@@ -0,0 +1,16 @@
+# api/pagination.py
+from rest_framework.pagination import CursorPagination
+
+
+class TimestampCursorPagination(CursorPagination):
+    """Keyset pagination, newest first.
+
+    Each page is a range scan on the (timestamp, id) index that starts after the
+    previous page's last row, so the cost of a page does not depend on how deep
+    it is or on the size of the table. Responses are
+    {"next": url, "previous": url, "results": [...]}.
+    """
+    ordering = ("-timestamp", "-id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
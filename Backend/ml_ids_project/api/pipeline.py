@@ -0,0 +1,694 @@
+"""
+Live capture -> feature extraction -> KNN classification pipeline.
+
+PacketFeatureExtractor turns captured packets into UNSW-style records using a
+flow table and the ct_* connection window. ShardedPipeline fans that work out
+to worker processes: the capture side decodes the headers, keeps the one ct_*
+connection window (so the counters do not depend on the number of workers) and
+ships the decoded headers with their counters in micro-batches, sharded by a
+symmetric hash of the canonical 5-tuple, so every packet of a flow (in both
+directions) lands on the same worker, which owns its slice of the flow table
+and its own detector (from its own model registry). Records come back over a
+result queue. Frames are decoded either by Scapy dissection or by the
+struct-based decoder in utils.packet_decoder (IDS_PACKET_DECODER).
+
+This module does not depend on Django so worker processes can import it cheaply.
+"""
+
+import datetime
+import multiprocessing
+import queue
+import threading
+import time
+import uuid
+import zlib
+from collections import deque
+
+from scapy.layers.inet import IP, TCP, UDP
+
+from . import instrumentation as metrics
+from .utils.flow_table import FlowTable, flow_record
+from .utils.packet_decoder import DECODERS, UNDECODED, decode_frame, decode_packet
+from .utils.window_counters import ConnectionWindow
+
+
+_SERVICE_PORTS = {
+    80: "http",
+    443: "https",
+    53: "dns",
+    22: "ssh",
+    21: "ftp",
+    25: "smtp",
+    110: "pop3",
+    143: "imap",
+    3389: "rdp",
+    3306: "mysql",
+    5432: "postgres",
+}
+
+
+def _port_to_service(port: int | None) -> str | None:
+    if port is None:
+        return None
+    return _SERVICE_PORTS.get(int(port))
+
+
+def packet_state(protocol, flags):
+    """Very coarse connection state of one packet: from the TCP flags, CON for UDP."""
+    if protocol == "TCP":
+        if flags & 0x04:
+            return "RST"
+        if flags & 0x01:
+            return "FIN"
+        if (flags & 0x12) == 0x12:  # SYN+ACK
+            return "SA"
+        if flags & 0x02:
+            return "SYN"
+        if flags & 0x10:
+            return "ACK"
+        return None
+    if protocol == "UDP":
+        return "CON"
+    return None
+
+
+def canonical_key(decoded):
+    """
+    Flow key of a decoded packet, the same for both directions.
+
+    Returns:
+        Tuple of (key, fwd): key = (ipA, portA, ipB, portB, protocol) with
+        (ipA, portA) <= (ipB, portB); fwd is True if the packet goes A->B
+    """
+    left = (decoded.src, decoded.sport or 0)
+    right = (decoded.dst, decoded.dport or 0)
+    if left <= right:
+        return (left[0], left[1], right[0], right[1], decoded.protocol), True
+    return (right[0], right[1], left[0], left[1], decoded.protocol), False
+
+
+def decode_captured(layer_cls, frame, fast=True):
+    """
+    Decode a raw captured frame.
+
+    Args:
+        layer_cls: Scapy link-layer class the frame was captured with
+        frame: Frame bytes
+        fast: Try the struct decoder first (Scapy dissects only the frames it cannot decode)
+
+    Returns:
+        Tuple of (DecodedPacket or None, whether Scapy dissected the frame after the fast decoder gave up)
+    """
+    if fast:
+        decoded = decode_frame(frame, layer_cls.__name__)
+        if decoded is not UNDECODED:
+            return decoded, False
+    return decode_packet(layer_cls(frame), IP, TCP, UDP), fast
+
+
+def connection_counters(window, decoded, now_ts):
+    """Add a decoded packet to a ConnectionWindow and return its ct_* counters."""
+    service = _port_to_service(decoded.sport) or _port_to_service(decoded.dport)
+    state = packet_state(decoded.protocol, decoded.flags)
+    return window.add(decoded.src, decoded.dst, decoded.sport, decoded.dport, service, state, decoded.ttl, now_ts)
+
+
+def apply_prediction(data: dict, result: dict | None) -> dict:
+    """Fill a record's status/severity/probability fields from a predict()-style result."""
+    if result is not None:
+        pred_label = result.get('label', 'Normal')
+        data["status"] = pred_label
+        data["severity"] = "Critical" if pred_label == "Anomalous" else "Low"
+        data["pred_idx"] = result.get('prediction', 0)
+        data["pred_prob"] = result.get('confidence', 0.0)
+        data["probs"] = [
+            result.get('probabilities', {}).get('normal', 0.0),
+            result.get('probabilities', {}).get('anomalous', 0.0)
+        ]
+        # Derive numeric label from model prediction for UI/API: 0=normal, 1=anomalous/blocked
+        try:
+            data["label"] = 0 if int(data["pred_idx"]) == 0 else 1
+        except Exception:
+            data["label"] = 0
+    return data
+
+
+def predict_records(detector, records):
+    """
+    Classify records with one vectorized predict_batch call.
+
+    Returns:
+        predict()-style result dicts in record order (all None without a detector)
+    """
+    if detector is None:
+        return [None] * len(records)
+    out = detector.predict_batch(records)
+    return [
+        {'prediction': p, 'label': l, 'confidence': c, 'probabilities': pr}
+        for p, l, c, pr in zip(out['predictions'], out['labels'], out['confidences'], out['probabilities'])
+    ]
+
+
+class PacketFeatureExtractor:
+    """Per-packet flow tracking and ct_* counters producing records to classify."""
+
+    def __init__(self, classify_mode="packet", checkpoint_packets=0, checkpoint_seconds=0,
+                 idle_timeout=60, active_timeout=1800, max_flows=100000, overflow="evict",
+                 ct_window_events=100, ct_window_seconds=None, decoder="scapy"):
+        """
+        Initialize the extractor.
+
+        Args:
+            classify_mode: "packet" emits one record per packet; "flow" emits one record per
+                finished flow (FIN/RST, timeout, eviction) plus optional checkpoints
+            checkpoint_packets: Flow mode: also emit after every N packets of a flow (0 disables)
+            checkpoint_seconds: Flow mode: also emit every T seconds of a flow (0 disables)
+            idle_timeout, active_timeout, max_flows, overflow: FlowTable limits
+            ct_window_events, ct_window_seconds: ConnectionWindow size
+            decoder: How process_frame reads raw frames: "scapy" dissects them, "fast"
+                unpacks the Ethernet/IPv4/TCP/UDP headers directly (same features)
+        """
+        if decoder not in DECODERS:
+            raise ValueError(f"Unknown packet decoder '{decoder}' (expected one of {', '.join(DECODERS)})")
+        self.decoder = decoder
+        self.packets = 0
+        # Frames the fast decoder handed to Scapy (tunnels, truncated headers, other link types)
+        self.dissected_fallbacks = 0
+        self.classify_mode = classify_mode
+        self.checkpoint_packets = checkpoint_packets
+        self.checkpoint_seconds = checkpoint_seconds
+        # Final records of flows evicted from the flow table (idle/active timeout, capacity)
+        self.finished_flows = deque(maxlen=1000)
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        # Per-flow state for basic metrics using canonical 5-tuple key
+        # key = (ipA, portA, ipB, portB, protocol) where (A,portA) < (B,portB) lexicographically
+        self.flow_table = FlowTable(
+            idle_timeout=idle_timeout,
+            active_timeout=active_timeout,
+            max_flows=max_flows,
+            overflow=overflow,
+            on_evict=self._on_flow_finished,
+        )
+        # Rolling window of recent "connections/events" with incrementally maintained ct_* counters
+        self.recent_events = ConnectionWindow(max_events=ct_window_events, max_seconds=ct_window_seconds)
+
+    @classmethod
+    def from_settings(cls, settings):
+        """Build an extractor from the IDS_* Django settings."""
+        return cls(**extractor_config(settings))
+
+    @property
+    def stats(self):
+        """Packets processed, Scapy fallbacks and flow table counts."""
+        flows = self.flow_table.stats
+        return {
+            "packets": self.packets,
+            "dissected_fallbacks": self.dissected_fallbacks,
+            "flows_live": flows["live"],
+            "flows_created": flows["created"],
+            "flows_finished": flows["evicted"],
+            "flows_dropped": flows["dropped"],
+        }
+
+    def _on_flow_finished(self, key, st, reason):
+        record = flow_record(key, st, reason)
+        self.finished_flows.append(record)
+        if self.classify_mode == "flow":
+            with self._pending_lock:
+                self._pending.append(dict(record))
+
+    def _drain(self, records):
+        if self._pending:
+            with self._pending_lock:
+                records.extend(self._pending)
+                self._pending.clear()
+        return records
+
+    def expire(self, now_ts=None):
+        """Expire idle flows; returns finished flow records to classify (flow mode)."""
+        self.flow_table.expire(time.time() if now_ts is None else now_ts)
+        return self._drain([])
+
+    def flush(self):
+        """Finish every live flow; returns their records to classify (flow mode)."""
+        self.flow_table.flush()
+        return self._drain([])
+
+    def process(self, pkt, now_ts=None):
+        """
+        Update flow state and counters for one Scapy packet.
+
+        Args:
+            pkt: Dissected Scapy packet
+            now_ts: Packet timestamp (defaults to the current time)
+
+        Returns:
+            List of records to classify (possibly empty)
+        """
+        return self.process_decoded(decode_packet(pkt, IP, TCP, UDP), now_ts)
+
+    def process_frame(self, layer_cls, frame, now_ts=None):
+        """
+        Update flow state and counters for one raw captured frame.
+
+        Args:
+            layer_cls: Scapy link-layer class the frame was captured with
+            frame: Frame bytes
+            now_ts: Packet timestamp (defaults to the current time)
+
+        Returns:
+            List of records to classify (possibly empty)
+        """
+        decoded, dissected = decode_captured(layer_cls, frame, fast=self.decoder == "fast")
+        if dissected:
+            self.dissected_fallbacks += 1
+        return self.process_decoded(decoded, now_ts)
+
+    def process_decoded(self, decoded, now_ts=None, ct=None):
+        """
+        Update flow state and counters for one decoded packet.
+
+        Args:
+            decoded: DecodedPacket, or None for a packet without an IPv4 layer
+            now_ts: Packet timestamp (defaults to the current time)
+            ct: ct_* counters of the packet from a connection window kept elsewhere
+                (ShardedPipeline's capture side); this extractor's own window otherwise
+
+        Returns:
+            List of records to classify (possibly empty)
+        """
+        self.packets += 1
+        records = []
+        if decoded is None:
+            return records
+        src, dst, protocol_str, length_val, ttl_val, sport, dport, flags, win, seq = decoded
+        key, fwd = canonical_key(decoded)
+
+        now_ts = datetime.datetime.now().timestamp() if now_ts is None else now_ts
+        # Update rolling events window and read the ct_* counters (O(1) per packet); every
+        # packet counts, including those of flows the full table drops
+        if ct is None:
+            ct = connection_counters(self.recent_events, decoded, now_ts)
+        st = self.flow_table.get(key, now_ts)
+        if st is None:
+            # Flow table is full and configured to drop new flows
+            return self._drain(records)
+
+        # Update counters by direction
+        if fwd:
+            st.spkts += 1
+            st.sbytes += length_val
+            st.smean_sum += length_val
+            if st.last_s_ts is not None:
+                dt = max(0.0, now_ts - st.last_s_ts)
+                if st.last_s_dt is not None:
+                    st.sjit += abs(dt - st.last_s_dt)
+                st.last_s_dt = dt
+            st.last_s_ts = now_ts
+            st.sttl = ttl_val
+        else:
+            st.dpkts += 1
+            st.dbytes += length_val
+            st.dmean_sum += length_val
+            if st.last_d_ts is not None:
+                dt = max(0.0, now_ts - st.last_d_ts)
+                if st.last_d_dt is not None:
+                    st.djit += abs(dt - st.last_d_dt)
+                st.last_d_dt = dt
+            st.last_d_ts = now_ts
+            st.dttl = ttl_val
+
+        # TCP-specific fields and timing
+        state = packet_state(protocol_str, flags)
+        if protocol_str == "TCP":
+            # Save window and base seq per direction (first seen)
+            if fwd:
+                if st.swin is None:
+                    st.swin = win
+                if st.stcpb is None:
+                    st.stcpb = seq
+            else:
+                if st.dwin is None:
+                    st.dwin = win
+                if st.dtcpb is None:
+                    st.dtcpb = seq
+
+            # TCP handshake timing (assumes A initiates)
+            syn = bool(flags & 0x02)
+            ack_flag = bool(flags & 0x10)
+            # SYN from A->B
+            if fwd and syn and not ack_flag:
+                st.t_syn = now_ts
+            # SYN-ACK from B->A
+            if (not fwd) and syn and ack_flag:
+                st.t_synack = now_ts
+                if st.t_syn is not None:
+                    st.synack = max(0.0, now_ts - st.t_syn)
+            # Final ACK from A->B
+            if fwd and (not syn) and ack_flag:
+                st.t_ack = now_ts
+                if st.t_syn is not None:
+                    st.tcprtt = max(0.0, now_ts - st.t_syn)
+
+        # Service and state
+        service = _port_to_service(sport) or _port_to_service(dport)
+        is_sm_ips_ports = int((src == dst) and ((sport or 0) == (dport or 0)))
+
+        if self.classify_mode == "flow":
+            st.service = service
+            st.ct = ct
+            if state == "FIN":
+                st.fins |= 1 if fwd else 2
+            if not st.fins or state in ("FIN", "RST"):
+                # Keep FIN as the state of a closing flow through its last ACKs
+                st.state = state
+            # Finished on RST, or on the first packet after both directions sent a FIN (the
+            # final ACK), so the teardown does not start new flows; its final record is
+            # queued by _on_flow_finished. Without that ACK the idle timeout closes it.
+            if state == "RST" or (st.fins == 3 and state != "FIN"):
+                self.flow_table.remove(key, "closed")
+            elif st.checkpoint_due(now_ts, self.checkpoint_packets, self.checkpoint_seconds):
+                records.append(flow_record(key, st, "checkpoint"))
+            return self._drain(records)
+
+        data = {
+            "id": str(uuid.uuid4()),
+            "timestamp": datetime.datetime.fromtimestamp(now_ts).isoformat(),
+            "source_ip": src,
+            "destination_ip": dst,
+            "protocol": protocol_str,
+            "proto": protocol_str.lower(),
+            "bytes": length_val,
+            # Filled in by the KNN batcher; Normal until classified
+            "status": "Normal",
+            "severity": "Low",
+            "probs": [],
+            "pred_idx": 0,
+            "pred_prob": 0.0,
+            "label": 0,
+            # Extended metrics (best-effort live approximation)
+            **st.metrics(now_ts),
+            "service": service,
+            "state": state,
+            "is_sm_ips_ports": is_sm_ips_ports,
+            # Rolling counters over the recent connection window
+            **ct,
+        }
+        records.append(data)
+        return self._drain(records)
+
+
+def extractor_config(settings):
+    """Read PacketFeatureExtractor keyword arguments from the IDS_* Django settings."""
+    return {
+        "classify_mode": getattr(settings, "IDS_CLASSIFY_MODE", "packet"),
+        "checkpoint_packets": getattr(settings, "IDS_FLOW_CHECKPOINT_PACKETS", 0),
+        "checkpoint_seconds": getattr(settings, "IDS_FLOW_CHECKPOINT_SECONDS", 0),
+        "idle_timeout": getattr(settings, "IDS_FLOW_IDLE_TIMEOUT", 60),
+        "active_timeout": getattr(settings, "IDS_FLOW_ACTIVE_TIMEOUT", 1800),
+        "max_flows": getattr(settings, "IDS_FLOW_TABLE_MAX_FLOWS", 100000),
+        "overflow": getattr(settings, "IDS_FLOW_TABLE_OVERFLOW", "evict"),
+        "ct_window_events": getattr(settings, "IDS_CT_WINDOW_EVENTS", 100),
+        "ct_window_seconds": getattr(settings, "IDS_CT_WINDOW_SECONDS", None),
+        "decoder": getattr(settings, "IDS_PACKET_DECODER", "scapy"),
+    }
+
+
+def symmetric_flow_hash(decoded) -> int:
+    """
+    Hash of the canonical 5-tuple of a decoded packet, equal for both directions.
+
+    Deterministic across processes and runs (unlike hash()); 0 for packets without IPv4.
+    """
+    if decoded is None:
+        return 0
+    key, _ = canonical_key(decoded)
+    return zlib.crc32(("%s|%d|%s|%d|%s" % key).encode())
+
+
+def _worker_main(worker_id, in_queue, out_queue, detector_paths, config, collect_metrics=False):
+    """
+    Worker process: track its flows, classify and return records.
+
+    Batches hold (decoded packet, timestamp, ct_* counters) from the capture side.
+
+    Every message to the parent is (worker_id, records, extractor stats, drained
+    metrics); records is None once the worker has finished.
+    """
+    # Imported here so the parent does not need sklearn just to start workers
+    from .utils.model_registry import registry
+
+    metrics.registry.enabled = collect_metrics
+
+    try:
+        # Each worker serves from its own process-wide registry and picks up model reloads
+        detector = registry.handle(*detector_paths) if detector_paths else None
+        if detector is not None:
+            detector.current()
+    except Exception as e:
+        print(f"Pipeline worker {worker_id}: classifier unavailable ({e})")
+        detector = None
+    extractor = PacketFeatureExtractor(**config)
+
+    def send(records):
+        out_queue.put((worker_id, records, extractor.stats, metrics.registry.drain() if collect_metrics else None))
+
+    def classify(records):
+        if not records:
+            return
+        started = metrics.registry.clock()
+        try:
+            results = predict_records(detector, records)
+        except Exception as e:
+            metrics.ERRORS.labels("inference").inc()
+            print(f"Pipeline worker {worker_id}: batch inference failed ({len(records)} items): {e}")
+            results = [None] * len(records)
+        if detector is not None:
+            metrics.INFERENCE_SECONDS.observe_since(started)
+        send([apply_prediction(r, res) for r, res in zip(records, results)])
+
+    while True:
+        try:
+            batch = in_queue.get(timeout=1.0)
+        except queue.Empty:
+            classify(extractor.expire())
+            # Keep the parent's flow counts current while idle
+            send([])
+            continue
+        if batch is None:
+            classify(extractor.flush())
+            send(None)
+            return
+        records = []
+        for decoded, ts, ct in batch:
+            started = metrics.registry.clock()
+            try:
+                records.extend(extractor.process_decoded(decoded, ts, ct))
+            except Exception as e:
+                metrics.PACKET_ERRORS.inc()
+                print(f"Pipeline worker {worker_id}: error processing a packet: {e}")
+                continue
+            metrics.EXTRACT_SECONDS.observe_since(started)
+        classify(records)
+
+
+class ShardedPipeline:
+    """
+    Distribute captured packets to worker processes by symmetric flow hash.
+
+    The capture side decodes every frame (struct decoder, Scapy only for the
+    frames it cannot decode: the features are the same either way) and keeps
+    the ct_* connection window, so the counters see all traffic in capture
+    order whatever the number of workers; the flow table and classification
+    are sharded.
+    """
+
+    def __init__(self, workers, on_record, detector_paths=None, config=None,
+                 batch_size=64, max_wait_ms=20.0, queue_size=1024, collect_metrics=False):
+        """
+        Initialize the pipeline.
+
+        Args:
+            workers: Number of worker processes
+            on_record: Callable(record) invoked in this process for every classified record
+            detector_paths: (model_path, features_path, scaler_path) loaded by every worker
+            config: PacketFeatureExtractor keyword arguments
+            batch_size: Frames per message sent to a worker
+            max_wait_ms: Maximum time a frame waits in the capture-side buffer
+            queue_size: Bound on pending messages per worker (capture drops when full)
+            collect_metrics: Have workers record pipeline metrics and merge them into this process
+        """
+        self.workers = max(1, int(workers))
+        self.on_record = on_record
+        self.detector_paths = detector_paths
+        self.config = config or {}
+        self.batch_size = max(1, int(batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self._ctx = multiprocessing.get_context("spawn")
+        self._in_queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._out_queue = self._ctx.Queue()
+        self._buffers = [[] for _ in range(self.workers)]
+        self._buffer_started = [0.0] * self.workers
+        self._lock = threading.Lock()
+        # Wakes the flush timer when a buffer starts filling
+        self._buffer_cond = threading.Condition(self._lock)
+        self._closed = False
+        self.window = ConnectionWindow(
+            max_events=self.config.get("ct_window_events", 100),
+            max_seconds=self.config.get("ct_window_seconds"),
+        )
+        # Frames the struct decoder left to Scapy dissection on the capture side
+        self.dissected_fallbacks = 0
+        self._processes = []
+        self._reader = None
+        self._flusher = None
+        self.collect_metrics = collect_metrics
+        # Latest PacketFeatureExtractor.stats reported by each worker
+        self.worker_stats = {}
+        self.dropped = 0
+
+    def start(self):
+        for worker_id, in_queue in enumerate(self._in_queues):
+            proc = self._ctx.Process(
+                target=_worker_main,
+                args=(worker_id, in_queue, self._out_queue, self.detector_paths, self.config,
+                      self.collect_metrics),
+                name=f"ids-pipeline-worker-{worker_id}",
+                daemon=True,
+            )
+            proc.start()
+            self._processes.append(proc)
+        self._reader = threading.Thread(target=self._read_results, name="ids-pipeline-results", daemon=True)
+        self._reader.start()
+        self._flusher = threading.Thread(target=self._flush_stale, name="ids-pipeline-flush", daemon=True)
+        self._flusher.start()
+        return self
+
+    def submit(self, pkt, now_ts=None):
+        """Route a dissected Scapy packet to its flow's worker (capture thread)."""
+        metrics.PACKETS_CAPTURED.inc()
+        try:
+            decoded = decode_packet(pkt, IP, TCP, UDP)
+        except Exception as e:
+            metrics.PACKET_ERRORS.inc()
+            print(f"Error decoding a Scapy packet: {e}")
+            return
+        self._route(decoded, now_ts)
+
+    def submit_frame(self, layer_cls, frame, now_ts=None):
+        """Route a raw captured frame of link-layer class layer_cls to its flow's worker."""
+        metrics.PACKETS_CAPTURED.inc()
+        try:
+            decoded, dissected = decode_captured(layer_cls, frame)
+        except Exception as e:
+            metrics.PACKET_ERRORS.inc()
+            print(f"Error decoding a captured frame: {e}")
+            return
+        if dissected:
+            self.dissected_fallbacks += 1
+        self._route(decoded, now_ts)
+
+    def _route(self, decoded, now_ts):
+        ts = datetime.datetime.now().timestamp() if now_ts is None else now_ts
+        ct = connection_counters(self.window, decoded, ts) if decoded is not None else None
+        shard = symmetric_flow_hash(decoded) % self.workers
+        with self._lock:
+            buf = self._buffers[shard]
+            if not buf:
+                self._buffer_started[shard] = time.monotonic()
+                self._buffer_cond.notify()
+            buf.append((decoded, ts, ct))
+            if len(buf) >= self.batch_size or time.monotonic() - self._buffer_started[shard] >= self.max_wait:
+                self._send(shard)
+
+    def extractor_stats(self):
+        """PacketFeatureExtractor.stats summed over the workers (Scapy fallbacks happen here)."""
+        totals = {}
+        for stats in list(self.worker_stats.values()):
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+        totals["dissected_fallbacks"] = totals.get("dissected_fallbacks", 0) + self.dissected_fallbacks
+        return totals
+
+    def queue_depths(self):
+        """Frames buffered on the capture side and batches waiting in the worker queues."""
+        with self._lock:
+            buffered = sum(len(buf) for buf in self._buffers)
+        try:
+            waiting = sum(q.qsize() for q in self._in_queues)
+        except NotImplementedError:
+            # multiprocessing queues have no qsize() on macOS
+            waiting = 0
+        return {"pipeline_buffer": buffered, "pipeline_workers": waiting}
+
+    def flush(self):
+        """Send every partially filled buffer to its worker."""
+        with self._lock:
+            for shard in range(self.workers):
+                if self._buffers[shard]:
+                    self._send(shard)
+
+    def stop(self, timeout=5.0):
+        """Flush buffers, let workers finish their flows and stop them."""
+        with self._lock:
+            self._closed = True
+            self._buffer_cond.notify()
+        self.flush()
+        for in_queue in self._in_queues:
+            try:
+                in_queue.put(None, timeout=timeout)
+            except queue.Full:
+                pass
+        for proc, in_queue in zip(self._processes, self._in_queues):
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+                # Its unread batches are lost: don't block interpreter exit flushing them
+                in_queue.cancel_join_thread()
+
+    def _send(self, shard):
+        batch = self._buffers[shard]
+        self._buffers[shard] = []
+        try:
+            self._in_queues[shard].put_nowait(batch)
+        except queue.Full:
+            # Worker is saturated: shed load at the capture side instead of blocking sniffing
+            self.dropped += len(batch)
+
+    def _flush_stale(self):
+        """Timer thread: send each buffer once it is max_wait old, even if its shard gets no more frames."""
+        with self._buffer_cond:
+            while not self._closed:
+                now = time.monotonic()
+                next_due = None
+                for shard in range(self.workers):
+                    if not self._buffers[shard]:
+                        continue
+                    due = self._buffer_started[shard] + self.max_wait - now
+                    if due <= 0:
+                        self._send(shard)
+                    elif next_due is None or due < next_due:
+                        next_due = due
+                # Sleep until the next deadline, or until a buffer starts filling
+                self._buffer_cond.wait(next_due)
+
+    def _read_results(self):
+        finished = 0
+        while finished < self.workers:
+            try:
+                worker_id, records, stats, drained = self._out_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            self.worker_stats[worker_id] = stats
+            if drained:
+                metrics.registry.merge(drained)
+            if records is None:
+                finished += 1
+                continue
+            for record in records:
+                try:
+                    self.on_record(record)
+                except Exception as e:
+                    metrics.ERRORS.labels("deliver").inc()
+                    print(f"Error delivering pipeline record: {e}")
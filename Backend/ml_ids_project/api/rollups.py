@@ -0,0 +1,160 @@
+"""
+Per-minute and per-hour traffic rollups.
+
+Each rollup row holds the packet and byte counts of one time bucket for one
+protocol/status/severity combination, so totals and per-protocol, per-status
+and per-severity breakdowns of any period are SUM/GROUP BY queries over a
+few rows per bucket instead of scans over raw traffic rows. The batched
+persistence path folds every written batch into both granularities; rows
+saved, changed or deleted one at a time (API, admin, `_save_traffic_row`) are
+folded in by the model signal handlers below. `backfill` rebuilds them from
+the raw rows that already exist.
+"""
+
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncHour, TruncMinute
+
+from .models import NetworkTraffic, TrafficRollupHour, TrafficRollupMinute
+
+
+# Rollup model -> (Python bucket function, database truncation)
+GRANULARITIES = {
+    TrafficRollupMinute: (lambda ts: ts.replace(second=0, microsecond=0), TruncMinute),
+    TrafficRollupHour: (lambda ts: ts.replace(minute=0, second=0, microsecond=0), TruncHour),
+}
+
+# Statuses counted as anomalies
+ANOMALOUS_STATUSES = ("Anomalous", "Blocked")
+
+
+def rollup_counts(rows, bucket_of):
+    """Aggregate traffic rows into {(bucket, protocol, status, severity): [packets, bytes]}."""
+    counts = defaultdict(lambda: [0, 0])
+    for row in rows:
+        entry = counts[(bucket_of(row.timestamp), row.protocol or "", row.status or "Normal", row.severity or "")]
+        entry[0] += 1
+        entry[1] += int(row.bytes or 0)
+    return counts
+
+
+def _add_counts(model, key, packets, nbytes):
+    updated = model.objects.filter(**key).update(packets=F("packets") + packets, bytes=F("bytes") + nbytes)
+    if updated or packets < 0:
+        return
+    try:
+        # Savepoint, so a lost insert race leaves the surrounding transaction usable
+        with transaction.atomic():
+            model.objects.create(packets=packets, bytes=nbytes, **key)
+    except IntegrityError:
+        # Another writer inserted the combination since the UPDATE: add to its row
+        model.objects.filter(**key).update(packets=F("packets") + packets, bytes=F("bytes") + nbytes)
+
+
+def apply_rollups(rows, sign=1):
+    """
+    Add saved traffic rows to the minute and hour rollups (or remove them with sign=-1).
+
+    Issues one UPDATE (or INSERT for a new combination) per distinct
+    bucket/protocol/status/severity in the batch, in one transaction.
+    """
+    with transaction.atomic():
+        for model, (bucket_of, _) in GRANULARITIES.items():
+            for (bucket, protocol, status, severity), (packets, nbytes) in rollup_counts(rows, bucket_of).items():
+                key = dict(bucket=bucket, protocol=protocol, status=status, severity=severity)
+                _add_counts(model, key, sign * packets, sign * nbytes)
+            if sign < 0:
+                model.objects.filter(packets__lte=0).delete()
+
+
+def traffic_pre_save(sender, instance, raw=False, **kwargs):
+    """Remember the stored version of a row being updated, so post_save can move its counts."""
+    instance._rollup_previous = None
+    if raw or instance._state.adding:
+        return
+    instance._rollup_previous = sender.objects.filter(pk=instance.pk).only(
+        "timestamp", "protocol", "status", "severity", "bytes"
+    ).first()
+
+
+def traffic_post_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_rollup_previous", None)
+    instance._rollup_previous = None
+    with transaction.atomic():
+        if previous is not None:
+            apply_rollups([previous], sign=-1)
+        apply_rollups([instance])
+
+
+def traffic_post_delete(sender, instance, **kwargs):
+    apply_rollups([instance], sign=-1)
+
+
+def backfill(since=None, clear=True):
+    """
+    Rebuild the rollups from raw NetworkTraffic rows.
+
+    Args:
+        since: Only rebuild buckets from this time on (all of history if None);
+            should be aligned to an hour so no hour bucket is rebuilt from part of its rows
+        clear: Delete existing rollups in the range first (set False only for empty tables)
+
+    Returns:
+        Dictionary of rollup model name -> rows written
+    """
+    written = {}
+    traffic = NetworkTraffic.objects.all()
+    if since is not None:
+        traffic = traffic.filter(timestamp__gte=since)
+    with transaction.atomic():
+        for model, (_, trunc) in GRANULARITIES.items():
+            if clear:
+                existing = model.objects.all()
+                if since is not None:
+                    existing = existing.filter(bucket__gte=since)
+                existing.delete()
+            rows = (
+                traffic.annotate(bucket=trunc("timestamp"))
+                .values("bucket", "protocol", "status", "severity")
+                .annotate(packets=Count("id"), total_bytes=Sum("bytes"))
+                .order_by()
+            )
+            # NULL and empty values share a rollup key, so merge them before inserting
+            counts = defaultdict(lambda: [0, 0])
+            for row in rows.iterator():
+                entry = counts[(row["bucket"], row["protocol"] or "", row["status"] or "Normal", row["severity"] or "")]
+                entry[0] += row["packets"]
+                entry[1] += row["total_bytes"] or 0
+            objs = [
+                model(bucket=bucket, protocol=protocol, status=status, severity=severity, packets=packets, bytes=nbytes)
+                for (bucket, protocol, status, severity), (packets, nbytes) in counts.items()
+            ]
+            model.objects.bulk_create(objs, batch_size=1000)
+            written[model.__name__] = len(objs)
+    return written
+
+
+def clear_rollups():
+    for model in GRANULARITIES:
+        model.objects.all().delete()
+
+
+def clear_traffic():
+    """
+    Delete every traffic row and every rollup.
+
+    Deletes in one statement instead of through the per-row delete signals,
+    which would fetch and subtract each row only to empty the rollups anyway.
+
+    Returns:
+        Number of traffic rows deleted
+    """
+    with transaction.atomic():
+        qs = NetworkTraffic.objects.all()
+        deleted = qs._raw_delete(qs.db)
+        clear_rollups()
+    return deleted
@@ -0,0 +1,275 @@
+"""
+Compiled, indexed evaluation of response rules.
+
+A rule condition is a comma-separated list of key=value clauses; a rule
+matches an incident when every clause equals (case-insensitively) the
+incident field of that name. Active rules are parsed once into tuples of
+lowercased clauses and indexed by the value of one of their keys
+(preferring severity and threat_type), so an incident only checks the rules
+filed under its own values instead of every rule. The compiled set is
+dropped whenever a ResponseRule is saved or deleted in this process and is
+reloaded at least every `max_age` seconds, which picks up edits made by
+other processes (the REST API and the capture service run separately).
+
+Matches are buffered: their LogEntry rows are written with one bulk_create
+and the triggered_count increments with one F() update per distinct count,
+once `flush_interval` has passed or `batch_size` matches are pending (the
+TrafficWriter thread watches the timer, see db_utils). A batch whose write
+fails goes back to the front of the buffer and is retried `flush_interval`
+later; only once `max_pending` matches are buffered are failed batches
+dropped, and counted in ids_rule_matches_dropped_total.
+"""
+
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+
+from . import instrumentation as metrics
+from .models import LogEntry, ResponseRule
+
+
+# Keys preferred for indexing, most selective first; any other key still works
+INDEX_KEYS = ("threat_type", "severity", "status", "source_ip", "destination_ip")
+
+
+def parse_condition(condition):
+    """
+    Parse a rule condition into ((key, lowercased value), ...).
+
+    Returns:
+        Tuple of clauses, or None if the rule can never match (empty condition
+        or a clause without '=')
+    """
+    condition = (condition or "").strip()
+    if not condition:
+        return None
+    clauses = []
+    for clause in condition.split(","):
+        clause = clause.strip()
+        if not clause:
+            continue
+        if "=" not in clause:
+            return None
+        key, value = [part.strip() for part in clause.split("=", 1)]
+        clauses.append((key, value.lower()))
+    return tuple(clauses)
+
+
+class CompiledRule:
+    __slots__ = ("id", "name", "action", "clauses")
+
+    def __init__(self, rule, clauses):
+        self.id = rule.id
+        self.name = rule.name
+        self.action = rule.action
+        self.clauses = clauses
+
+    def matches(self, values):
+        for key, expected in self.clauses:
+            value = values.get(key)
+            if value is None or value != expected:
+                return False
+        return True
+
+
+class RuleSet:
+    """Active rules indexed as {key: {lowercased value: [CompiledRule]}}, in rule creation order."""
+
+    def __init__(self, rules):
+        self.size = 0
+        self.index = defaultdict(lambda: defaultdict(list))
+        # Conditions made only of empty clauses match every incident
+        self.unconditional = []
+        order = 0
+        for rule in rules:
+            clauses = parse_condition(rule.condition)
+            if clauses is None:
+                continue
+            compiled = CompiledRule(rule, clauses)
+            compiled_order = (order, compiled)
+            order += 1
+            self.size += 1
+            if not clauses:
+                self.unconditional.append(compiled_order)
+                continue
+            keys = dict(clauses)
+            key = next((k for k in INDEX_KEYS if k in keys), clauses[0][0])
+            self.index[key][keys[key]].append(compiled_order)
+        self.keys = tuple(self.index)
+
+    def match(self, values):
+        """
+        Rules whose every clause matches.
+
+        Args:
+            values: Incident fields as {key: lowercased string}
+
+        Returns:
+            Matching CompiledRules in rule creation order
+        """
+        candidates = list(self.unconditional)
+        for key in self.keys:
+            value = values.get(key)
+            if value is not None:
+                candidates.extend(self.index[key].get(value, ()))
+        if len(candidates) > 1:
+            candidates.sort(key=lambda item: item[0])
+        return [rule for _, rule in candidates if rule.matches(values)]
+
+
+def incident_values(incident):
+    """Lowercased string form of every incident field a condition can refer to."""
+    return {key: str(value).lower() for key, value in incident.items() if value is not None}
+
+
+class RuleEngine:
+    """Process-wide cache of the compiled rule set plus the buffer of pending matches."""
+
+    def __init__(self, max_age=30.0, flush_interval=1.0, batch_size=200, max_pending=10000):
+        self.max_age = max_age
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._rules = None
+        self._loaded_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._pending_logs = []
+        self._pending_counts = Counter()
+        self._oldest_pending = None
+        # After a failed write, no retry before this time (monotonic)
+        self._retry_at = None
+        self.flushed = 0
+
+    @classmethod
+    def from_settings(cls, settings):
+        return cls(
+            max_age=getattr(settings, "IDS_RULE_CACHE_SECONDS", 30.0),
+            flush_interval=getattr(settings, "IDS_RULE_FLUSH_INTERVAL", 1.0),
+            batch_size=getattr(settings, "IDS_RULE_FLUSH_BATCH", 200),
+            max_pending=getattr(settings, "IDS_RULE_MAX_PENDING", 10000),
+        )
+
+    def invalidate(self, **kwargs):
+        """Drop the compiled rules; also usable directly as a signal receiver."""
+        with self._lock:
+            self._rules = None
+            self._generation += 1
+
+    def current(self):
+        """The cached rule set, or None if it has to be (re)loaded from the database."""
+        rules = self._rules
+        if rules is None or time.monotonic() - self._loaded_at >= self.max_age:
+            return None
+        return rules
+
+    def rules(self):
+        """The compiled rule set, (re)loading it from the database if needed."""
+        rules = self.current()
+        if rules is not None:
+            return rules
+        with self._lock:
+            generation = self._generation
+        rules = RuleSet(ResponseRule.objects.filter(is_active=True).order_by("created_at"))
+        with self._lock:
+            # A rule changed while loading; keep the fresh set out of the cache
+            if generation == self._generation:
+                self._rules = rules
+                self._loaded_at = time.monotonic()
+        return rules
+
+    def match(self, incident):
+        """Compiled rules matching an incident (dict of incident fields)."""
+        return self.rules().match(incident_values(incident))
+
+    def record(self, matches, incident_id):
+        """Buffer the log entries and triggered_count increments of matched rules."""
+        if not matches:
+            return
+        with self._lock:
+            for rule in matches:
+                self._pending_logs.append(LogEntry(
+                    action=rule.action or "rule_trigger",
+                    target=str(incident_id or ""),
+                    result="Success",
+                    details=f"Rule '{rule.name}' triggered for incident {incident_id}",
+                    severity="Info",
+                ))
+                self._pending_counts[rule.id] += 1
+            if self._oldest_pending is None:
+                self._oldest_pending = time.monotonic()
+
+    @property
+    def pending(self):
+        """Number of buffered matches not yet written."""
+        return len(self._pending_logs)
+
+    def flush_due(self):
+        return self.flush_wait() == 0.0
+
+    def flush_wait(self):
+        """Seconds until the buffered matches are due to be written (0.0 if due), or None if there are none."""
+        with self._lock:
+            if self._oldest_pending is None:
+                return None
+            now = time.monotonic()
+            if self._retry_at is not None and now < self._retry_at:
+                return self._retry_at - now
+            if len(self._pending_logs) >= self.batch_size:
+                return 0.0
+            return max(0.0, self._oldest_pending + self.flush_interval - now)
+
+    def flush(self):
+        """
+        Write pending log entries and triggered_count increments.
+
+        Returns:
+            Number of matches written
+
+        Raises:
+            Exception: The database error, after the batch has been put back (or dropped, see
+                max_pending)
+        """
+        with self._lock:
+            logs, counts = self._pending_logs, self._pending_counts
+            oldest = self._oldest_pending
+            self._pending_logs, self._pending_counts = [], Counter()
+            self._oldest_pending = None
+        if not logs:
+            return 0
+        by_increment = defaultdict(list)
+        for rule_id, increment in counts.items():
+            by_increment[increment].append(rule_id)
+        try:
+            with transaction.atomic():
+                LogEntry.objects.bulk_create(logs)
+                for increment, rule_ids in by_increment.items():
+                    ResponseRule.objects.filter(id__in=rule_ids).update(
+                        triggered_count=F("triggered_count") + increment
+                    )
+        except Exception:
+            self._restore(logs, counts, oldest)
+            raise
+        with self._lock:
+            self._retry_at = None
+        self.flushed += len(logs)
+        return len(logs)
+
+    def _restore(self, logs, counts, oldest):
+        """Put a batch that failed to write back in front of the matches recorded since."""
+        with self._lock:
+            self._retry_at = time.monotonic() + self.flush_interval
+            if len(self._pending_logs) + len(logs) > self.max_pending:
+                metrics.RULE_MATCHES_DROPPED.inc(len(logs))
+                return
+            self._pending_logs[:0] = logs
+            self._pending_counts.update(counts)
+            self._oldest_pending = oldest
+
+
+# Shared by everything in this process; ApiConfig.ready() connects the invalidation signals
+engine = RuleEngine.from_settings(settings)
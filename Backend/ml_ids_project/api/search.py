@@ -0,0 +1,165 @@
+"""
+Indexed traffic search.
+
+A query string is split into terms and every term is turned into a filter
+that an index can answer; all terms must match:
+
+- a full IP address      -> exact match on source_ip or destination_ip
+- an IPv4 CIDR block     -> integer range on source_ip_num/destination_ip_num
+- a partial address      -> prefix range on source_ip or destination_ip
+- a protocol, status or severity name -> equality on that column
+- anything else          -> free text: substring match through the optional
+                            FTS5 trigram index (see `manage.py build_search_index`),
+                            or a case-insensitive scan without it
+
+Explicit ?ip=, ?cidr=, ?protocol=, ?status= and ?severity= parameters are
+applied the same way.
+"""
+
+import ipaddress
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import NetworkTraffic
+from .utils.ip_codec import cidr_range, is_ip_like, prefix_successor
+
+
+TRAFFIC_TABLE = NetworkTraffic._meta.db_table
+FTS_TABLE = "api_networktraffic_fts"
+FTS_COLUMNS = ("source_ip", "destination_ip", "protocol", "status", "severity")
+# Integer key of the index (see NetworkTraffic.fts_rowid)
+FTS_ROWID = "fts_rowid"
+# Insert, delete, update and key-keeping triggers created by build_search_index
+FTS_TRIGGERS = tuple(f"{FTS_TABLE}_{suffix}" for suffix in ("ai", "ad", "au", "key"))
+
+PROTOCOLS = ("TCP", "UDP", "ICMP", "IP")
+STATUSES = tuple(value for value, _ in NetworkTraffic._meta.get_field("status").choices)
+SEVERITIES = tuple(value for value, _ in NetworkTraffic._meta.get_field("severity").choices)
+
+# Trigram FTS needs at least three characters to match anything
+FTS_MIN_LENGTH = 3
+
+
+def _enum(values, term):
+    for value in values:
+        if value.lower() == term.lower():
+            return value
+    return None
+
+
+def ip_filter(term):
+    """Filter for an address, CIDR block or address prefix; None if term is not IP-like."""
+    bounds = cidr_range(term)
+    if bounds is not None:
+        low, high = bounds
+        return Q(source_ip_num__range=(low, high)) | Q(destination_ip_num__range=(low, high))
+    if not is_ip_like(term):
+        return None
+    try:
+        ipaddress.ip_address(term)
+        return Q(source_ip=term) | Q(destination_ip=term)
+    except ValueError:
+        upper = prefix_successor(term)
+        return (
+            Q(source_ip__gte=term, source_ip__lt=upper)
+            | Q(destination_ip__gte=term, destination_ip__lt=upper)
+        )
+
+
+_stale_reported = False
+
+
+def fts_status():
+    """
+    State of the FTS5 trigram index in this database.
+
+    Returns:
+        "ready", "missing" (never built, or not SQLite) or "stale": the index table exists but a
+        migration rebuilt the traffic table and dropped its triggers, so it no longer follows writes
+    """
+    if connection.vendor != "sqlite":
+        return "missing"
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return "missing"
+        placeholders = ", ".join(["%s"] * len(FTS_TRIGGERS))
+        cursor.execute(
+            f"SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = %s AND name IN ({placeholders})",
+            [TRAFFIC_TABLE, *FTS_TRIGGERS],
+        )
+        return "ready" if cursor.fetchone()[0] == len(FTS_TRIGGERS) else "stale"
+
+
+def fts_available():
+    """Whether the FTS5 trigram index is built and up to date; reports a stale index once."""
+    global _stale_reported
+    status = fts_status()
+    if status == "stale" and not _stale_reported:
+        _stale_reported = True
+        print(f"Search index {FTS_TABLE} is stale (traffic table rebuilt): free-text search scans "
+              f"the table until `manage.py build_search_index` is run again")
+    return status == "ready"
+
+
+def text_filter(queryset, term, use_fts):
+    if use_fts and len(term) >= FTS_MIN_LENGTH:
+        # A quoted trigram query matches the term as a substring of any indexed column
+        match = '"' + term.replace('"', '""') + '"'
+        return queryset.extra(
+            where=[f'"api_networktraffic"."{FTS_ROWID}" IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)'],
+            params=[match],
+        )
+    return queryset.filter(
+        Q(source_ip__icontains=term)
+        | Q(destination_ip__icontains=term)
+        | Q(protocol__icontains=term)
+        | Q(status__icontains=term)
+        | Q(severity__icontains=term)
+    )
+
+
+def search_traffic(params, queryset=None):
+    """
+    Filter traffic by a query string (params["q"]) and explicit filter parameters.
+
+    Raises:
+        ValueError: If an explicit filter parameter is invalid
+    """
+    qs = NetworkTraffic.objects.all() if queryset is None else queryset
+
+    for name, values, field in (("protocol", PROTOCOLS, "protocol"),
+                                ("status", STATUSES, "status"),
+                                ("severity", SEVERITIES, "severity")):
+        value = params.get(name, "").strip()
+        if value:
+            qs = qs.filter(**{field: _enum(values, value) or value})
+    for name in ("ip", "cidr"):
+        value = params.get(name, "").strip()
+        if value:
+            condition = ip_filter(value)
+            if condition is None:
+                raise ValueError(f"'{name}' must be an IP address, prefix or CIDR block")
+            qs = qs.filter(condition)
+
+    use_fts = None
+    for term in params.get("q", "").split():
+        condition = ip_filter(term)
+        if condition is not None:
+            qs = qs.filter(condition)
+            continue
+        status_value = _enum(STATUSES, term)
+        severity_value = _enum(SEVERITIES, term)
+        protocol_value = _enum(PROTOCOLS, term)
+        if status_value:
+            qs = qs.filter(status=status_value)
+        elif severity_value:
+            qs = qs.filter(severity=severity_value)
+        elif protocol_value:
+            qs = qs.filter(protocol=protocol_value)
+        else:
+            if use_fts is None:
+                use_fts = fts_available()
+            qs = text_filter(qs, term, use_fts)
+    return qs
@@ -5,7 +5,7 @@ from .models import NetworkTraffic, ThreatIncident, ResponseRule, LogEntry
 class NetworkTrafficSerializer(serializers.ModelSerializer):
     class Meta:
         model = NetworkTraffic
-        fields = '__all__'
+        exclude = ('source_ip_num', 'destination_ip_num', 'fts_rowid')
 
 class ThreatIncidentSerializer(serializers.ModelSerializer):
     class Meta:
@@ -0,0 +1,89 @@
+"""
+Aggregated dashboard statistics.
+
+Everything the dashboard shows is computed in the database: traffic figures
+are sums over the hourly rollups (a few rows per hour, see rollups.py) and
+incident figures are indexed COUNT/GROUP BY queries, so a request returns a
+few dozen numbers instead of every traffic and incident row.
+"""
+
+import datetime
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ThreatIncident, TrafficRollupHour
+from .rollups import ANOMALOUS_STATUSES
+
+
+def _counts(queryset, field):
+    return {
+        row[field] or "Unknown": row["count"]
+        for row in queryset.values(field).annotate(count=Count("id")).order_by()
+    }
+
+
+def _sums(queryset, field):
+    return {
+        row[field] or "Unknown": row["packets"]
+        for row in queryset.values(field).annotate(packets=Sum("packets")).order_by()
+    }
+
+
+def _hourly(queryset, since):
+    return {
+        row["hour"]: row["count"]
+        for row in queryset.filter(timestamp__gte=since)
+        .annotate(hour=TruncHour("timestamp"))
+        .values("hour")
+        .annotate(count=Count("id"))
+        .order_by()
+    }
+
+
+def dashboard_stats(now=None, hours=24):
+    """
+    Totals, breakdowns and an hourly histogram for the dashboard.
+
+    Args:
+        now: Reference time (defaults to the current time)
+        hours: Length of the hourly histogram
+
+    Returns:
+        Dictionary with total_packets, total_bytes, anomalies, incidents_by_status,
+        threat_types, protocols, statuses, severities and hourly (oldest bucket first)
+    """
+    now = now or timezone.now()
+    current_hour = now.replace(minute=0, second=0, microsecond=0)
+    since = current_hour - datetime.timedelta(hours=hours - 1)
+
+    rollups = TrafficRollupHour.objects.all()
+    packets_per_hour = {
+        row["bucket"]: row["packets"]
+        for row in rollups.filter(bucket__gte=since).values("bucket").annotate(packets=Sum("packets")).order_by()
+    }
+    threats_per_hour = _hourly(ThreatIncident.objects.all(), since)
+    hourly = []
+    for i in range(hours):
+        hour = since + datetime.timedelta(hours=i)
+        hourly.append({
+            "hour": hour.isoformat(),
+            "packets": packets_per_hour.get(hour, 0),
+            "threats": threats_per_hour.get(hour, 0),
+        })
+
+    totals = rollups.aggregate(packets=Sum("packets"), bytes=Sum("bytes"))
+    anomalies = rollups.filter(status__in=ANOMALOUS_STATUSES).aggregate(packets=Sum("packets"))
+    return {
+        "generated_at": now.isoformat(),
+        "total_packets": totals["packets"] or 0,
+        "total_bytes": totals["bytes"] or 0,
+        "anomalies": anomalies["packets"] or 0,
+        "incidents_by_status": _counts(ThreatIncident.objects.all(), "status"),
+        "threat_types": _counts(ThreatIncident.objects.all(), "threat_type"),
+        "protocols": _sums(rollups, "protocol"),
+        "statuses": _sums(rollups, "status"),
+        "severities": _sums(rollups.exclude(severity=""), "severity"),
+        "hourly": hourly,
+    }
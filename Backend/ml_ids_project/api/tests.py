@@ -1,3 +1,1286 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from sklearn.metrics import confusion_matrix
+from sklearn.model_selection import train_test_split
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.preprocessing import StandardScaler
+
+from scapy.layers.inet import ICMP, IP, TCP, UDP
+from scapy.layers.l2 import Dot1Q, Ether
+from scapy.packet import Raw
+from scapy.utils import PcapNgWriter, wrpcap
+
+from .capture_service import TRAFFIC_GROUP, CaptureService
+from .benchmarks import compare_results, run_stage, synthetic_frames
+from .db_utils import TrafficWriter
+from .instrumentation import RULE_MATCHES_DROPPED, registry as metrics_registry
+from .detector import score_records
+from .models import LogEntry, NetworkTraffic, ResponseRule, ThreatIncident, TrafficRollupHour, TrafficRollupMinute
+from .pipeline import PacketFeatureExtractor, ShardedPipeline, symmetric_flow_hash
+from .replay import DatabaseSink, FileSink, PcapReplay, iter_pcap
+from .rollups import apply_rollups, backfill
+from .search import fts_available, fts_status
+from .rule_engine import RuleEngine, RuleSet, engine as shared_rule_engine, parse_condition
+from .utils.knn_classifier import KNNAnomalyDetector
+from .utils.metrics import MetricsRegistry
+from .utils.condensation import condensed_nearest_neighbors, edited_nearest_neighbors, kmeans_prototypes
+from .utils.flow_table import FlowTable
+from .utils.inference_batcher import InferenceBatcher
+from .utils import frame_codec
+from .utils.model_registry import ModelRegistry
+from .utils.neighbor_backends import IVFKNeighborsClassifier, LabeledKNeighborsClassifier, build_neighbors_model
+from .utils.outbound import OutboundBuffer
+from .utils.packet_decoder import UNDECODED, decode_frame, decode_packet
+from .utils.record_reader import detect_format, read_records
+from .utils.subscription import Subscription
+from .utils.window_counters import CT_COUNTER_KEYS, ConnectionWindow
+
+
+MODEL_DIR = os.path.join(settings.BASE_DIR, '..', '..', 'model', 'unsw_tabular')
+TRAINING_SET = os.path.join(settings.BASE_DIR, 'UNSW_Train_Test Datasets', 'UNSW_NB15_training-set.csv')
+
+
+SYNTHETIC_FEATURES = ['dur', 'sbytes', 'sttl', 'ct_state_ttl']
+
+
+def _synthetic_training_set(rng):
+    X = rng.normal(size=(400, len(SYNTHETIC_FEATURES)))
+    y = (X[:, 0] + 0.5 * rng.normal(size=400) > 0).astype(int)
+    return X, y
+
+
+def _synthetic_detector(n_neighbors=7, weights='uniform'):
+    rng = np.random.default_rng(0)
+    X, y = _synthetic_training_set(rng)
+    detector = KNNAnomalyDetector()
+    detector.selected_features = list(SYNTHETIC_FEATURES)
+    detector.scaler = StandardScaler().fit(X)
+    detector.model = LabeledKNeighborsClassifier(n_neighbors=n_neighbors, weights=weights).fit(
+        detector.scaler.transform(X), y
+    )
+    return detector, rng.normal(size=(200, len(SYNTHETIC_FEATURES)))
+
+
+def _unsw_like_frame(rng, n=2000):
+    """Raw training frame with the UNSW-NB15 columns: heavy-tailed volumes, TTLs and counters that overlap."""
+    features, _, _, non_numeric = KNNAnomalyDetector.build_feature_sets(None)
+    label = (rng.random(n) < 0.45).astype(int)
+    attack = label == 1
+    df = pd.DataFrame({f: rng.poisson(2.0, n).astype(float) for f in features})
+    for f in ('dur', 'sbytes', 'dbytes', 'rate', 'sload', 'dload', 'smean', 'dmean'):
+        df[f] = np.round(rng.lognormal(np.where(attack, 5.0, 6.5), 1.0), 3)
+    df['sttl'] = np.where(attack, rng.choice([62, 254], n, p=[0.4, 0.6]),
+                          rng.choice([31, 62, 254], n, p=[0.4, 0.3, 0.3]))
+    df['dttl'] = np.where(attack, rng.choice([0, 252], n), rng.choice([29, 252], n, p=[0.6, 0.4]))
+    df['ct_state_ttl'] = np.where(attack, rng.choice([1, 2], n, p=[0.6, 0.4]), rng.choice([0, 1], n, p=[0.6, 0.4]))
+    for f in ('ct_srv_src', 'ct_dst_src_ltm', 'ct_srv_dst'):
+        df[f] = rng.poisson(np.where(attack, 6.0, 3.0)).astype(float)
+    for f in non_numeric:
+        df[f] = rng.integers(0, 2, n)
+    df['label'] = label
+    return df
+
+
+class SingleNeighborSearchTests(SimpleTestCase):
+    def test_matches_predict_and_predict_proba(self):
+        for weights in ('uniform', 'distance'):
+            with self.subTest(weights=weights):
+                detector, X = _synthetic_detector(weights=weights)
+                X_scaled = detector.scaler.transform(X)
+                predictions, probabilities = detector._classify(X_scaled)
+                np.testing.assert_array_equal(predictions, detector.model.predict(X_scaled))
+                np.testing.assert_allclose(probabilities, detector.model.predict_proba(X_scaled))
+
+    def test_predict_and_predict_batch_agree(self):
+        detector, X = _synthetic_detector()
+        records = [dict(zip(detector.selected_features, row)) for row in np.abs(X)]
+        batch = detector.predict_batch(records)
+        for i, record in enumerate(records):
+            single = detector.predict(record)
+            self.assertEqual(single['prediction'], batch['predictions'][i])
+            self.assertAlmostEqual(single['confidence'], batch['confidences'][i])
+
+    def test_trained_model_matches_sklearn_on_held_out_split(self):
+        df = _unsw_like_frame(np.random.default_rng(7))
+        detector = KNNAnomalyDetector()
+        metrics = detector.train(df)
+        # Same preprocessing, split and scaling, classified by stock sklearn
+        X_train, X_test, y_train, y_test = KNNAnomalyDetector().prepare_training_data(df)
+        reference = KNeighborsClassifier(n_neighbors=7).fit(X_train, y_train)
+        expected = reference.predict(X_test)
+        self.assertEqual(metrics['confusion_matrix'], confusion_matrix(y_test, expected).tolist())
+        # A model that separates the classes perfectly would not exercise the vote
+        self.assertGreater(metrics['confusion_matrix'][0][1] + metrics['confusion_matrix'][1][0], 0)
+
+        # Saved and reloaded, predicting from raw held-out records (log transform included)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('model_knn.pkl', 'features_knn.json', 'scaler_knn.pkl')]
+            detector.save_model(*paths)
+            loaded = KNNAnomalyDetector(*paths)
+        _, raw_test = train_test_split(df, test_size=0.2, random_state=42)
+        records = raw_test[loaded.selected_features].to_dict('records')
+        result = loaded.predict_batch(records)
+        np.testing.assert_array_equal(result['predictions'], expected)
+        np.testing.assert_allclose(
+            [[p['normal'], p['anomalous']] for p in result['probabilities']], reference.predict_proba(X_test)
+        )
+        for i in (0, 1, 2):
+            single = loaded.predict(records[i])
+            self.assertEqual(single['prediction'], expected[i])
+            self.assertAlmostEqual(single['probabilities']['anomalous'], reference.predict_proba(X_test[i:i + 1])[0][1])
+
+    @unittest.skipUnless(
+        os.path.exists(os.path.join(MODEL_DIR, 'model_knn.pkl')) and os.path.exists(TRAINING_SET),
+        'Trained KNN model or UNSW training set not available',
+    )
+    def test_shipped_confusion_matrix(self):
+        detector = KNNAnomalyDetector(
+            os.path.join(MODEL_DIR, 'model_knn.pkl'),
+            os.path.join(MODEL_DIR, 'features_knn.json'),
+            os.path.join(MODEL_DIR, 'scaler_knn.pkl'),
+        )
+        with open(os.path.join(MODEL_DIR, 'metrics_knn.json')) as f:
+            expected = json.load(f)['confusion_matrix']
+
+        # Rebuild the held-out split exactly as KNNAnomalyDetector.train does
+        df = pd.read_csv(TRAINING_SET)
+        _, numeric_features, non_log, _ = KNNAnomalyDetector.build_feature_sets(df)
+        log_cols = [f for f in detector.selected_features if f in numeric_features and f not in non_log]
+        X = df[detector.selected_features].copy()
+        X[log_cols] = np.log10(X[log_cols] + 1)
+        _, X_test, _, y_test = train_test_split(X, df['label'], test_size=0.2, random_state=42)
+
+        result = detector.predict_batch(X_test)
+        self.assertEqual(confusion_matrix(y_test, result['predictions']).tolist(), expected)
+
+
+class CompiledTransformTests(SimpleTestCase):
+    def test_matches_log_transform_and_scaler(self):
+        detector, X = _synthetic_detector()
+        records = [dict(zip(detector.selected_features, row)) for row in np.abs(X)]
+        records[0]['sbytes'] = None
+        del records[1]['dur']
+
+        expected = []
+        for record in records:
+            row = [record.get(f) or 0 for f in detector.selected_features]
+            # dur and sbytes are log-transformed, sttl and ct_state_ttl are kept as-is
+            row[0], row[1] = np.log10(row[0] + 1), np.log10(row[1] + 1)
+            expected.append(row)
+        np.testing.assert_allclose(detector._vectorize(records), detector.scaler.transform(np.array(expected)))
+
+
+class CondensationTests(SimpleTestCase):
+    # Largest accuracy drop accepted from a condensed reference set
+    TOLERANCE = 0.03
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        X = np.vstack([rng.normal(-1.0, 1.0, size=(1200, 4)), rng.normal(1.0, 1.0, size=(1200, 4))])
+        y = np.repeat([0, 1], 1200)
+        self.X_train, self.X_test, self.y_train, self.y_test = train_test_split(X, y, test_size=0.25, random_state=0)
+
+    def _accuracy(self, X_ref, y_ref):
+        model = KNeighborsClassifier(n_neighbors=7).fit(X_ref, y_ref)
+        return model.score(self.X_test, self.y_test)
+
+    def test_methods_shrink_the_reference_set_within_tolerance(self):
+        full = self._accuracy(self.X_train, self.y_train)
+        for name, condense in (
+            ('enn', edited_nearest_neighbors),
+            ('cnn', condensed_nearest_neighbors),
+            ('kmeans', lambda X, y: kmeans_prototypes(X, y, fraction=0.05)),
+        ):
+            with self.subTest(method=name):
+                X_ref, y_ref = condense(self.X_train, self.y_train)
+                self.assertLess(len(X_ref), len(self.X_train))
+                self.assertEqual(len(X_ref), len(y_ref))
+                self.assertEqual(set(y_ref), {0, 1})
+                self.assertGreaterEqual(self._accuracy(X_ref, y_ref), full - self.TOLERANCE)
+
+    def test_detector_keeps_the_smallest_set_within_budget(self):
+        detector = KNNAnomalyDetector()
+        detector.model = build_neighbors_model('brute', n_neighbors=7).fit(self.X_train, self.y_train)
+        full_metrics = detector.evaluate(self.X_test, self.y_test)
+        metrics, report = detector._condense(
+            self.X_train, self.y_train, self.X_test, self.y_test, full_metrics,
+            'kmeans', self.TOLERANCE, 7, 'brute', {},
+        )
+        self.assertTrue(report['accepted'])
+        self.assertLess(report['reference_size_after'], report['reference_size_before'])
+        self.assertEqual(detector.model.n_samples_fit_, report['reference_size_after'])
+        self.assertGreaterEqual(metrics['accuracy'], full_metrics['accuracy'] - self.TOLERANCE)
+        self.assertAlmostEqual(report['metric_deltas']['accuracy'], metrics['accuracy'] - full_metrics['accuracy'])
+
+    def test_detector_keeps_the_full_set_when_nothing_fits_the_budget(self):
+        detector = KNNAnomalyDetector()
+        full_model = detector.model = build_neighbors_model('brute', n_neighbors=7).fit(self.X_train, self.y_train)
+        full_metrics = detector.evaluate(self.X_test, self.y_test)
+        # A negative budget asks for better than full accuracy from every candidate
+        metrics, report = detector._condense(
+            self.X_train, self.y_train, self.X_test, self.y_test, full_metrics,
+            'kmeans', -1.0, 7, 'brute', {},
+        )
+        self.assertFalse(report['accepted'])
+        self.assertIs(detector.model, full_model)
+        self.assertEqual(report['size_reduction'], 0.0)
+
+
+class IVFBackendTests(SimpleTestCase):
+    def test_full_probe_matches_exact_search(self):
+        detector, X = _synthetic_detector()
+        exact = detector.model
+        X_train, y_train = _synthetic_training_set(np.random.default_rng(0))
+        ivf = IVFKNeighborsClassifier(n_neighbors=7, n_lists=16, n_probe=16).fit(
+            detector.scaler.transform(X_train), y_train
+        )
+        X_scaled = detector.scaler.transform(X)
+
+        exact_dist, _ = exact.kneighbors(X_scaled)
+        ivf_dist, _ = ivf.kneighbors(X_scaled)
+        np.testing.assert_allclose(ivf_dist, exact_dist, atol=1e-9)
+
+        detector.model = ivf
+        predictions, _ = detector._classify(X_scaled)
+        np.testing.assert_array_equal(predictions, exact.predict(X_scaled))
+
+
+class TrainLabelsTests(SimpleTestCase):
+    def test_models_keep_encoded_training_labels(self):
+        X = np.arange(12, dtype=float).reshape(6, 2)
+        y = np.array([5, 3, 5, 9, 3, 5])
+        for backend in ('brute', 'kd_tree', 'ivf'):
+            with self.subTest(backend=backend):
+                model = build_neighbors_model(backend, n_neighbors=3, n_lists=2).fit(X, y)
+                np.testing.assert_array_equal(model.classes_[model.train_labels_], y)
+
+    def test_models_saved_without_a_label_copy_still_load(self):
+        rng = np.random.default_rng(0)
+        X, y = _synthetic_training_set(rng)
+        detector = KNNAnomalyDetector()
+        detector.selected_features = list(SYNTHETIC_FEATURES)
+        detector.scaler = StandardScaler().fit(X)
+        # A plain sklearn model, as saved by earlier versions
+        detector.model = KNeighborsClassifier(n_neighbors=7).fit(detector.scaler.transform(X), y)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = [os.path.join(tmp, name) for name in ('model_knn.pkl', 'features_knn.json', 'scaler_knn.pkl')]
+            detector.save_model(*paths)
+            loaded = KNNAnomalyDetector(*paths)
+        X_query = loaded.scaler.transform(rng.normal(size=(50, len(SYNTHETIC_FEATURES))))
+        predictions, probabilities = loaded._classify(X_query)
+        np.testing.assert_array_equal(predictions, detector.model.predict(X_query))
+        np.testing.assert_allclose(probabilities, detector.model.predict_proba(X_query))
+
+
+class ConnectionWindowTests(SimpleTestCase):
+    def test_matches_linear_scan(self):
+        rng = np.random.default_rng(1)
+        fields = ("src", "dst", "sport", "dport", "service", "state", "ttl")
+        window = ConnectionWindow(max_events=20)
+        recent = []
+        for _ in range(300):
+            event = dict(zip(fields, (
+                f"10.0.0.{rng.integers(4)}", f"10.0.1.{rng.integers(4)}", int(rng.integers(3)),
+                [80, 443, None][rng.integers(3)], ["http", None][rng.integers(2)],
+                ["SYN", "ACK", "CON"][rng.integers(3)], int(rng.choice([64, 128])),
+            )))
+            counts = window.add(**event)
+            recent = (recent + [event])[-20:]
+            for name, keys in CT_COUNTER_KEYS.items():
+                expected = sum(all(ev[k] == event[k] for k in keys) for ev in recent)
+                self.assertEqual(counts[name], expected, name)
+
+    def test_time_window_evicts_old_events(self):
+        window = ConnectionWindow(max_events=None, max_seconds=10)
+        window.add("a", "b", 1, 80, "http", "SYN", 64, timestamp=0.0)
+        window.add("a", "b", 1, 80, "http", "SYN", 64, timestamp=5.0)
+        counts = window.add("a", "b", 1, 80, "http", "SYN", 64, timestamp=12.0)
+        self.assertEqual(counts["ct_src_ltm"], 2)
+        self.assertEqual(len(window), 2)
+
+
+class FlowTableTests(SimpleTestCase):
+    def _table(self, **kwargs):
+        finished = []
+        table = FlowTable(on_evict=lambda key, st, reason: finished.append((key, reason)), **kwargs)
+        return table, finished
+
+    def test_idle_timeout(self):
+        table, finished = self._table(idle_timeout=10)
+        table.get("a", 0.0)
+        table.get("b", 5.0)
+        table.get("b", 12.0)
+        self.assertEqual(finished, [("a", "idle")])
+        self.assertNotIn("a", table)
+
+    def test_active_timeout_restarts_flow(self):
+        table, finished = self._table(idle_timeout=None, active_timeout=100)
+        table.get("b", 0.0)
+        table.get("b", 50.0)
+        st = table.get("b", 106.0)
+        self.assertEqual(finished, [("b", "active")])
+        self.assertEqual(st.start_ts, 106.0)
+
+    def test_capacity_evicts_least_recently_seen(self):
+        table, finished = self._table(idle_timeout=None, max_flows=2)
+        table.get("a", 0.0)
+        table.get("b", 1.0)
+        table.get("a", 2.0)
+        table.get("c", 3.0)
+        self.assertEqual(finished, [("b", "capacity")])
+        self.assertEqual(table.stats, {"live": 2, "created": 3, "evicted": 1, "dropped": 0})
+
+    def test_drop_overflow(self):
+        table, finished = self._table(idle_timeout=None, max_flows=1, overflow="drop")
+        table.get("a", 0.0)
+        self.assertIsNone(table.get("b", 1.0))
+        self.assertEqual(table.stats["dropped"], 1)
+        self.assertEqual(finished, [])
+
+
+class PipelineTests(SimpleTestCase):
+    def test_flow_hash_is_symmetric(self):
+        fwd = decode_frame(bytes(Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80)))
+        rev = decode_frame(bytes(Ether() / IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=40000)))
+        other = decode_frame(bytes(Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40001, dport=80)))
+        self.assertEqual(symmetric_flow_hash(fwd), symmetric_flow_hash(rev))
+        self.assertNotEqual(symmetric_flow_hash(fwd), symmetric_flow_hash(other))
+
+    def _run_sharded(self, workers, frames, **kwargs):
+        records = []
+        pipeline = ShardedPipeline(workers, on_record=records.append, **kwargs).start()
+        for frame in frames:
+            pipeline.submit_frame(*frame)
+        # Spawned workers can be slow to start under load: give them time to drain
+        pipeline.stop(timeout=60.0)
+        pipeline._reader.join(10.0)
+        self.assertEqual(pipeline.dropped, 0)
+        return records
+
+    def test_ct_counters_do_not_depend_on_the_number_of_workers(self):
+        frames = synthetic_frames(1500, 100, seed=3)
+        extractor = PacketFeatureExtractor()
+        single = [record for frame in frames for record in extractor.process_frame(*frame)]
+
+        def counters(records):
+            return sorted((r['timestamp'], r['source_ip'], r['destination_ip'], r['bytes'],
+                           tuple(r[name] for name in CT_COUNTER_KEYS)) for r in records)
+
+        sharded = self._run_sharded(3, frames, batch_size=64)
+        self.assertEqual(len(sharded), len(single))
+        self.assertEqual(counters(sharded), counters(single))
+
+    def test_partial_buffer_is_sent_after_max_wait(self):
+        records = []
+        pipeline = ShardedPipeline(2, on_record=records.append, batch_size=1000, max_wait_ms=50).start()
+        self.addCleanup(pipeline.stop)
+        for frame in synthetic_frames(3, 3, seed=1):
+            pipeline.submit_frame(*frame)
+        # No more frames arrive and stop() is not called: only the flush timer sends the buffers
+        deadline = time.monotonic() + 20.0
+        while len(records) < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(len(records), 3)
+
+    def test_flow_mode_emits_one_record_per_flow(self):
+        extractor = PacketFeatureExtractor(classify_mode="flow")
+        packets = [
+            IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="S"),
+            IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=40000, flags="SA"),
+            IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="A"),
+            # Full teardown: FIN, peer FIN, final ACK
+            IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="FA"),
+            IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=40000, flags="FA"),
+            IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="A"),
+        ]
+        emitted = []
+        for i, pkt in enumerate(packets):
+            emitted.extend(extractor.process(pkt, now_ts=100.0 + i * 0.01))
+        emitted.extend(extractor.flush())
+        self.assertEqual(len(emitted), 1)
+        record = emitted[0]
+        self.assertEqual((record["reason"], record["spkts"], record["dpkts"]), ("closed", 4, 2))
+        self.assertEqual((record["service"], record["state"]), ("http", "FIN"))
+        self.assertEqual(len(extractor.flow_table), 0)
+
+    def test_flow_mode_closes_on_rst(self):
+        extractor = PacketFeatureExtractor(classify_mode="flow")
+        extractor.process(IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="S"), now_ts=100.0)
+        emitted = extractor.process(IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=40000, flags="R"), now_ts=100.1)
+        self.assertEqual([r["reason"] for r in emitted], ["closed"])
+        self.assertEqual(len(extractor.flow_table), 0)
+
+
+class InferenceBatcherTests(SimpleTestCase):
+    class RecordingDetector:
+        def __init__(self, fail=False):
+            self.batches = []
+            self.fail = fail
+
+        def predict_batch(self, records):
+            self.batches.append(len(records))
+            if self.fail:
+                raise ValueError('broken model')
+            n = len(records)
+            return {'predictions': [0] * n, 'labels': ['Normal'] * n, 'confidences': [0.9] * n,
+                    'probabilities': [{'Normal': 0.9, 'Anomaly': 0.1}] * n}
+
+    def _batcher(self, detector, expected, **kwargs):
+        results = []
+        done = threading.Event()
+
+        def on_result(record, result):
+            results.append((record, result))
+            if len(results) == expected:
+                done.set()
+
+        return InferenceBatcher(detector, on_result, **kwargs), results, done
+
+    def test_flushes_full_batches_without_waiting(self):
+        detector = self.RecordingDetector()
+        batcher, results, done = self._batcher(detector, 10, max_batch_size=4, max_wait_ms=60000)
+        for i in range(10):
+            batcher.submit({'dur': i}, i)
+        batcher.start()
+        # Two full batches go out at once; the last two wait for the (one minute) deadline
+        deadline = time.monotonic() + 5.0
+        while len(results) < 8 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(detector.batches, [4, 4])
+        self.assertEqual([record for record, _ in results], list(range(8)))
+        batcher.stop(timeout=5.0)
+        self.assertEqual(detector.batches, [4, 4, 2])
+
+    def test_flushes_partial_batch_after_max_wait(self):
+        detector = self.RecordingDetector()
+        batches = []
+        batcher, results, done = self._batcher(detector, 3, max_batch_size=100, max_wait_ms=50,
+                                               on_batch=lambda size, seconds, failed: batches.append((size, failed)))
+        batcher.start()
+        self.addCleanup(batcher.stop, 5.0)
+        for i in range(3):
+            batcher.submit({'dur': i}, i)
+        self.assertTrue(done.wait(5.0))
+        self.assertEqual(detector.batches, [3])
+        self.assertEqual(batches, [(3, False)])
+        self.assertEqual(results[0][1]['label'], 'Normal')
+
+    def test_stop_flushes_pending_items(self):
+        detector = self.RecordingDetector()
+        batcher, results, done = self._batcher(detector, 3, max_batch_size=100, max_wait_ms=60000)
+        batcher.start()
+        for i in range(3):
+            batcher.submit({'dur': i}, i)
+        batcher.stop(timeout=5.0)
+        self.assertTrue(done.is_set())
+        self.assertEqual(detector.batches, [3])
+        self.assertFalse(batcher._thread.is_alive())
+
+    def test_failed_batch_delivers_unclassified_results(self):
+        batcher, results, done = self._batcher(self.RecordingDetector(fail=True), 2, max_batch_size=2)
+        batcher.start()
+        batcher.submit({}, 'a')
+        batcher.submit({}, 'b')
+        batcher.stop(timeout=5.0)
+        self.assertEqual(results, [('a', None), ('b', None)])
+
+
+class PacketDecoderTests(SimpleTestCase):
+    def _frames(self):
+        ip = IP(src="10.0.0.1", dst="10.0.0.2", ttl=61)
+        return [
+            Ether() / ip / TCP(sport=40000, dport=443, flags="SA", seq=123456, window=2048) / Raw(b"x" * 10),
+            Ether() / Dot1Q() / ip / UDP(sport=53, dport=5353) / Raw(b"q"),
+            Ether() / IP(src="10.0.0.1", dst="10.0.0.2", options=[b"\x01" * 4]) / TCP(flags="PA"),
+            Ether() / IP(src="10.0.0.1", dst="10.0.0.2", frag=8, proto=6) / Raw(b"y" * 30),
+            Ether() / ip / ICMP(),
+            IP(src="192.168.1.1", dst="192.168.1.2") / UDP(sport=1, dport=2),
+        ]
+
+    def test_matches_scapy_dissection(self):
+        for pkt in self._frames():
+            frame = bytes(pkt)
+            dissected = type(pkt)(frame)
+            self.assertEqual(decode_frame(frame, type(pkt).__name__), decode_packet(dissected, IP, TCP, UDP))
+
+    def test_defers_to_scapy_when_unsure(self):
+        tunnel = bytes(Ether() / IP() / IP() / TCP())
+        truncated = bytes(Ether() / IP() / TCP())[:40]
+        self.assertIs(decode_frame(tunnel), UNDECODED)
+        self.assertIs(decode_frame(truncated), UNDECODED)
+        self.assertIs(decode_frame(b"\x00" * 20, "Loopback"), UNDECODED)
+        self.assertIsNone(decode_frame(bytes(Ether(type=0x86DD) / Raw(b"\x00" * 40))))
+
+    def test_extractor_records_are_identical(self):
+        packets = [
+            Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="S"),
+            Ether() / IP(src="10.0.0.2", dst="10.0.0.1") / TCP(sport=80, dport=40000, flags="SA"),
+            Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / TCP(sport=40000, dport=80, flags="A") / Raw(b"GET /"),
+            Ether() / IP(src="10.0.0.3", dst="10.0.0.2") / UDP(sport=5000, dport=53),
+            Ether() / IP(src="10.0.0.1", dst="10.0.0.2") / IP() / TCP(),
+        ]
+        records = {}
+        for decoder in ("scapy", "fast"):
+            extractor = PacketFeatureExtractor(decoder=decoder)
+            emitted = []
+            for i, pkt in enumerate(packets):
+                emitted.extend(extractor.process_frame(Ether, bytes(pkt), now_ts=100.0 + i * 0.01))
+            records[decoder] = [{k: v for k, v in r.items() if k not in ("id", "timestamp")} for r in emitted]
+        self.assertEqual(records["fast"], records["scapy"])
+        self.assertEqual(len(records["fast"]), len(packets))
+
+
+class TrafficWriterTests(TestCase):
+    def _record(self, i):
+        return {'source_ip': f'10.0.0.{i}', 'destination_ip': '10.0.0.254', 'protocol': 'TCP', 'bytes': 60, 'status': 'Normal'}
+
+    def test_flush_writes_pending_rows_in_batches(self):
+        writer = TrafficWriter(batch_size=2, flush_interval=60.0)
+        for i in range(5):
+            self.assertTrue(writer.submit(self._record(i)))
+        self.assertEqual(NetworkTraffic.objects.count(), 0)
+        writer.flush()
+        self.assertEqual(NetworkTraffic.objects.count(), 5)
+        self.assertEqual(writer.stats['written'], 5)
+        self.assertEqual(writer.stats['batches'], 3)
+        self.assertEqual(writer.stats['pending'], 0)
+
+    def test_drops_beyond_max_pending(self):
+        writer = TrafficWriter(batch_size=10, max_pending=3)
+        accepted = [writer.submit(self._record(i)) for i in range(5)]
+        self.assertEqual(accepted, [True, True, True, False, False])
+        self.assertEqual(writer.stats['dropped'], 2)
+        self.assertEqual(writer.stats['high_water'], 3)
+        writer.stop()
+        self.assertEqual(NetworkTraffic.objects.count(), 3)
+
+
+class TrafficWriterThreadTests(TransactionTestCase):
+    def test_partial_batch_is_written_after_flush_interval(self):
+        writer = TrafficWriter(batch_size=500, flush_interval=0.2).start()
+        self.addCleanup(writer.stop)
+        for i in range(3):
+            writer.submit({'source_ip': f'10.0.0.{i}', 'destination_ip': '10.0.0.254', 'protocol': 'TCP', 'bytes': 60})
+        deadline = time.monotonic() + 3.0
+        while writer.stats['written'] < 3 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        # Written by the interval alone: the batch never filled and stop() was not called
+        self.assertEqual(writer.stats['written'], 3)
+        self.assertEqual(NetworkTraffic.objects.count(), 3)
+
+    def test_rule_matches_are_written_on_the_timer_without_more_traffic(self):
+        rule = ResponseRule.objects.create(name='crit', condition='severity=Critical', action='block_ip')
+        engine = RuleEngine(flush_interval=0.2)
+        writer = TrafficWriter(flush_interval=0.05, rules=engine).start()
+        engine.record(engine.match({'severity': 'Critical'}), 'i-1')
+        writer.wake()
+        deadline = time.monotonic() + 3.0
+        while engine.pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(engine.pending, 0)
+        # stop() only writes traffic rows; joining the thread lets its rule flush finish
+        writer.stop()
+        self.assertEqual(LogEntry.objects.count(), 1)
+        rule.refresh_from_db()
+        self.assertEqual(rule.triggered_count, 1)
+
+
+class RecordingChannelLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, message):
+        self.sent.append((group, message))
+
+
+def _capture_service(loop, **attrs):
+    # No model and no sniffing: only the publish/persist half of the service runs
+    with mock.patch('api.capture_service.load_detector', return_value=None):
+        service = CaptureService(loop, channel_layer=RecordingChannelLayer())
+    for name, value in attrs.items():
+        setattr(service, name, value)
+    return service
+
+
+def _record(i, status='Normal'):
+    return {'id': str(uuid.UUID(int=i + 1)), 'source_ip': f'10.0.0.{i}', 'destination_ip': '10.0.0.254', 'protocol': 'TCP',
+            'bytes': 60, 'status': status, 'severity': 'High' if status != 'Normal' else 'Low'}
+
+
+class CaptureServiceTests(TransactionTestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.loop_thread.start()
+
+    def tearDown(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.loop_thread.join(5.0)
+        self.loop.close()
+
+    def test_dispatch_publishes_persists_and_reports_incidents(self):
+        service = _capture_service(self.loop)
+        service._publish(_record(1))
+        service._publish(_record(2, status='Anomalous'))
+        service.stop()
+
+        records = [message['record'] for group, message in service.channel_layer.sent]
+        self.assertEqual({group for group, _ in service.channel_layer.sent}, {TRAFFIC_GROUP})
+        self.assertEqual(sorted(r['source_ip'] for r in records if r.get('_type') != 'incident'), ['10.0.0.1', '10.0.0.2'])
+        incidents = [r for r in records if r.get('_type') == 'incident']
+        self.assertEqual(len(incidents), 1)
+        self.assertEqual(incidents[0]['source_ip'], '10.0.0.2')
+        self.assertEqual(NetworkTraffic.objects.count(), 2)
+        self.assertEqual(ThreatIncident.objects.count(), 1)
+        self.assertEqual(service._publishing, 0)
+
+    def test_stop_flushes_batched_records_to_the_database(self):
+        service = _capture_service(self.loop)
+        service.writer.start()
+        service.batcher = InferenceBatcher(None, service._on_prediction, max_wait_ms=60000).start()
+        service._submit_records([_record(i) for i in range(5)])
+        service.stop()
+        service.stop()
+
+        self.assertFalse(service.batcher._thread.is_alive())
+        self.assertEqual(len(service.channel_layer.sent), 5)
+        self.assertEqual(NetworkTraffic.objects.count(), 5)
+        self.assertEqual(service.writer.stats['pending'], 0)
+
+
+class CapturePublishLimitTests(SimpleTestCase):
+    def test_records_beyond_the_limit_are_dropped_until_the_loop_catches_up(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        service = _capture_service(loop, publish_limit=2)
+        # The loop is not running, so scheduled dispatches pile up
+        for i in range(5):
+            service._publish(_record(i))
+        self.assertEqual(service._publishing, 2)
+        self.assertEqual(service.publish_dropped, 3)
+
+        loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(service._publishing, 0)
+        self.assertEqual([m['record']['source_ip'] for _, m in service.channel_layer.sent], ['10.0.0.0', '10.0.0.1'])
+        service._publish(_record(5))
+        self.assertEqual(service._publishing, 1)
+        loop.run_until_complete(asyncio.sleep(0.05))
+        self.assertEqual(service.writer.stats['pending'], 3)
+
+
+class OutboundBufferTests(SimpleTestCase):
+    def test_drops_oldest_and_reports_count(self):
+        buffer = OutboundBuffer(max_size=3)
+        for i in range(5):
+            buffer.push({'id': i})
+        frame = buffer.frame()
+        self.assertEqual(frame['type'], 'batch')
+        self.assertEqual([r['id'] for r in frame['records']], [2, 3, 4])
+        self.assertEqual(frame['dropped'], 2)
+        self.assertIsNone(buffer.frame())
+        buffer.push({'id': 5})
+        self.assertEqual(buffer.frame()['dropped'], 0)
+        self.assertEqual(buffer.total_dropped, 2)
+
+
+class SubscriptionTests(SimpleTestCase):
+    def _record(self, **overrides):
+        record = {'id': '1', 'timestamp': 't', 'source_ip': '10.1.2.3', 'destination_ip': '8.8.8.8',
+                  'protocol': 'TCP', 'status': 'Anomalous', 'severity': 'High', 'pred_prob': 0.9, 'rate': 12.0}
+        record.update(overrides)
+        return record
+
+    def test_filters(self):
+        sub = Subscription.from_message({'type': 'subscribe', 'filters': {
+            'protocol': 'tcp', 'ip': ['10.0.0.0/8'], 'status': ['anomalous'], 'min_confidence': 0.8}})
+        self.assertTrue(sub.accept(self._record()))
+        self.assertTrue(sub.accept(self._record(source_ip='8.8.4.4', destination_ip='10.9.9.9')))
+        self.assertFalse(sub.accept(self._record(protocol='UDP')))
+        self.assertFalse(sub.accept(self._record(source_ip='192.168.0.1')))
+        self.assertFalse(sub.accept(self._record(status='Normal')))
+        self.assertFalse(sub.accept(self._record(pred_prob=0.5)))
+
+    def test_projection_keeps_identity_fields(self):
+        sub = Subscription.from_message({'type': 'subscribe', 'fields': ['source_ip']})
+        self.assertEqual(sub.project(self._record()), {'id': '1', 'timestamp': 't', 'source_ip': '10.1.2.3'})
+
+    def test_sampling_spares_incidents(self):
+        sub = Subscription.from_message({'type': 'subscribe', 'sample': 0.25})
+        self.assertEqual(sum(sub.accept(self._record()) for _ in range(100)), 25)
+        self.assertTrue(all(sub.accept({'_type': 'incident', 'confidence': 70}) for _ in range(10)))
+
+    def test_rejects_invalid_messages(self):
+        for message in ({'filters': {'ip': ['not-an-ip']}}, {'sample': 0}, {'filters': {'colour': 'red'}},
+                        {'fields': 'source_ip'}, {'filters': {'record_type': ['packet']}}):
+            with self.assertRaises(ValueError):
+                Subscription.from_message(message)
+
+
+@unittest.skipUnless(frame_codec.msgpack is not None, 'msgpack is not installed')
+class SchemaFrameEncoderTests(SimpleTestCase):
+    def test_round_trip_sends_layouts_once(self):
+        encoder = frame_codec.make_encoder('msgpack')
+        records = [{'id': str(i), 'source_ip': '10.0.0.1', 'rate': 1.5, 'probs': [0.2, 0.8], 'sinpkt': None}
+                   for i in range(3)]
+        incident = {'_type': 'incident', 'id': 'x', 'confidence': 80}
+        schemas = {}
+        first = encoder.encode({'records': records, 'dropped': 2})
+        self.assertEqual(frame_codec.decode_frame(first, schemas),
+                         {'type': 'batch', 'records': records, 'dropped': 2})
+        second = encoder.encode({'records': records + [incident], 'dropped': 0})
+        self.assertEqual(len(frame_codec.msgpack.unpackb(second, strict_map_key=False)['schemas']), 1)
+        self.assertEqual(frame_codec.decode_frame(second, schemas)['records'], records + [incident])
+        self.assertLess(len(second), len(frame_codec.JSONFrameEncoder().encode({'records': records + [incident], 'dropped': 0})))
+
+
+class StatsEndpointTests(TestCase):
+    def test_aggregates(self):
+        for protocol in ('TCP', 'TCP', 'UDP'):
+            NetworkTraffic.objects.create(source_ip='10.0.0.1', destination_ip='10.0.0.2', protocol=protocol,
+                                          bytes=60, status='Normal')
+        for status in ('Active', 'Active', 'Blocked'):
+            ThreatIncident.objects.create(source_ip='10.0.0.1', destination_ip='10.0.0.2', threat_type='DNS_Anomaly',
+                                          severity='High', status=status, description='', confidence=70)
+        response = self.client.get('/api/stats/')
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()
+        self.assertEqual(stats['total_packets'], 3)
+        self.assertEqual(stats['protocols'], {'TCP': 2, 'UDP': 1})
+        self.assertEqual(stats['incidents_by_status'], {'Active': 2, 'Blocked': 1})
+        self.assertEqual(stats['threat_types'], {'DNS_Anomaly': 3})
+        self.assertEqual(len(stats['hourly']), 24)
+        self.assertEqual(stats['hourly'][-1]['packets'], 3)
+        self.assertEqual(stats['hourly'][-1]['threats'], 3)
+
+
+class TrafficRollupTests(TestCase):
+    def _rollups(self, model):
+        return sorted(model.objects.values_list('bucket', 'protocol', 'status', 'severity', 'packets', 'bytes'))
+
+    def test_ingest_matches_backfill(self):
+        writer = TrafficWriter(batch_size=4)
+        records = [
+            {'protocol': 'TCP', 'status': 'Normal', 'severity': 'Low', 'bytes': 60},
+            {'protocol': 'TCP', 'status': 'Anomalous', 'severity': 'High', 'bytes': 1500},
+            {'protocol': 'UDP', 'status': 'Normal', 'severity': 'Low', 'bytes': 80},
+        ] * 3
+        for record in records:
+            writer.submit(dict(record, source_ip='10.0.0.1', destination_ip='10.0.0.2'))
+        writer.flush()
+        ingested = {model: self._rollups(model) for model in (TrafficRollupMinute, TrafficRollupHour)}
+        self.assertEqual(sum(row[4] for row in ingested[TrafficRollupHour]), 9)
+        self.assertEqual(sum(row[5] for row in ingested[TrafficRollupHour]), 3 * (60 + 1500 + 80))
+
+        backfill()
+        for model, rows in ingested.items():
+            self.assertEqual(self._rollups(model), rows)
+
+    def test_api_and_admin_changes_follow_the_rollups(self):
+        def hourly():
+            return dict(((row[1], row[2]), (row[4], row[5])) for row in self._rollups(TrafficRollupHour))
+
+        payload = {'source_ip': '10.0.0.1', 'destination_ip': '10.0.0.2', 'protocol': 'TCP', 'bytes': 60,
+                   'status': 'Normal', 'severity': 'Low'}
+        first = self.client.post('/api/traffic/', payload, content_type='application/json').json()
+        self.client.post('/api/traffic/', dict(payload, protocol='UDP'), content_type='application/json')
+        self.assertEqual(hourly(), {('TCP', 'Normal'): (1, 60), ('UDP', 'Normal'): (1, 60)})
+
+        self.client.patch(f"/api/traffic/{first['id']}/", {'status': 'Blocked', 'bytes': 100},
+                          content_type='application/json')
+        self.assertEqual(hourly(), {('TCP', 'Blocked'): (1, 100), ('UDP', 'Normal'): (1, 60)})
+
+        self.client.delete(f"/api/traffic/{first['id']}/")
+        self.assertEqual(hourly(), {('UDP', 'Normal'): (1, 60)})
+
+        # Admin bulk deletes go through QuerySet.delete()
+        NetworkTraffic.objects.filter(protocol='UDP').delete()
+        self.assertEqual(hourly(), {})
+        self.assertFalse(TrafficRollupMinute.objects.exists())
+
+    def test_lost_insert_race_adds_to_the_other_writers_row(self):
+        row = NetworkTraffic(source_ip='10.0.0.1', destination_ip='10.0.0.2', protocol='TCP', bytes=60, status='Normal')
+        real_update = type(TrafficRollupHour.objects.all()).update
+        raced = []
+
+        def update(qs, **kwargs):
+            if qs.model is TrafficRollupHour and not raced:
+                # Another writer inserts the same combination between our UPDATE and INSERT
+                raced.append(True)
+                apply_rollups([row])
+                return 0
+            return real_update(qs, **kwargs)
+
+        with mock.patch.object(type(TrafficRollupHour.objects.all()), 'update', update):
+            apply_rollups([row])
+        self.assertEqual(list(TrafficRollupHour.objects.values_list('packets', 'bytes')), [(2, 120)])
+
+
+class CursorPaginationTests(TestCase):
+    def test_pages_cover_every_row_once_newest_first(self):
+        for i in range(5):
+            ThreatIncident.objects.create(source_ip=f'10.0.0.{i}', destination_ip='10.0.0.254', threat_type='TCP',
+                                          severity='Low', status='Active', description='', confidence=60)
+        seen = []
+        url = '/api/incidents/?page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 2)
+            seen.extend(page['results'])
+            url = page['next']
+        self.assertEqual(len({row['id'] for row in seen}), 5)
+        self.assertEqual([row['timestamp'] for row in seen], sorted((row['timestamp'] for row in seen), reverse=True))
+
+    def test_filters_by_status(self):
+        for status in ('Active', 'Resolved'):
+            ThreatIncident.objects.create(source_ip='10.0.0.1', destination_ip='10.0.0.2', threat_type='TCP',
+                                          severity='Low', status=status, description='', confidence=60)
+        results = self.client.get('/api/incidents/?status=Resolved').json()['results']
+        self.assertEqual([row['status'] for row in results], ['Resolved'])
+
+
+class TrafficSearchTests(TestCase):
+    def setUp(self):
+        for src, dst, protocol, status, severity in (
+            ('10.0.0.5', '8.8.8.8', 'TCP', 'Normal', 'Low'),
+            ('10.0.1.9', '1.1.1.1', 'UDP', 'Anomalous', 'High'),
+            ('192.168.1.20', '10.0.0.5', 'TCP', 'Blocked', 'Critical'),
+            ('100.64.0.1', '8.8.4.4', 'UDP', 'Normal', 'Low'),
+        ):
+            NetworkTraffic.objects.create(source_ip=src, destination_ip=dst, protocol=protocol, bytes=60,
+                                          status=status, severity=severity)
+
+    def _sources(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return sorted(row['source_ip'] for row in response.json())
+
+    def test_exact_prefix_and_cidr(self):
+        self.assertEqual(self._sources('/api/traffic/search/?q=10.0.0.5'), ['10.0.0.5', '192.168.1.20'])
+        self.assertEqual(self._sources('/api/traffic/search/?q=10.0.'), ['10.0.0.5', '10.0.1.9', '192.168.1.20'])
+        self.assertEqual(self._sources('/api/traffic/search/?q=10.0.1.0/24'), ['10.0.1.9'])
+        self.assertEqual(self._sources('/api/traffic/search/?cidr=10.0.0.0/8'), ['10.0.0.5', '10.0.1.9', '192.168.1.20'])
+
+    def test_enum_terms_are_anded(self):
+        self.assertEqual(self._sources('/api/traffic/search/?q=udp normal'), ['100.64.0.1'])
+        self.assertEqual(self._sources('/api/traffic/search/?q=critical'), ['192.168.1.20'])
+        self.assertEqual(self._sources('/api/traffic/search/?protocol=TCP&status=Normal'), ['10.0.0.5'])
+
+    def test_free_text_falls_back_to_substring(self):
+        self.assertEqual(self._sources('/api/traffic/search/?q=nomal'), ['10.0.1.9'])
+
+    def test_invalid_ip_parameter(self):
+        self.assertEqual(self.client.get('/api/traffic/search/?ip=not-an-ip').status_code, 400)
+
+
+class TrafficSearchIndexTests(TransactionTestCase):
+    def setUp(self):
+        try:
+            call_command('build_search_index', stdout=io.StringIO())
+        except CommandError as e:
+            self.skipTest(str(e))
+        self.addCleanup(call_command, 'build_search_index', '--drop', stdout=io.StringIO())
+
+    def _create(self, src, status):
+        return NetworkTraffic.objects.create(source_ip=src, destination_ip='10.0.0.254', protocol='TCP', bytes=60,
+                                             status=status, severity='Low')
+
+    def _sources(self, term):
+        return sorted(row['source_ip'] for row in self.client.get(f'/api/traffic/search/?q={term}').json())
+
+    def test_index_survives_vacuum_and_follows_updates(self):
+        self.assertTrue(fts_available())
+        early = [self._create(f'10.0.0.{i}', 'Normal') for i in range(5)]
+        late = self._create('10.0.9.9', 'Anomalous')
+        NetworkTraffic.objects.filter(pk__in=[row.pk for row in early]).delete()
+        with connection.cursor() as cursor:
+            # VACUUM may renumber the implicit rowids; move them explicitly as well
+            cursor.execute('VACUUM')
+            cursor.execute('UPDATE api_networktraffic SET rowid = rowid + 1000')
+        self.assertEqual(self._sources('nomal'), ['10.0.9.9'])
+
+        late.status = 'Blocked'
+        late.save()
+        self._create('10.0.7.7', 'Anomalous')
+        self.assertEqual(self._sources('nomal'), ['10.0.7.7'])
+        self.assertEqual(self._sources('ocked'), ['10.0.9.9'])
+
+    def test_table_rebuild_is_reported_and_repaired(self):
+        kept = self._create('10.0.0.1', 'Anomalous')
+        key = NetworkTraffic.objects.get(pk=kept.pk).fts_rowid
+        self.assertIsNotNone(key)
+        # What a migration altering a traffic column does on SQLite: the triggers go with the old table
+        with connection.schema_editor() as editor:
+            editor._remake_table(NetworkTraffic)
+        self.assertEqual(fts_status(), 'stale')
+        self.assertFalse(fts_available())
+        self._create('10.0.0.2', 'Anomalous')
+        # Unindexed rows are still found by scanning
+        self.assertEqual(self._sources('nomal'), ['10.0.0.1', '10.0.0.2'])
+
+        out = io.StringIO()
+        call_command('build_search_index', stdout=out)
+        self.assertIn('lost its triggers', out.getvalue())
+        self.assertEqual(fts_status(), 'ready')
+        self.assertEqual(NetworkTraffic.objects.get(pk=kept.pk).fts_rowid, key)
+        self.assertEqual(self._sources('nomal'), ['10.0.0.1', '10.0.0.2'])
+
+
+class ModelRegistryTests(SimpleTestCase):
+    class FakeDetector:
+        selected_features = ['dur']
+        neighbor_backend = {'name': 'auto'}
+
+        def __init__(self, model_path, features_path, scaler_path):
+            with open(model_path) as f:
+                self.model = f.read()
+            if self.model == 'broken':
+                raise ValueError('truncated pickle')
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.paths = [os.path.join(self.dir.name, name) for name in ('model', 'features', 'scaler')]
+        for path in self.paths:
+            self._write(path, 'v1')
+        self.registry = ModelRegistry(check_interval=0, loader=self.FakeDetector)
+
+    def _write(self, path, content):
+        with open(path, 'w') as f:
+            f.write(content)
+        # Ensure the mtime/size fingerprint changes even on coarse filesystem clocks
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_loads_once_and_reloads_on_change(self):
+        first = self.registry.get(*self.paths)
+        self.assertIs(self.registry.get(*self.paths), first)
+        version = self.registry.version(*self.paths)['version']
+
+        self._write(self.paths[0], 'v1')  # touched, same content
+        self.assertIs(self.registry.get(*self.paths), first)
+
+        self._write(self.paths[0], 'v2')
+        second = self.registry.get(*self.paths)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.model, 'v2')
+        self.assertNotEqual(self.registry.version(*self.paths)['version'], version)
+        self.assertEqual(self.registry.reloads, 1)
+
+    def test_failed_reload_keeps_serving(self):
+        handle = self.registry.handle(*self.paths)
+        first = handle.current()
+        self._write(self.paths[0], 'broken')
+        self.assertIs(handle.current(), first)
+        os.remove(self.paths[1])
+        self.assertIs(handle.current(), first)
+
+    def test_missing_artifacts(self):
+        os.remove(self.paths[2])
+        with self.assertRaises(FileNotFoundError):
+            self.registry.get(*self.paths)
+
+
+class BatchScoringTests(SimpleTestCase):
+    class FakeDetector:
+        selected_features = ['dur', 'sbytes']
+
+        def __init__(self):
+            self.batches = []
+
+        def predict_batch(self, rows):
+            self.batches.append(rows)
+            labels = ['Anomalous' if (row['sbytes'] or 0) > 1000 else 'Normal' for row in rows]
+            return {
+                'predictions': [int(label == 'Anomalous') for label in labels],
+                'labels': labels,
+                'confidences': [1.0] * len(rows),
+                'probabilities': [{'normal': 0.0, 'anomalous': 1.0}] * len(rows),
+            }
+
+    def _read(self, body, fmt, limit=None):
+        return list(read_records(io.BytesIO(body.encode()), fmt, limit=limit))
+
+    def test_detect_format(self):
+        self.assertEqual(detect_format('application/json; charset=utf-8'), 'json')
+        self.assertEqual(detect_format('application/x-ndjson'), 'ndjson')
+        self.assertEqual(detect_format('text/csv'), 'csv')
+        self.assertIsNone(detect_format('text/plain'))
+
+    def test_formats_read_the_same_records(self):
+        expected = [(0, {'dur': '1', 'sbytes': '5'}, None), (1, {'dur': '2', 'sbytes': None}, None)]
+        self.assertEqual(self._read('dur,sbytes\n1,5\n2,\n', 'csv'), expected)
+        self.assertEqual(self._read('{"dur": "1", "sbytes": "5"}\n\n{"dur": "2", "sbytes": null}\n', 'ndjson'), expected)
+        self.assertEqual(self._read('{"records": [{"dur": "1", "sbytes": "5"}, {"dur": "2", "sbytes": null}]}', 'json'), expected)
+
+    def test_bad_records_are_reported_by_index(self):
+        items = self._read('{"dur": 1}\nnot json\n[1]\n', 'ndjson')
+        self.assertEqual([(i, error is None) for i, _, error in items], [(0, True), (1, False), (2, False)])
+        items = self._read('dur,sbytes\n1\n', 'csv')
+        self.assertIn('expected 2 columns', items[0][2])
+        with self.assertRaises(ValueError):
+            self._read('{"dur": 1}', 'json')
+        with self.assertRaises(ValueError):
+            self._read('[{}, {}, {}]', 'json', limit=2)
+
+    def test_scores_in_chunks_and_in_order(self):
+        detector = self.FakeDetector()
+        items = self._read('dur,sbytes\n1,5000\n2,x\n3,10\n4,\n5,2000\n', 'csv')
+        results = list(score_records(detector, items, chunk_size=2))
+
+        self.assertEqual([r['index'] for r in results], [0, 1, 2, 3, 4])
+        self.assertEqual([r.get('label') for r in results], ['Anomalous', None, 'Normal', 'Normal', 'Anomalous'])
+        self.assertIn("'sbytes' is not a number", results[1]['error'])
+        self.assertEqual(results[0]['severity'], 'Critical')
+        # Invalid records are reported but never reach the model
+        self.assertEqual([len(batch) for batch in detector.batches], [1, 2, 1])
+        self.assertEqual(detector.batches[1][1], {'dur': 4.0, 'sbytes': None})
+
+
+class RuleEngineTests(TestCase):
+    incident = {
+        'id': 'i-1', 'source_ip': '10.0.0.5', 'destination_ip': '10.0.0.9',
+        'threat_type': 'DoS/SYN_Flood', 'severity': 'Critical', 'status': 'Active', 'confidence': 95,
+    }
+
+    def _rule(self, name, condition, **kwargs):
+        return ResponseRule.objects.create(name=name, condition=condition, action='block_ip', **kwargs)
+
+    def test_parse_condition(self):
+        self.assertEqual(parse_condition(' Severity=High , threat_type = DNS_Anomaly'),
+                         (('Severity', 'high'), ('threat_type', 'dns_anomaly')))
+        self.assertIsNone(parse_condition(''))
+        self.assertIsNone(parse_condition('severity=High,broken'))
+        self.assertEqual(parse_condition(' , '), ())
+
+    def test_matches_like_clause_by_clause_evaluation(self):
+        self._rule('crit', 'severity=critical')
+        self._rule('syn', 'threat_type=DoS/SYN_Flood,confidence=95')
+        self._rule('other host', 'severity=Critical,source_ip=10.0.0.6')
+        self._rule('unknown field', 'port=22')
+        self._rule('inactive', 'severity=Critical', is_active=False)
+        self._rule('every incident', ',')
+        engine = RuleEngine()
+
+        names = [rule.name for rule in engine.match(self.incident)]
+        self.assertEqual(names, ['crit', 'syn', 'every incident'])
+
+    def test_only_candidate_rules_are_checked(self):
+        rules = RuleSet(
+            ResponseRule(name=f'r{i}', condition=f'threat_type=T{i},severity=High', action='alert')
+            for i in range(1000)
+        )
+        self.assertEqual(rules.size, 1000)
+        self.assertEqual(len(rules.index['threat_type']['t7']), 1)
+        self.assertEqual([r.name for r in rules.match({'threat_type': 't7', 'severity': 'high'})], ['r7'])
+
+    def test_rule_changes_invalidate_the_compiled_set(self):
+        engine = RuleEngine()
+        self.assertEqual(engine.match(self.incident), [])
+        self.assertIsNotNone(engine.current())
+        # Saving and deleting through the ORM reach the shared engine via signals
+        shared = shared_rule_engine
+        shared.rules()
+        rule = self._rule('crit', 'severity=Critical')
+        self.assertIsNone(shared.current())
+        self.assertEqual([r.name for r in shared.match(self.incident)], ['crit'])
+        rule.delete()
+        self.assertIsNone(shared.current())
+
+    def test_flush_batches_log_entries_and_counts(self):
+        crit = self._rule('crit', 'severity=Critical')
+        syn = self._rule('syn', 'threat_type=DoS/SYN_Flood')
+        engine = RuleEngine(flush_interval=60, batch_size=3)
+        for i in range(2):
+            engine.record(engine.match(self.incident), f'i-{i}')
+        self.assertTrue(engine.flush_due())
+        self.assertEqual(LogEntry.objects.count(), 0)
+
+        self.assertEqual(engine.flush(), 4)
+        self.assertEqual(engine.flush(), 0)
+        self.assertEqual(LogEntry.objects.count(), 4)
+        crit.refresh_from_db()
+        syn.refresh_from_db()
+        self.assertEqual((crit.triggered_count, syn.triggered_count), (2, 2))
+
+    def test_failed_flush_keeps_the_batch_for_a_retry(self):
+        crit = self._rule('crit', 'severity=Critical')
+        engine = RuleEngine(flush_interval=60, batch_size=1)
+        engine.record(engine.match(self.incident), 'i-0')
+        with mock.patch.object(LogEntry.objects, 'bulk_create', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                engine.flush()
+        self.assertEqual(engine.pending, 1)
+        # No immediate retry, even though a full batch is pending
+        self.assertGreater(engine.flush_wait(), 0.0)
+        engine.record(engine.match(self.incident), 'i-1')
+
+        self.assertEqual(engine.flush(), 2)
+        self.assertEqual(sorted(LogEntry.objects.values_list('target', flat=True)), ['i-0', 'i-1'])
+        crit.refresh_from_db()
+        self.assertEqual(crit.triggered_count, 2)
+        self.assertIsNone(engine.flush_wait())
+
+    def test_failed_flush_over_max_pending_is_counted(self):
+        self._rule('crit', 'severity=Critical')
+        engine = RuleEngine(max_pending=1)
+        for i in range(2):
+            engine.record(engine.match(self.incident), f'i-{i}')
+        dropped = RULE_MATCHES_DROPPED.labels().get()
+        with mock.patch.object(LogEntry.objects, 'bulk_create', side_effect=DatabaseError('disk I/O error')):
+            with self.assertRaises(DatabaseError):
+                engine.flush()
+        self.assertEqual(engine.pending, 0)
+        self.assertEqual(RULE_MATCHES_DROPPED.labels().get(), dropped + 2)
+
+
+class PcapReplayTests(TestCase):
+    start = 1700000000.25
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.packets = []
+        for i in range(6):
+            fwd = i % 2 == 0
+            pkt = Ether() / IP(src="10.0.0.1" if fwd else "10.0.0.2", dst="10.0.0.2" if fwd else "10.0.0.1") / TCP(
+                sport=40000 if fwd else 80, dport=80 if fwd else 40000, flags="S" if i == 0 else "A")
+            pkt.time = self.start + i * 0.5
+            self.packets.append(pkt)
+        self.pcap = os.path.join(self.dir.name, "capture.pcap")
+        wrpcap(self.pcap, self.packets)
+
+    def _replay(self, sink, path=None, **options):
+        replay = PcapReplay(PacketFeatureExtractor(**options), None, sink)
+        return replay.run(iter_pcap(path or self.pcap))
+
+    def test_reads_pcap_and_pcapng_with_capture_timestamps(self):
+        pcapng = os.path.join(self.dir.name, "capture.pcapng")
+        writer = PcapNgWriter(pcapng)
+        for pkt in self.packets:
+            writer.write(pkt)
+        writer.close()
+        for path in (self.pcap, pcapng):
+            frames = list(iter_pcap(path))
+            self.assertEqual([cls for cls, _, _ in frames], [Ether] * 6)
+            self.assertEqual([round(ts, 6) for _, _, ts in frames], [self.start + i * 0.5 for i in range(6)])
+
+    def test_records_use_capture_time(self):
+        out = io.StringIO()
+        summary = self._replay(FileSink(out), decoder="fast")
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual((summary["packets"], summary["records"]), (6, 6))
+        self.assertEqual(records[-1]["dur"], 2.5)
+        self.assertEqual(records[-1]["spkts"] + records[-1]["dpkts"], 6)
+
+    def test_database_output_keeps_capture_timestamps(self):
+        self._replay(DatabaseSink(batch_size=4))
+        stamps = sorted(NetworkTraffic.objects.values_list("timestamp", flat=True))
+        self.assertEqual(len(stamps), 6)
+        self.assertEqual(stamps[0].timestamp(), self.start)
+        self.assertEqual(stamps[-1].timestamp(), self.start + 2.5)
+
+
+class BenchmarkTests(SimpleTestCase):
+    params = {"packets": 300, "flows": 20, "model": "synthetic", "reference_rows": 200, "batch_size": 32}
+
+    def test_synthetic_traffic_is_deterministic(self):
+        frames = synthetic_frames(50, flows=5, seed=1)
+        self.assertEqual(frames, synthetic_frames(50, flows=5, seed=1))
+        self.assertNotEqual(frames, synthetic_frames(50, flows=5, seed=2))
+
+    def test_stage_results(self):
+        fast = run_stage("extract_fast", self.params)
+        self.assertEqual((fast["packets"], fast["calls"], fast["records"]), (300, 300, 300))
+        self.assertEqual(fast["dissected_fallbacks"], 0)
+        batch = run_stage("predict_batch", self.params)
+        self.assertEqual((batch["packets"], batch["calls"], batch["model"]), (300, 10, "synthetic"))
+        for result in (fast, batch):
+            self.assertGreater(result["packets_per_s"], 0)
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+        with self.assertRaises(ValueError):
+            run_stage("nope")
+
+    def test_compare_results_flags_regressions(self):
+        baseline = {"stages": [
+            {"stage": "predict", "packets_per_s": 1000.0, "latency_ms": {"p99": 2.0}},
+            {"stage": "persist", "packets_per_s": 200.0, "latency_ms": {"p99": 10.0}},
+        ]}
+        current = [
+            {"stage": "predict", "packets_per_s": 700.0, "latency_ms": {"p99": 2.1}},
+            {"stage": "persist", "packets_per_s": 190.0, "latency_ms": {"p99": 15.0}},
+            {"stage": "generate", "packets_per_s": 1.0, "latency_ms": {"p99": 1.0}},
+        ]
+        regressions = compare_results(current, baseline, tolerance=0.2)
+        self.assertEqual([(r["stage"], r["metric"]) for r in regressions],
+                         [("predict", "packets_per_s"), ("persist", "p99_ms")])
+        self.assertEqual(regressions[0]["change"], -0.3)
+
+
+class MetricsTests(SimpleTestCase):
+    def test_prometheus_exposition(self):
+        registry = MetricsRegistry(enabled=True)
+        packets = registry.counter("ids_test_packets_total", "Packets", ["reason"])
+        packets.labels("queue_full").inc(3)
+        packets.labels(reason='a"b').inc()
+        depth = registry.gauge("ids_test_depth", "Depth")
+        depth.set_function(lambda: 7)
+        latency = registry.histogram("ids_test_seconds", "Latency", buckets=(0.1, 1.0))
+        for value in (0.05, 0.1, 0.5, 3.0):
+            latency.observe(value)
+        lines = registry.render().splitlines()
+        self.assertIn("# TYPE ids_test_packets_total counter", lines)
+        self.assertIn('ids_test_packets_total{reason="queue_full"} 3', lines)
+        self.assertIn('ids_test_packets_total{reason="a\\"b"} 1', lines)
+        self.assertIn("ids_test_depth 7", lines)
+        self.assertIn('ids_test_seconds_bucket{le="0.1"} 2', lines)
+        self.assertIn('ids_test_seconds_bucket{le="1"} 3', lines)
+        self.assertIn('ids_test_seconds_bucket{le="+Inf"} 4', lines)
+        self.assertIn("ids_test_seconds_count 4", lines)
+        self.assertIn("ids_test_seconds_sum 3.65", lines)
+
+    def test_disabled_registry_records_nothing(self):
+        registry = MetricsRegistry(enabled=False)
+        counter = registry.counter("ids_test_total", "Total")
+        latency = registry.histogram("ids_test_seconds", "Latency")
+        counter.inc()
+        latency.observe_since(registry.clock())
+        self.assertEqual(registry.clock(), 0.0)
+        self.assertIn("ids_test_total 0", registry.render())
+        self.assertIn("ids_test_seconds_count 0", registry.render())
+
+    def test_worker_drain_merges_into_parent(self):
+        parent, worker = MetricsRegistry(enabled=True), MetricsRegistry(enabled=True)
+        for registry in (parent, worker):
+            registry.counter("ids_test_errors_total", "Errors", ["stage"])
+            registry.histogram("ids_test_seconds", "Latency", buckets=(1.0,))
+        worker._metrics["ids_test_errors_total"].labels("extract").inc(2)
+        worker._metrics["ids_test_seconds"].observe(0.5)
+        parent.merge(worker.drain())
+        parent.merge(worker.drain())
+        rendered = parent.render()
+        self.assertIn('ids_test_errors_total{stage="extract"} 2', rendered)
+        self.assertIn("ids_test_seconds_count 1", rendered)
+
+    def test_metrics_endpoint(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        self.assertIn("# TYPE ids_stage_seconds histogram", response.content.decode())
+        metrics_registry.enabled = False
+        self.addCleanup(setattr, metrics_registry, "enabled", True)
+        self.assertEqual(self.client.get("/metrics").status_code, 404)
@@ -6,6 +6,8 @@ from .views import (
     ThreatIncidentViewSet,
     ResponseRuleViewSet,
     LogEntryViewSet,
+    StatsViewSet,
+    DetectorViewSet,
 )
 
 router = DefaultRouter()
@@ -13,6 +15,8 @@ router.register(r'traffic', NetworkTrafficViewSet)
 router.register(r'incidents', ThreatIncidentViewSet)
 router.register(r'rules', ResponseRuleViewSet)
 router.register(r'logs', LogEntryViewSet)
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'model', DetectorViewSet, basename='model')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -0,0 +1,87 @@
+"""
+Prototype selection for shrinking the KNN reference set.
+
+Every live query is compared against the stored training points, so fewer
+points means faster inference. Each function takes the scaled training matrix
+and labels and returns the reduced (X, y) reference set.
+"""
+
+import math
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import NearestNeighbors
+
+
+CONDENSATION_METHODS = ('enn', 'cnn', 'kmeans')
+
+# Per-class fractions tried (smallest first) when k-means condensation searches
+# for the smallest reference set within the accuracy budget
+KMEANS_FRACTIONS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.5)
+
+
+def edited_nearest_neighbors(X, y, n_neighbors=3):
+    """
+    Wilson's edited nearest neighbors: drop points whose neighbors mostly disagree with them.
+
+    Removes label noise and class-overlap points rather than redundancy, so the
+    reduction is moderate but accuracy usually holds or improves.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    nn = NearestNeighbors(n_neighbors=n_neighbors + 1, n_jobs=-1).fit(X)
+    neigh_ind = nn.kneighbors(X, return_distance=False)[:, 1:]
+    agree = (y[neigh_ind] == y[:, None]).sum(axis=1)
+    keep = agree * 2 > n_neighbors
+    return X[keep], y[keep]
+
+
+def condensed_nearest_neighbors(X, y, chunk_size=5000, max_passes=5, random_state=42):
+    """
+    Hart's condensed nearest neighbors, processed in chunks.
+
+    Keeps only the points a 1-NN classifier over the current prototypes gets
+    wrong; chunks are classified against the prototypes at the start of the
+    chunk, which keeps the cost vectorized at the price of a slightly larger set.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    rng = np.random.default_rng(random_state)
+    order = rng.permutation(len(X))
+
+    # Seed with one point per class
+    selected = np.zeros(len(X), dtype=bool)
+    for cls in np.unique(y):
+        selected[order[np.argmax(y[order] == cls)]] = True
+
+    for _ in range(max_passes):
+        added = 0
+        for start in range(0, len(order), chunk_size):
+            chunk = order[start:start + chunk_size]
+            chunk = chunk[~selected[chunk]]
+            if len(chunk) == 0:
+                continue
+            proto = np.flatnonzero(selected)
+            nn = NearestNeighbors(n_neighbors=1).fit(X[proto])
+            nearest = proto[nn.kneighbors(X[chunk], return_distance=False)[:, 0]]
+            wrong = chunk[y[nearest] != y[chunk]]
+            selected[wrong] = True
+            added += len(wrong)
+        if added == 0:
+            break
+    return X[selected], y[selected]
+
+
+def kmeans_prototypes(X, y, fraction=0.05, random_state=42):
+    """
+    Replace each class by k-means centroids, ceil(fraction * class size) per class.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    proto_X, proto_y = [], []
+    for cls in np.unique(y):
+        X_cls = X[y == cls]
+        n_clusters = max(1, min(len(X_cls), math.ceil(fraction * len(X_cls))))
+        km = MiniBatchKMeans(n_clusters=n_clusters, random_state=random_state, n_init=3).fit(X_cls)
+        proto_X.append(km.cluster_centers_)
+        proto_y.append(np.full(n_clusters, cls))
+    return np.vstack(proto_X), np.concatenate(proto_y)
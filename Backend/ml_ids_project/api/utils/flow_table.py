@@ -0,0 +1,263 @@
+"""
+Bounded flow table for live per-flow feature accumulation.
+
+Flows are keyed by the canonical 5-tuple and hold their counters in
+`__slots__` records. The table is kept in least-recently-seen order, so idle
+flows are expired from the front in amortized O(1), long-lived flows are cut
+at an active timeout, and a hard cap on live flows bounds memory. Every flow
+that leaves the table is handed to `on_evict` as a final flow record.
+"""
+
+import datetime
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class FlowState:
+    """Per-flow counters; forward is A->B of the canonical key, reverse is B->A."""
+
+    __slots__ = (
+        "start_ts", "last_ts",
+        # forward (A->B)
+        "spkts", "sbytes", "last_s_ts", "last_s_dt", "sjit", "smean_sum", "sttl", "swin", "stcpb",
+        # reverse (B->A)
+        "dpkts", "dbytes", "last_d_ts", "last_d_dt", "djit", "dmean_sum", "dttl", "dwin", "dtcpb",
+        # TCP timing
+        "t_syn", "t_synack", "t_ack", "synack", "tcprtt", "ackdat",
+        # last seen service/state and ct_* counters, for flow-level records
+        "service", "state", "ct",
+        # flow-level classification checkpoints
+        "checkpoint_ts", "checkpoint_pkts",
+        # directions that have sent a FIN (1: A->B, 2: B->A)
+        "fins",
+    )
+
+    def __init__(self, start_ts):
+        self.start_ts = start_ts
+        self.last_ts = start_ts
+        self.spkts = self.sbytes = self.smean_sum = 0
+        self.dpkts = self.dbytes = self.dmean_sum = 0
+        self.sjit = self.djit = 0.0
+        self.last_s_ts = self.last_s_dt = self.sttl = self.swin = self.stcpb = None
+        self.last_d_ts = self.last_d_dt = self.dttl = self.dwin = self.dtcpb = None
+        self.t_syn = self.t_synack = self.t_ack = None
+        self.synack = self.tcprtt = self.ackdat = None
+        self.service = self.state = self.ct = None
+        self.checkpoint_ts = start_ts
+        self.checkpoint_pkts = 0
+        self.fins = 0
+
+    def checkpoint_due(self, now_ts, every_packets=0, every_seconds=0):
+        """
+        Whether an intermediate classification of this flow is due; resets the checkpoint if so.
+
+        Args:
+            now_ts: Current packet timestamp
+            every_packets: Checkpoint after this many packets since the last one (0 disables)
+            every_seconds: Checkpoint after this many seconds since the last one (0 disables)
+        """
+        pkts = self.spkts + self.dpkts
+        due = (
+            (every_packets and pkts - self.checkpoint_pkts >= every_packets)
+            or (every_seconds and now_ts - self.checkpoint_ts >= every_seconds)
+        )
+        if due:
+            self.checkpoint_pkts = pkts
+            self.checkpoint_ts = now_ts
+        return bool(due)
+
+    def metrics(self, now_ts=None):
+        """
+        Derived flow metrics as of now_ts (defaults to the last packet seen).
+
+        Returns:
+            Dictionary of UNSW-style flow features
+        """
+        now_ts = self.last_ts if now_ts is None else now_ts
+        dur = max(0.0, now_ts - (self.start_ts or now_ts))
+        total_pkts = self.spkts + self.dpkts
+        return {
+            "dur": dur,
+            "spkts": self.spkts,
+            "dpkts": self.dpkts,
+            "sbytes": self.sbytes,
+            "dbytes": self.dbytes,
+            "rate": (total_pkts / dur) if dur > 0 else 0.0,
+            "sload": (self.sbytes / dur) if dur > 0 else 0.0,
+            "dload": (self.dbytes / dur) if dur > 0 else 0.0,
+            "sinpkt": self.last_s_dt,
+            "dinpkt": self.last_d_dt,
+            "sjit": self.sjit,
+            "djit": self.djit,
+            "smean": (self.smean_sum / self.spkts) if self.spkts > 0 else 0.0,
+            "dmean": (self.dmean_sum / self.dpkts) if self.dpkts > 0 else 0.0,
+            "sttl": self.sttl,
+            "dttl": self.dttl,
+            "swin": self.swin,
+            "dwin": self.dwin,
+            "stcpb": self.stcpb,
+            "dtcpb": self.dtcpb,
+            "synack": self.synack,
+            "tcprtt": self.tcprtt,
+            "ackdat": self.ackdat,
+        }
+
+
+class FlowTable:
+    """LRU-ordered flow table with idle/active timeouts and a hard flow cap."""
+
+    def __init__(self, idle_timeout=60.0, active_timeout=1800.0, max_flows=100000,
+                 overflow="evict", on_evict=None):
+        """
+        Initialize the flow table.
+
+        Args:
+            idle_timeout: Seconds without packets after which a flow is expired
+            active_timeout: Seconds after which a still-active flow is closed and restarted
+            max_flows: Hard cap on live flows
+            overflow: At the cap, "evict" the least recently seen flow or "drop" the new one
+            on_evict: Callable(key, state, reason) invoked for every flow leaving the table
+        """
+        if overflow not in ("evict", "drop"):
+            raise ValueError("overflow must be 'evict' or 'drop'")
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.max_flows = max_flows
+        self.overflow = overflow
+        self.on_evict = on_evict
+        self._flows = OrderedDict()
+        self._lock = threading.Lock()
+        self.created = 0
+        self.evicted = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return len(self._flows)
+
+    def __contains__(self, key):
+        return key in self._flows
+
+    @property
+    def stats(self):
+        """Counts of live, created, evicted and dropped flows."""
+        return {
+            "live": len(self._flows),
+            "created": self.created,
+            "evicted": self.evicted,
+            "dropped": self.dropped,
+        }
+
+    def get(self, key, now_ts):
+        """
+        Return the live state for key, creating it if needed, and mark it as seen.
+
+        Also expires idle flows and enforces the active timeout and flow cap.
+
+        Returns:
+            FlowState, or None if the flow was dropped because the table is full
+        """
+        finished = []
+        with self._lock:
+            self._expire_idle(now_ts, finished)
+            st = self._flows.get(key)
+            if st is not None and self.active_timeout is not None and now_ts - st.start_ts >= self.active_timeout:
+                finished.append((key, self._flows.pop(key), "active"))
+                st = None
+            if st is None:
+                if self.max_flows is not None and len(self._flows) >= self.max_flows and self.overflow == "drop":
+                    self.dropped += 1
+                else:
+                    if self.max_flows is not None and len(self._flows) >= self.max_flows:
+                        oldest = next(iter(self._flows))
+                        finished.append((oldest, self._flows.pop(oldest), "capacity"))
+                    st = FlowState(now_ts)
+                    self._flows[key] = st
+                    self.created += 1
+            else:
+                self._flows.move_to_end(key)
+            if st is not None:
+                st.last_ts = now_ts
+        self._emit(finished)
+        return st
+
+    def remove(self, key, reason="closed"):
+        """Finish a flow explicitly (e.g. on FIN/RST) and emit its record."""
+        with self._lock:
+            st = self._flows.pop(key, None)
+        if st is not None:
+            self._emit([(key, st, reason)])
+        return st
+
+    def expire(self, now_ts):
+        """Expire flows idle for longer than idle_timeout."""
+        finished = []
+        with self._lock:
+            self._expire_idle(now_ts, finished)
+        self._emit(finished)
+
+    def flush(self, reason="shutdown"):
+        """Emit and remove every live flow."""
+        with self._lock:
+            finished = [(key, st, reason) for key, st in self._flows.items()]
+            self._flows.clear()
+        self._emit(finished)
+
+    def _expire_idle(self, now_ts, finished):
+        if self.idle_timeout is None:
+            return
+        horizon = now_ts - self.idle_timeout
+        while self._flows:
+            key, st = next(iter(self._flows.items()))
+            if st.last_ts >= horizon:
+                break
+            self._flows.popitem(last=False)
+            finished.append((key, st, "idle"))
+
+    def _emit(self, finished):
+        # Callbacks run outside the lock so they may safely call back into the table
+        self.evicted += len(finished)
+        if self.on_evict is None:
+            return
+        for key, st, reason in finished:
+            try:
+                self.on_evict(key, st, reason)
+            except Exception as e:
+                print(f"Error emitting finished flow: {e}")
+
+
+def flow_record(key, state, reason):
+    """
+    Build the record for a finished (or checkpointed) flow.
+
+    Uses the same layout as the live per-packet records so flow records can be
+    classified, persisted and streamed the same way.
+    """
+    a_ip, a_port, b_ip, b_port, protocol = key
+    record = {
+        "id": str(uuid.uuid4()),
+        "timestamp": datetime.datetime.fromtimestamp(state.last_ts).isoformat(),
+        "record_type": "flow",
+        "reason": reason,
+        "source_ip": a_ip,
+        "destination_ip": b_ip,
+        "sport": a_port,
+        "dport": b_port,
+        "protocol": protocol,
+        "proto": protocol.lower(),
+        "bytes": state.sbytes + state.dbytes,
+        # Filled in by the KNN batcher; Normal until classified
+        "status": "Normal",
+        "severity": "Low",
+        "probs": [],
+        "pred_idx": 0,
+        "pred_prob": 0.0,
+        "label": 0,
+    }
+    record.update(state.metrics())
+    record["service"] = state.service
+    record["state"] = state.state
+    record["is_sm_ips_ports"] = int(a_ip == b_ip and a_port == b_port)
+    if state.ct:
+        record.update(state.ct)
+    return record
@@ -0,0 +1,101 @@
+"""
+Wire encodings for live traffic batch frames.
+
+"json" sends each batch frame as JSON text, with every key name in every
+record. "msgpack" sends binary msgpack frames in a schema-based row layout:
+each distinct record layout (its ordered key names) is sent once per
+connection under a small integer id, and each record then travels as
+[schema_id, value, value, ...]. Live records share a handful of layouts, so
+after the first frame the key names, which make up most of a JSON frame,
+are no longer sent at all.
+
+A msgpack frame decodes to
+
+    {"type": "batch", "dropped": N,
+     "schemas": {schema_id: [key, ...]},   # only layouts new to this connection
+     "rows": [[schema_id, value, ...], ...]}
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack is listed in requirements.txt
+    msgpack = None
+
+
+ENCODINGS = ("json", "msgpack")
+
+
+def available_encodings():
+    return tuple(e for e in ENCODINGS if e != "msgpack" or msgpack is not None)
+
+
+def _default(obj):
+    # numpy scalars and similar: fall back to the Python value, else its string form
+    if hasattr(obj, "item"):
+        return obj.item()
+    return str(obj)
+
+
+class JSONFrameEncoder:
+    binary = False
+
+    def encode(self, frame):
+        return json.dumps(frame, default=_default)
+
+
+class SchemaFrameEncoder:
+    """msgpack encoder that sends each record layout's key names once per connection."""
+
+    binary = True
+
+    def __init__(self):
+        if msgpack is None:
+            raise ValueError("The msgpack encoding requires the msgpack package")
+        self._schemas = {}
+
+    def encode(self, frame):
+        new_schemas = {}
+        rows = []
+        for record in frame["records"]:
+            keys = tuple(record)
+            schema_id = self._schemas.get(keys)
+            if schema_id is None:
+                schema_id = self._schemas[keys] = len(self._schemas)
+                new_schemas[schema_id] = list(keys)
+            row = [schema_id]
+            row.extend(record.values())
+            rows.append(row)
+        return msgpack.packb(
+            {"type": "batch", "dropped": frame["dropped"], "schemas": new_schemas, "rows": rows},
+            default=_default,
+        )
+
+
+def make_encoder(encoding):
+    """
+    Encoder for a negotiated encoding name.
+
+    Raises:
+        ValueError: If the encoding is unknown or unavailable
+    """
+    if encoding == "json":
+        return JSONFrameEncoder()
+    if encoding == "msgpack":
+        return SchemaFrameEncoder()
+    raise ValueError(f"'encoding' must be one of {', '.join(ENCODINGS)}")
+
+
+def decode_frame(data, schemas):
+    """
+    Decode a msgpack batch frame back into {"type", "records", "dropped"}.
+
+    Args:
+        data: Encoded frame
+        schemas: Per-connection dict of known layouts; updated in place
+    """
+    frame = msgpack.unpackb(data, strict_map_key=False)
+    schemas.update(frame["schemas"])
+    records = [dict(zip(schemas[row[0]], row[1:])) for row in frame["rows"]]
+    return {"type": "batch", "records": records, "dropped": frame["dropped"]}
@@ -0,0 +1,114 @@
+"""
+Micro-batching inference stage for the live capture pipeline.
+
+The sniffing thread submits one feature dict per packet; a worker thread groups
+them into micro-batches (bounded by size and by a maximum queueing delay) and
+classifies each batch with a single vectorized KNNAnomalyDetector.predict_batch call.
+"""
+
+import queue
+import threading
+import time
+
+
+_STOP = object()
+
+
+class InferenceBatcher:
+    """Collect feature vectors into micro-batches and classify them in one call."""
+
+    def __init__(self, detector, on_result, max_batch_size=64, max_wait_ms=20.0, on_batch=None):
+        """
+        Initialize the batcher.
+
+        Args:
+            detector: Loaded KNNAnomalyDetector (or None to pass records through unclassified)
+            on_result: Callable(record, result) invoked from the worker thread for every item;
+                result is a predict()-style dict, or None if classification was skipped/failed
+            max_batch_size: Maximum number of items classified per predict_batch call
+            max_wait_ms: Maximum time the first item of a batch waits for the batch to fill
+            on_batch: Optional Callable(batch size, seconds, failed) invoked after every
+                predict_batch call, e.g. to record metrics
+        """
+        self.detector = detector
+        self.on_result = on_result
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.on_batch = on_batch
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (idempotent)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="knn-inference-batcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Flush pending items and stop the worker thread.
+
+        Args:
+            timeout: Seconds to wait for the worker to finish; None returns immediately
+        """
+        self._queue.put(_STOP)
+        if timeout is not None and self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, features, record):
+        """Queue a feature dict for classification; `record` is handed back to on_result."""
+        self._queue.put((features, record))
+
+    def qsize(self):
+        """Approximate number of items waiting to be batched."""
+        return self._queue.qsize()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._process(batch)
+
+    def _process(self, batch):
+        results = [None] * len(batch)
+        if self.detector is not None:
+            started = time.perf_counter()
+            failed = False
+            try:
+                out = self.detector.predict_batch([features for features, _ in batch])
+                results = [
+                    {
+                        'prediction': pred,
+                        'label': label,
+                        'confidence': conf,
+                        'probabilities': probs,
+                    }
+                    for pred, label, conf, probs in zip(
+                        out['predictions'], out['labels'], out['confidences'], out['probabilities']
+                    )
+                ]
+            except Exception as e:
+                # If the classifier fails, every record in the batch falls back to Normal
+                print(f"Batch inference failed ({len(batch)} items): {e}")
+                failed = True
+            if self.on_batch is not None:
+                self.on_batch(len(batch), time.perf_counter() - started, failed)
+        for (_, record), result in zip(batch, results):
+            try:
+                self.on_result(record, result)
+            except Exception as e:
+                print(f"Error delivering inference result: {e}")
@@ -0,0 +1,57 @@
+"""
+IP helpers for indexed traffic search.
+
+IPv4 addresses are stored a second time as integers, so a CIDR block becomes
+one BETWEEN range on an indexed integer column. Address prefixes ("10.0.",
+"192.168") are answered by a range on the indexed text column itself:
+every string starting with a prefix sorts between the prefix and its
+successor, which a B-tree index can scan directly (LIKE 'x%' cannot use the
+index on SQLite).
+"""
+
+import ipaddress
+
+
+def ipv4_to_int(value):
+    """Integer form of an IPv4 address, or None for IPv6/invalid values."""
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    return int(address) if address.version == 4 else None
+
+
+def cidr_range(value):
+    """
+    Inclusive integer range of an IPv4 CIDR block ("10.0.0.0/8").
+
+    Returns:
+        (low, high), or None if value is not an IPv4 network in CIDR notation
+    """
+    if "/" not in value:
+        return None
+    try:
+        network = ipaddress.ip_network(value, strict=False)
+    except ValueError:
+        return None
+    if network.version != 4:
+        return None
+    return int(network.network_address), int(network.broadcast_address)
+
+
+def prefix_successor(prefix):
+    """
+    Smallest string greater than every string starting with prefix.
+
+    `prefix <= s < prefix_successor(prefix)` is then exactly `s.startswith(prefix)`.
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def is_ip_like(value):
+    """Whether value could be (part of) an IPv4 or IPv6 address."""
+    if not value:
+        return False
+    if all(c.isdigit() or c == "." for c in value):
+        return any(c.isdigit() for c in value)
+    return ":" in value and all(c in "0123456789abcdefABCDEF:." for c in value)
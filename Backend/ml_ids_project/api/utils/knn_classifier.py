@@ -8,12 +8,28 @@ import json
 import numpy as np
 import pandas as pd
 import joblib
+import time
 from pathlib import Path
+from typing import NamedTuple
 from sklearn.preprocessing import StandardScaler
-from sklearn.neighbors import KNeighborsClassifier as KNN
 from sklearn.feature_selection import mutual_info_classif
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score, confusion_matrix
+from .neighbor_backends import build_neighbors_model, backend_params
+from .condensation import (
+    KMEANS_FRACTIONS,
+    edited_nearest_neighbors,
+    condensed_nearest_neighbors,
+    kmeans_prototypes,
+)
+
+
+class _TransformPlan(NamedTuple):
+    """Live preprocessing compiled from the selected features and the fitted scaler."""
+    features: tuple
+    log_mask: np.ndarray
+    mean: np.ndarray
+    scale: np.ndarray
 
 
 class KNNAnomalyDetector:
@@ -31,6 +47,8 @@ class KNNAnomalyDetector:
         self.model = None
         self.scaler = None
         self.selected_features = None
+        self.neighbor_backend = None
+        self._plan = None
         self.model_path = model_path
         self.features_path = features_path
         self.scaler_path = scaler_path
@@ -84,16 +102,17 @@ class KNNAnomalyDetector:
         preprocessed = pd.concat([df_transformed[selected_features], df['label']], axis=1)
         return preprocessed, selected_features
     
-    def train(self, df, n_neighbors=7):
+    def prepare_training_data(self, df):
         """
-        Train the KNN model.
+        Preprocess, split and scale a raw training dataframe.
+        
+        Sets the selected features and fits the scaler.
         
         Args:
-            df: Preprocessed dataframe with 'label' column
-            n_neighbors: Number of neighbors for KNN
+            df: Raw dataframe with 'label' column
             
         Returns:
-            Dictionary with training metrics
+            Tuple of (X_train_scaled, X_test_scaled, y_train, y_test)
         """
         # Preprocess data
         df_processed, self.selected_features = self.preprocess_data(df)
@@ -108,13 +127,124 @@ class KNNAnomalyDetector:
         self.scaler = StandardScaler()
         X_train_scaled = self.scaler.fit_transform(X_train)
         X_test_scaled = self.scaler.transform(X_test)
+        self._plan = self._compile_transform()
+        
+        return X_train_scaled, X_test_scaled, y_train, y_test
+    
+    def train(self, df, n_neighbors=7, backend='auto', condense=None, condense_budget=0.01, **backend_options):
+        """
+        Train the KNN model.
+        
+        Args:
+            df: Preprocessed dataframe with 'label' column
+            n_neighbors: Number of neighbors for KNN
+            backend: Neighbor-search backend (auto, brute, kd_tree, ball_tree or ivf)
+            condense: Optional prototype selection (enn, cnn or kmeans) to shrink the reference set
+            condense_budget: Maximum accuracy drop accepted from condensation
+            **backend_options: leaf_size for tree backends, n_lists/n_probe for ivf
+            
+        Returns:
+            Dictionary with training metrics
+        """
+        X_train_scaled, X_test_scaled, y_train, y_test = self.prepare_training_data(df)
         
         # Train model
-        self.model = KNN(n_neighbors=n_neighbors, metric='euclidean', n_jobs=-1)
+        self.model = build_neighbors_model(backend, n_neighbors=n_neighbors, **backend_options)
         self.model.fit(X_train_scaled, y_train)
         
-        # Evaluate
-        y_pred = self.model.predict(X_test_scaled)
+        metrics = self.evaluate(X_test_scaled, y_test)
+        
+        if condense:
+            metrics, condensation = self._condense(
+                X_train_scaled, y_train, X_test_scaled, y_test, metrics,
+                condense, condense_budget, n_neighbors, backend, backend_options,
+            )
+            metrics['condensation'] = condensation
+        
+        self.neighbor_backend = backend_params(self.model)
+        metrics['selected_features'] = self.selected_features
+        metrics['neighbor_backend'] = self.neighbor_backend
+        
+        return metrics
+    
+    def _condense(self, X_train, y_train, X_test, y_test, full_metrics, method, budget,
+                  n_neighbors, backend, backend_options):
+        """
+        Replace the fitted model by one over a condensed reference set if it stays within budget.
+        
+        Returns:
+            Tuple of (metrics of the kept model, condensation report)
+        """
+        X_train = np.asarray(X_train)
+        y_train = np.asarray(y_train)
+        
+        if method == 'enn':
+            candidates = [edited_nearest_neighbors(X_train, y_train)]
+        elif method == 'cnn':
+            candidates = [condensed_nearest_neighbors(X_train, y_train)]
+        elif method == 'kmeans':
+            # Smallest first; the first set within budget wins
+            candidates = (kmeans_prototypes(X_train, y_train, fraction) for fraction in KMEANS_FRACTIONS)
+        else:
+            raise ValueError(f"Unknown condensation method '{method}'. Choose from enn, cnn, kmeans.")
+        
+        full_model = self.model
+        full_seconds = self._time_inference(X_test)
+        
+        report = {
+            'method': method,
+            'accuracy_budget': budget,
+            'reference_size_before': int(len(X_train)),
+            'reference_size_after': int(len(X_train)),
+            'accepted': False,
+        }
+        kept_metrics = full_metrics
+        for X_ref, y_ref in candidates:
+            if len(X_ref) < n_neighbors:
+                continue
+            self.model = build_neighbors_model(backend, n_neighbors=n_neighbors, **backend_options)
+            self.model.fit(X_ref, y_ref)
+            candidate_metrics = self.evaluate(X_test, y_test)
+            if full_metrics['accuracy'] - candidate_metrics['accuracy'] <= budget:
+                condensed_seconds = self._time_inference(X_test)
+                kept_metrics = candidate_metrics
+                report.update({
+                    'reference_size_after': int(len(X_ref)),
+                    'accepted': True,
+                    'inference_speedup': full_seconds / condensed_seconds if condensed_seconds > 0 else None,
+                })
+                break
+        else:
+            # Nothing met the budget: keep the full reference set
+            self.model = full_model
+        
+        report['size_reduction'] = 1.0 - report['reference_size_after'] / report['reference_size_before']
+        report['metric_deltas'] = {
+            key: kept_metrics[key] - full_metrics[key] for key in ('accuracy', 'precision', 'recall', 'f1')
+        }
+        report['full_metrics'] = full_metrics
+        return kept_metrics, report
+    
+    def _time_inference(self, X_scaled, max_rows=2000, batch_size=64):
+        """Seconds needed to classify up to max_rows rows in micro-batches."""
+        X_scaled = X_scaled[:max_rows]
+        start = time.perf_counter()
+        for offset in range(0, len(X_scaled), batch_size):
+            self._classify(X_scaled[offset:offset + batch_size])
+        return time.perf_counter() - start
+    
+    def evaluate(self, X_scaled, y_test):
+        """
+        Score the current model on a scaled test set.
+        
+        Args:
+            X_scaled: Scaled feature matrix
+            y_test: True labels
+            
+        Returns:
+            Dictionary with classification metrics
+        """
+        y_pred, _ = self._classify(X_scaled)
         
         metrics = {
             'accuracy': float(accuracy_score(y_test, y_pred)),
@@ -122,7 +252,6 @@ class KNNAnomalyDetector:
             'recall': float(recall_score(y_test, y_pred)),
             'f1': float(f1_score(y_test, y_pred)),
             'confusion_matrix': confusion_matrix(y_test, y_pred).tolist(),
-            'selected_features': self.selected_features
         }
         
         return metrics
@@ -140,15 +269,13 @@ class KNNAnomalyDetector:
         if self.model is None or self.scaler is None or self.selected_features is None:
             raise ValueError("Model not trained. Train or load a model first.")
         
-        # Apply the same preprocessing as training
-        feature_vector = self._preprocess_features(features_dict)
-        
-        # Scale
-        feature_vector_scaled = self.scaler.transform(feature_vector)
+        # Apply the same preprocessing and scaling as training
+        feature_vector_scaled = self._vectorize([features_dict])
         
-        # Predict
-        prediction = self.model.predict(feature_vector_scaled)[0]
-        probabilities = self.model.predict_proba(feature_vector_scaled)[0]
+        # Predict (single neighbor search)
+        predictions, probabilities = self._classify(feature_vector_scaled)
+        prediction = predictions[0]
+        probabilities = probabilities[0]
         
         return {
             'prediction': int(prediction),
@@ -160,6 +287,102 @@ class KNNAnomalyDetector:
             }
         }
     
+    def _classify(self, X_scaled):
+        """
+        Classify scaled rows with one k-nearest-neighbor query.
+        
+        Equivalent to calling model.predict and model.predict_proba, which would
+        each run their own neighbor search.
+        
+        Args:
+            X_scaled: Scaled feature matrix
+            
+        Returns:
+            Tuple of (predicted class labels, class probability matrix)
+        """
+        classes = self.model.classes_
+        weights = getattr(self.model, 'weights', 'uniform')
+        if weights == 'uniform':
+            neigh_ind = self.model.kneighbors(X_scaled, return_distance=False)
+            neigh_weights = None
+        else:
+            neigh_dist, neigh_ind = self.model.kneighbors(X_scaled)
+            if weights == 'distance':
+                with np.errstate(divide='ignore'):
+                    neigh_weights = 1.0 / neigh_dist
+                # Exact matches take all the weight, as in sklearn
+                exact = np.isinf(neigh_weights)
+                exact_rows = exact.any(axis=1)
+                neigh_weights[exact_rows] = exact[exact_rows]
+            else:
+                neigh_weights = weights(neigh_dist)
+        
+        # Encoded class index of each neighbor (train_labels_ holds the training labels as
+        # indices into classes_)
+        neigh_labels = self.model.train_labels_[neigh_ind]
+        probabilities = np.empty((neigh_ind.shape[0], len(classes)))
+        for idx in range(len(classes)):
+            hits = neigh_labels == idx
+            if neigh_weights is None:
+                probabilities[:, idx] = hits.sum(axis=1)
+            else:
+                probabilities[:, idx] = (hits * neigh_weights).sum(axis=1)
+        normalizer = probabilities.sum(axis=1, keepdims=True)
+        normalizer[normalizer == 0.0] = 1.0
+        probabilities /= normalizer
+        
+        predictions = classes[np.argmax(probabilities, axis=1)]
+        return predictions, probabilities
+    
+    def _compile_transform(self):
+        """
+        Compile the live preprocessing into a fixed plan of NumPy arrays.
+        
+        Run once when a model is trained or loaded so that per-packet inference
+        needs no DataFrame construction or per-feature list membership tests.
+        
+        Returns:
+            _TransformPlan with feature order, log mask and folded scaler mean/scale
+        """
+        _, numeric_features, non_log, _ = self.build_feature_sets(None)
+        log_features = set(numeric_features) - set(non_log)
+        n_features = len(self.selected_features)
+        
+        mean = getattr(self.scaler, 'mean_', None) if getattr(self.scaler, 'with_mean', True) else None
+        scale = getattr(self.scaler, 'scale_', None) if getattr(self.scaler, 'with_std', True) else None
+        return _TransformPlan(
+            features=tuple(self.selected_features),
+            log_mask=np.array([feat in log_features for feat in self.selected_features], dtype=bool),
+            mean=np.zeros(n_features) if mean is None else np.asarray(mean, dtype=float),
+            scale=np.ones(n_features) if scale is None else np.asarray(scale, dtype=float),
+        )
+    
+    def _vectorize(self, records, scale=True):
+        """
+        Convert raw feature dictionaries into a (scaled) feature matrix.
+        
+        Args:
+            records: Iterable of raw feature dictionaries; missing or None values count as 0
+            scale: Apply the folded StandardScaler mean/scale
+            
+        Returns:
+            Numpy array of shape (n_records, n_selected_features)
+        """
+        if self._plan is None:
+            self._plan = self._compile_transform()
+        plan = self._plan
+        
+        # None -> NaN -> 0, matching the `or 0` default of the dict path
+        X = np.array([[rec.get(feat) for feat in plan.features] for rec in records], dtype=float)
+        if X.size == 0:
+            return X.reshape(0, len(plan.features))
+        np.nan_to_num(X, copy=False, nan=0.0)
+        X[:, plan.log_mask] = np.log10(X[:, plan.log_mask] + 1)
+        if scale:
+            X -= plan.mean
+            X /= plan.scale
+        return X
+    
     def _preprocess_features(self, features_dict):
         """
         Preprocess individual feature dictionary applying log transformation.
@@ -170,32 +393,15 @@ class KNNAnomalyDetector:
         Returns:
             Numpy array with log-transformed and selected features
         """
-        features, numeric_features, non_log, non_numeric = self.build_feature_sets(pd.DataFrame())
-        
-        # Create a dataframe with raw values
-        raw_df = pd.DataFrame([features_dict])
-        
-        # Apply log transform to numeric features (same as training)
-        log_features = []
-        for feat in self.selected_features:
-            if feat in numeric_features and feat not in non_log:
-                # Apply log transform
-                value = features_dict.get(feat, 0)
-                transformed = np.log10(value + 1)
-                log_features.append(transformed)
-            else:
-                # Keep as-is
-                log_features.append(features_dict.get(feat, 0))
-        
-        feature_vector = np.array([log_features])
-        return feature_vector
+        return self._vectorize([features_dict], scale=False)
     
     def predict_batch(self, df):
         """
         Predict on a batch of records.
         
         Args:
-            df: Dataframe with feature columns
+            df: Dataframe with feature columns, or a list of raw feature dictionaries
+                (each preprocessed like predict() does for a single packet)
             
         Returns:
             Dictionary with predictions and metrics
@@ -204,17 +410,21 @@ class KNNAnomalyDetector:
             raise ValueError("Model not trained. Train or load a model first.")
         
         # Extract features
-        X = df[self.selected_features]
-        X_scaled = self.scaler.transform(X)
+        if isinstance(df, pd.DataFrame):
+            X_scaled = self.scaler.transform(df[self.selected_features])
+        else:
+            X_scaled = self._vectorize(df)
         
-        # Predict
-        predictions = self.model.predict(X_scaled)
-        probabilities = self.model.predict_proba(X_scaled)
+        # Predict (single neighbor search)
+        predictions, probabilities = self._classify(X_scaled)
         
         return {
-            'predictions': predictions.tolist(),
+            'predictions': [int(p) for p in predictions],
             'labels': ['Anomalous' if p == 1 else 'Normal' for p in predictions],
-            'confidences': np.max(probabilities, axis=1).tolist()
+            'confidences': np.max(probabilities, axis=1).tolist(),
+            'probabilities': [
+                {'normal': float(row[0]), 'anomalous': float(row[1])} for row in probabilities
+            ]
         }
     
     def save_model(self, model_path, features_path, scaler_path):
@@ -232,13 +442,24 @@ class KNNAnomalyDetector:
         joblib.dump(self.scaler, scaler_path)
         
         with open(features_path, 'w') as f:
-            json.dump({'selected_features': self.selected_features}, f, indent=2)
+            json.dump({
+                'selected_features': self.selected_features,
+                'neighbor_backend': self.neighbor_backend or backend_params(self.model),
+            }, f, indent=2)
     
     def load_model(self, model_path, features_path, scaler_path):
         """Load trained model and artifacts."""
         self.model = joblib.load(model_path)
         self.scaler = joblib.load(scaler_path)
+        if not hasattr(self.model, 'train_labels_'):
+            # Plain sklearn models saved before the detector kept its own label copy;
+            # take sklearn's encoded labels once here
+            self.model.train_labels_ = np.asarray(self.model._y)
         
         with open(features_path, 'r') as f:
             data = json.load(f)
             self.selected_features = data['selected_features']
+            # Artifacts saved before backends were selectable used sklearn's default search
+            self.neighbor_backend = data.get('neighbor_backend', {'name': 'auto'})
+        
+        self._plan = self._compile_transform()
@@ -0,0 +1,364 @@
+"""
+Minimal in-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms are registered on a MetricsRegistry and
+rendered in the Prometheus text format (version 0.0.4) by
+`MetricsRegistry.render()`. Values already tracked elsewhere (queue lengths,
+rows written by the DB writer) are not duplicated: a counter or gauge child
+can read them through `set_function` when the registry is scraped.
+
+While the registry is disabled, `inc`, `set` and `observe` return after one
+attribute check and `clock()` does not read the clock, so instrumented code
+costs next to nothing.
+
+Counters and histograms can be drained and merged, so worker processes can
+ship their increments and observations to the process that serves them.
+"""
+
+import bisect
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                   0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if value == -math.inf:
+        return "-Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _ValueChild:
+    __slots__ = ("_registry", "_lock", "_value", "_function")
+
+    def __init__(self, registry):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._value = 0.0
+        self._function = None
+
+    def inc(self, amount=1):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._value += amount
+
+    def set_function(self, function):
+        """Read the value from function() at scrape time instead of tracking it here."""
+        self._function = function
+
+    def get(self):
+        if self._function is not None:
+            return float(self._function())
+        return self._value
+
+    def drain(self):
+        with self._lock:
+            value, self._value = self._value, 0.0
+        return value
+
+    def merge(self, amount):
+        with self._lock:
+            self._value += amount
+
+
+class _GaugeChild(_ValueChild):
+    __slots__ = ()
+
+    def dec(self, amount=1):
+        self.inc(-amount)
+
+    def set(self, value):
+        if not self._registry.enabled:
+            return
+        with self._lock:
+            self._value = float(value)
+
+
+class _HistogramChild:
+    __slots__ = ("_registry", "_lock", "_bounds", "_counts", "_sum")
+
+    def __init__(self, registry, bounds):
+        self._registry = registry
+        self._lock = threading.Lock()
+        self._bounds = bounds
+        # Per-bucket (non-cumulative) counts; the last one is +Inf
+        self._counts = [0] * (len(bounds) + 1)
+        self._sum = 0.0
+
+    def observe(self, value):
+        if not self._registry.enabled:
+            return
+        index = bisect.bisect_left(self._bounds, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    def observe_since(self, started):
+        """Observe the seconds elapsed since `started`, a MetricsRegistry.clock() reading."""
+        if not self._registry.enabled:
+            return
+        self.observe(time.perf_counter() - started)
+
+    def drain(self):
+        """Take (per-bucket counts, sum) observed since the last drain and reset them."""
+        with self._lock:
+            counts, total = self._counts, self._sum
+            self._counts = [0] * (len(self._bounds) + 1)
+            self._sum = 0.0
+        return counts, total
+
+    def merge(self, counts, total):
+        """Add observations drained from another process's histogram with the same buckets."""
+        with self._lock:
+            for index, count in enumerate(counts):
+                self._counts[index] += count
+            self._sum += total
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._counts), self._sum
+
+
+class _Metric:
+    type = None
+    child_class = None
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        return self.child_class(self.registry)
+
+    def labels(self, *values, **kwargs):
+        """The child for one combination of label values (created on first use)."""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        key = tuple(str(value) for value in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def children(self):
+        with self._lock:
+            return sorted(self._children.items())
+
+    def samples(self):
+        """Yield (suffix, label values, extra labels, value) for the exposition."""
+        for key, child in self.children():
+            try:
+                value = child.get()
+            except Exception:
+                # A scrape-time source that went away (e.g. a stopped service) is left out
+                continue
+            yield "", key, (), value
+
+    def drain(self):
+        """{label values: increment} of every tracked (not function-backed) child since the last drain."""
+        drained = {}
+        for key, child in self.children():
+            if child._function is None:
+                amount = child.drain()
+                if amount:
+                    drained[key] = amount
+        return drained
+
+    def merge(self, drained):
+        """Add the output of another process's drain()."""
+        for key, amount in drained.items():
+            self.labels(*key).merge(amount)
+
+
+class Counter(_Metric):
+    type = "counter"
+    child_class = _ValueChild
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+    def set_function(self, function):
+        self._unlabelled.set_function(function)
+
+
+class Gauge(_Metric):
+    type = "gauge"
+    child_class = _GaugeChild
+
+    def inc(self, amount=1):
+        self._unlabelled.inc(amount)
+
+    def dec(self, amount=1):
+        self._unlabelled.dec(amount)
+
+    def set(self, value):
+        self._unlabelled.set(value)
+
+    def set_function(self, function):
+        self._unlabelled.set_function(function)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(sorted(float(b) for b in buckets))
+        super().__init__(registry, name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.registry, self.bounds)
+
+    def observe(self, value):
+        self._unlabelled.observe(value)
+
+    def observe_since(self, started):
+        self._unlabelled.observe_since(started)
+
+    def drain(self):
+        """{label values: (per-bucket counts, sum)} of every child with new observations."""
+        drained = {}
+        for key, child in self.children():
+            counts, total = child.drain()
+            if any(counts):
+                drained[key] = (counts, total)
+        return drained
+
+    def merge(self, drained):
+        """Add the output of another process's drain()."""
+        for key, (counts, total) in drained.items():
+            self.labels(*key).merge(counts, total)
+
+    def samples(self):
+        for key, child in self.children():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.bounds + (math.inf,), counts):
+                cumulative += count
+                yield "_bucket", key, (("le", _format_value(bound)),), cumulative
+            yield "_sum", key, (), total
+            yield "_count", key, (), cumulative
+
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered together."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def drain(self):
+        """
+        Counter increments and histogram observations since the last drain, for merge().
+
+        Gauges and function-backed values are process-local and not included.
+        """
+        drained = {}
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            if isinstance(metric, (Counter, Histogram)):
+                values = metric.drain()
+                if values:
+                    drained[metric.name] = values
+        return drained
+
+    def merge(self, drained):
+        """Add another process's drain() to the metrics of the same names."""
+        for name, values in drained.items():
+            metric = self._metrics.get(name)
+            if metric is not None:
+                metric.merge(values)
+
+    def clock(self):
+        """perf_counter() for timing a stage, or 0.0 without reading the clock while disabled."""
+        return time.perf_counter() if self.enabled else 0.0
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for suffix, key, extra, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{_format_labels(metric.labelnames, key, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def start_http_server(registry, port, addr=""):
+    """
+    Serve registry.render() at /metrics from a daemon thread.
+
+    For processes without a Django HTTP server (e.g. a standalone capture).
+
+    Returns:
+        The ThreadingHTTPServer (call shutdown() to stop it)
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            # Scrapes every few seconds would flood the console
+            pass
+
+    server = ThreadingHTTPServer((addr, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="ids-metrics-http", daemon=True).start()
+    return server
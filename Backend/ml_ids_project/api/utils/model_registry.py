@@ -0,0 +1,179 @@
+"""
+Process-wide registry of loaded KNN detectors.
+
+Artifacts are loaded once per set of paths and shared by every caller in the
+process (REST requests, the capture service, pipeline workers). At most once
+every `check_interval` seconds a caller stats the artifact files; if their
+mtime or size changed, the files are hashed and, if the content really
+changed, the new model is loaded and swapped in atomically. A failed reload
+(e.g. a half-copied file) keeps the previous model serving.
+"""
+
+import datetime
+import hashlib
+import os
+import threading
+import time
+
+from .knn_classifier import KNNAnomalyDetector
+
+
+ARTIFACT_NAMES = ("model", "features", "scaler")
+
+
+def _fingerprint(paths):
+    """(mtime_ns, size) of every artifact; raises FileNotFoundError if one is missing."""
+    return tuple((st.st_mtime_ns, st.st_size) for st in map(os.stat, paths))
+
+
+def _digests(paths):
+    digests = []
+    for path in paths:
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        digests.append(sha.hexdigest())
+    return tuple(digests)
+
+
+class _Entry:
+    __slots__ = ("detector", "fingerprint", "digests", "loaded_at", "checked_at", "failed_fingerprint")
+
+    def __init__(self, detector, fingerprint, digests):
+        self.detector = detector
+        self.fingerprint = fingerprint
+        self.digests = digests
+        self.loaded_at = time.time()
+        self.checked_at = time.monotonic()
+        self.failed_fingerprint = None
+
+    @property
+    def version(self):
+        return hashlib.sha256("".join(self.digests).encode()).hexdigest()[:12]
+
+
+class ModelRegistry:
+    """Shared detectors keyed by artifact paths, reloaded when the artifacts change."""
+
+    def __init__(self, check_interval=2.0, loader=KNNAnomalyDetector):
+        """
+        Initialize the registry.
+
+        Args:
+            check_interval: Minimum seconds between artifact change checks
+            loader: Callable(model_path, features_path, scaler_path) returning a detector
+        """
+        self.check_interval = check_interval
+        self.loader = loader
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.reloads = 0
+
+    def get(self, model_path, features_path, scaler_path):
+        """
+        The current detector for these artifacts, loading or reloading it if needed.
+
+        Raises:
+            FileNotFoundError: If the artifacts do not exist and nothing was loaded before
+        """
+        return self._entry(model_path, features_path, scaler_path).detector
+
+    def handle(self, model_path, features_path, scaler_path):
+        """A DetectorHandle that always predicts with the current detector."""
+        return DetectorHandle(self, (model_path, features_path, scaler_path))
+
+    def version(self, model_path, features_path, scaler_path):
+        """
+        Description of the model serving these artifacts.
+
+        Returns:
+            Dictionary with version (short content hash), loaded_at, reloads,
+            per-artifact path/mtime/sha256, selected features and neighbor backend
+        """
+        key = self._key(model_path, features_path, scaler_path)
+        entry = self._entry(*key)
+        return {
+            "version": entry.version,
+            "loaded_at": datetime.datetime.fromtimestamp(entry.loaded_at, datetime.timezone.utc).isoformat(),
+            "reloads": self.reloads,
+            "artifacts": {
+                name: {
+                    "path": path,
+                    "mtime": datetime.datetime.fromtimestamp(mtime_ns / 1e9, datetime.timezone.utc).isoformat(),
+                    "sha256": digest,
+                }
+                for name, path, (mtime_ns, _), digest in zip(ARTIFACT_NAMES, key, entry.fingerprint, entry.digests)
+            },
+            "features": list(entry.detector.selected_features or []),
+            "neighbor_backend": entry.detector.neighbor_backend,
+        }
+
+    @staticmethod
+    def _key(*paths):
+        return tuple(os.path.abspath(p) for p in paths)
+
+    def _entry(self, *paths):
+        key = self._key(*paths)
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.check_interval:
+            return entry
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.checked_at < self.check_interval:
+                return entry
+            try:
+                fingerprint = _fingerprint(key)
+            except FileNotFoundError:
+                if entry is None:
+                    raise
+                # Artifacts being replaced; keep serving the loaded model
+                entry.checked_at = time.monotonic()
+                return entry
+            if entry is not None and fingerprint in (entry.fingerprint, entry.failed_fingerprint):
+                entry.checked_at = time.monotonic()
+                return entry
+            digests = _digests(key)
+            if entry is not None and digests == entry.digests:
+                # Touched but unchanged
+                entry.fingerprint = fingerprint
+                entry.checked_at = time.monotonic()
+                return entry
+            try:
+                detector = self.loader(*key)
+            except Exception as e:
+                if entry is None:
+                    raise
+                print(f"Model reload failed, still serving version {entry.version}: {e}")
+                entry.failed_fingerprint = fingerprint
+                entry.checked_at = time.monotonic()
+                return entry
+            if entry is not None:
+                self.reloads += 1
+            entry = self._entries[key] = _Entry(detector, fingerprint, digests)
+            return entry
+
+
+class DetectorHandle:
+    """Stand-in for a detector that resolves the registry's current model on every call."""
+
+    def __init__(self, registry, paths):
+        self.registry = registry
+        self.paths = paths
+
+    def current(self):
+        return self.registry.get(*self.paths)
+
+    def predict(self, features):
+        return self.current().predict(features)
+
+    def predict_batch(self, X):
+        return self.current().predict_batch(X)
+
+    @property
+    def version(self):
+        return self.registry.version(*self.paths)
+
+
+# Shared by everything in this process
+registry = ModelRegistry()
@@ -0,0 +1,158 @@
+"""
+Neighbor-search backends for the KNN anomaly detector.
+
+Exact search uses sklearn's brute-force, KD-tree or ball-tree indexes. The
+approximate "ivf" backend is a vector-quantized inverted-file index: training
+points are bucketed by their nearest k-means centroid and a query only scans the
+`n_probe` closest buckets, trading recall for latency.
+
+Every fitted model carries `train_labels_`, its training labels encoded as
+indices into `classes_`, which KNNAnomalyDetector uses to turn one neighbor
+search into both predictions and class probabilities.
+"""
+
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.neighbors import KNeighborsClassifier as KNN
+
+
+NEIGHBOR_BACKENDS = ('auto', 'brute', 'kd_tree', 'ball_tree', 'ivf')
+
+# Defaults for the 18-feature UNSW model. Tree pruning weakens as dimensionality
+# grows, so leaves are a little larger than sklearn's 30 to cut traversal overhead;
+# `manage.py benchmark_knn_backends` measures the trade-offs on real data.
+DEFAULT_LEAF_SIZE = 40
+DEFAULT_IVF_LISTS = 256
+DEFAULT_IVF_PROBE = 8
+
+
+def build_neighbors_model(backend='auto', n_neighbors=7, leaf_size=DEFAULT_LEAF_SIZE,
+                          n_lists=DEFAULT_IVF_LISTS, n_probe=DEFAULT_IVF_PROBE):
+    """
+    Create an unfitted KNN classifier for the given neighbor-search backend.
+
+    Args:
+        backend: One of NEIGHBOR_BACKENDS
+        n_neighbors: Number of neighbors for KNN
+        leaf_size: Leaf size for kd_tree/ball_tree
+        n_lists: Number of k-means buckets for ivf
+        n_probe: Buckets scanned per query for ivf (recall/latency knob)
+
+    Returns:
+        Estimator exposing fit, kneighbors, predict and predict_proba
+    """
+    if backend not in NEIGHBOR_BACKENDS:
+        raise ValueError(f"Unknown neighbor backend '{backend}'. Choose from {', '.join(NEIGHBOR_BACKENDS)}.")
+    if backend == 'ivf':
+        return IVFKNeighborsClassifier(n_neighbors=n_neighbors, n_lists=n_lists, n_probe=n_probe)
+    if backend == 'auto':
+        return LabeledKNeighborsClassifier(n_neighbors=n_neighbors, metric='euclidean', n_jobs=-1)
+    return LabeledKNeighborsClassifier(n_neighbors=n_neighbors, metric='euclidean', algorithm=backend,
+                                       leaf_size=leaf_size, n_jobs=-1)
+
+
+def backend_params(model):
+    """Describe a fitted neighbors model for the features JSON artifact."""
+    if isinstance(model, IVFKNeighborsClassifier):
+        return {'name': 'ivf', 'n_lists': model.n_lists, 'n_probe': model.n_probe}
+    algorithm = getattr(model, 'algorithm', 'auto')
+    params = {'name': algorithm}
+    if algorithm in ('kd_tree', 'ball_tree'):
+        params['leaf_size'] = model.leaf_size
+    return params
+
+
+class LabeledKNeighborsClassifier(KNN):
+    """sklearn's KNN classifier keeping its own copy of the encoded training labels."""
+
+    def fit(self, X, y):
+        super().fit(X, y)
+        self.train_labels_ = np.searchsorted(self.classes_, np.asarray(y))
+        return self
+
+
+class IVFKNeighborsClassifier:
+    """Approximate KNN classifier over an inverted-file (k-means bucketed) index."""
+
+    weights = 'uniform'
+
+    def __init__(self, n_neighbors=7, n_lists=DEFAULT_IVF_LISTS, n_probe=DEFAULT_IVF_PROBE, random_state=42):
+        self.n_neighbors = n_neighbors
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, X, y):
+        """
+        Build the inverted-file index.
+
+        Args:
+            X: Scaled training matrix
+            y: Training labels
+        """
+        X = np.ascontiguousarray(X, dtype=float)
+        self.classes_, self.train_labels_ = np.unique(np.asarray(y), return_inverse=True)
+
+        n_lists = max(1, min(self.n_lists, len(X)))
+        quantizer = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3)
+        assignments = quantizer.fit_predict(X)
+        self.centroids_ = quantizer.cluster_centers_
+
+        # Store points grouped by bucket so each bucket is one contiguous slice;
+        # _order maps slice positions back to training-set indices
+        order = np.argsort(assignments, kind='stable')
+        self._order = order
+        self._fit_X = X[order]
+        self._offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+        self._sq_norms = np.einsum('ij,ij->i', self._fit_X, self._fit_X)
+        return self
+
+    def kneighbors(self, X, n_neighbors=None, return_distance=True):
+        """
+        Find approximate nearest neighbors.
+
+        Args:
+            X: Scaled query matrix
+            n_neighbors: Neighbors per query (defaults to self.n_neighbors)
+            return_distance: Also return the Euclidean distances
+
+        Returns:
+            Index matrix into the training set (as passed to fit), optionally preceded by distances
+        """
+        k = n_neighbors or self.n_neighbors
+        X = np.asarray(X, dtype=float)
+        n_lists = len(self.centroids_)
+        n_probe = max(1, min(self.n_probe, n_lists))
+
+        centroid_dist = np.einsum('ij,ij->i', self.centroids_, self.centroids_) - 2.0 * (X @ self.centroids_.T)
+        probe_order = np.argsort(centroid_dist, axis=1)
+
+        indices = np.empty((len(X), k), dtype=np.intp)
+        distances = np.empty((len(X), k))
+        for row, query in enumerate(X):
+            lists = probe_order[row, :n_probe]
+            candidates = np.concatenate([np.arange(self._offsets[b], self._offsets[b + 1]) for b in lists])
+            # Keep widening the probe until there are enough candidates
+            extra = n_probe
+            while len(candidates) < k and extra < n_lists:
+                b = probe_order[row, extra]
+                candidates = np.concatenate((candidates, np.arange(self._offsets[b], self._offsets[b + 1])))
+                extra += 1
+
+            sq_dist = self._sq_norms[candidates] - 2.0 * (self._fit_X[candidates] @ query) + query @ query
+            top = np.argpartition(sq_dist, k - 1)[:k] if len(candidates) > k else np.arange(len(candidates))
+            top = top[np.argsort(sq_dist[top], kind='stable')]
+            indices[row] = self._order[candidates[top]]
+            distances[row] = np.sqrt(np.maximum(sq_dist[top], 0.0))
+
+        if return_distance:
+            return distances, indices
+        return indices
+
+    def predict_proba(self, X):
+        neigh_ind = self.kneighbors(X, return_distance=False)
+        neigh_labels = self.train_labels_[neigh_ind]
+        return np.stack([(neigh_labels == idx).mean(axis=1) for idx in range(len(self.classes_))], axis=1)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
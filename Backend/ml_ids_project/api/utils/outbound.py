@@ -0,0 +1,61 @@
+"""
+Bounded outbound buffer for one live-traffic WebSocket client.
+
+Records published by the capture service are buffered per client and sent as
+one batched frame every few milliseconds. The buffer keeps at most `max_size`
+records: when a slow client falls behind, the oldest records are discarded,
+so memory and the age of what the client sees stay bounded at any packet
+rate. Discarded records are counted and reported in the next frame.
+"""
+
+from collections import deque
+
+
+class OutboundBuffer:
+    """Drop-oldest record buffer drained into batched frames."""
+
+    def __init__(self, max_size=1000):
+        """
+        Initialize the buffer.
+
+        Args:
+            max_size: Maximum number of records held between two frames
+        """
+        self.max_size = max_size
+        self._records = deque(maxlen=max_size)
+        self._dropped = 0
+        self.total_dropped = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def push(self, record):
+        """Buffer a record, discarding the oldest one if the buffer is full."""
+        if len(self._records) == self.max_size:
+            self._dropped += 1
+            self.total_dropped += 1
+        self._records.append(record)
+
+    def drain(self):
+        """
+        Take everything buffered since the last frame.
+
+        Returns:
+            Tuple of (records, number of records dropped since the last frame)
+        """
+        records = list(self._records)
+        self._records.clear()
+        dropped, self._dropped = self._dropped, 0
+        return records, dropped
+
+    def frame(self):
+        """
+        Drain the buffer into a batch frame.
+
+        Returns:
+            {"type": "batch", "records": [...], "dropped": N}, or None if there is nothing to send
+        """
+        records, dropped = self.drain()
+        if not records and not dropped:
+            return None
+        return {"type": "batch", "records": records, "dropped": dropped}
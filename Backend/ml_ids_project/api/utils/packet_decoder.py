@@ -0,0 +1,150 @@
+"""
+Lightweight packet decoding for the feature extractor.
+
+The extractor needs a handful of header fields per packet: the IPv4
+addresses, total length and TTL, the transport protocol and ports, and for
+TCP the flags, window and sequence number. `decode_packet` reads them from
+an already dissected Scapy packet with one layer lookup each; `decode_frame`
+reads them straight from the captured frame bytes with precompiled `struct`
+formats, skipping Scapy dissection altogether.
+
+Both produce the same DecodedPacket. Frames whose meaning depends on
+Scapy's dissection rules beyond plain Ethernet/VLAN/IPv4/TCP/UDP (tunnels,
+truncated transport headers, other link types) are reported as UNDECODED so
+the caller can dissect them with Scapy instead, which keeps the extracted
+features identical between the two paths.
+"""
+
+import socket
+import struct
+from collections import namedtuple
+
+
+DecodedPacket = namedtuple(
+    "DecodedPacket",
+    ["src", "dst", "protocol", "length", "ttl", "sport", "dport", "flags", "window", "seq"],
+)
+
+# decode_frame could not decode the frame on its own; dissect it with Scapy
+UNDECODED = object()
+
+DECODERS = ("scapy", "fast")
+
+_ETHERTYPE = struct.Struct("!H")
+_IPV4 = struct.Struct("!BBHHHBB2x4s4s")
+_TCP = struct.Struct("!HHIxxxxBBH")
+_UDP_PORTS = struct.Struct("!HH")
+_TCP_HEADER_LENGTH = 20
+_UDP_HEADER_LENGTH = 8
+
+_ETH_IPV4 = 0x0800
+_ETH_VLAN = (0x8100, 0x88A8)
+_IP_TCP = 6
+_IP_UDP = 17
+# IP protocols Scapy dissects further into layers the extractor would see (IP-in-IP,
+# IPv6-in-IPv4, GRE, AH, L2TPv3): left to Scapy
+_IP_ENCAPSULATED = frozenset((4, 41, 47, 51, 115))
+
+# Link-layer class name -> offset of the first ethertype (None: the frame starts with IPv4)
+_LINK_ETHERTYPE_OFFSET = {
+    "Ether": 12,
+    "CookedLinux": 14,
+    "IP": None,
+}
+
+
+def decode_packet(pkt, ip_cls, tcp_cls, udp_cls):
+    """
+    Decode a dissected Scapy packet.
+
+    Args:
+        pkt: Scapy packet
+        ip_cls, tcp_cls, udp_cls: Scapy's IP, TCP and UDP layer classes
+
+    Returns:
+        DecodedPacket, or None if the packet has no IPv4 layer
+    """
+    ip_layer = pkt.getlayer(ip_cls)
+    if ip_layer is None:
+        return None
+    # Length fallback: prefer IP header length, else raw bytes length
+    try:
+        length = int(ip_layer.len)
+    except Exception:
+        length = int(len(bytes(pkt)))
+    ttl = int(getattr(ip_layer, "ttl", 0))
+
+    tcp = pkt.getlayer(tcp_cls)
+    if tcp is not None:
+        return DecodedPacket(ip_layer.src, ip_layer.dst, "TCP", length, ttl,
+                             int(tcp.sport), int(tcp.dport), int(tcp.flags),
+                             int(getattr(tcp, "window", 0)), int(getattr(tcp, "seq", 0)))
+    udp = pkt.getlayer(udp_cls)
+    if udp is not None:
+        return DecodedPacket(ip_layer.src, ip_layer.dst, "UDP", length, ttl,
+                             int(udp.sport), int(udp.dport), None, None, None)
+    return DecodedPacket(ip_layer.src, ip_layer.dst, "IP", length, ttl, None, None, None, None, None)
+
+
+def decode_frame(frame, link="Ether"):
+    """
+    Decode the headers of a raw captured frame without Scapy.
+
+    Args:
+        frame: Frame bytes (bytes, bytearray or memoryview)
+        link: Name of the link-layer class the frame was captured with
+            ("Ether", "CookedLinux" or "IP" for raw IP captures)
+
+    Returns:
+        DecodedPacket; None if the frame carries no IPv4 packet; UNDECODED if
+        only a full Scapy dissection can decode it
+    """
+    if link not in _LINK_ETHERTYPE_OFFSET:
+        return UNDECODED
+    try:
+        offset = _LINK_ETHERTYPE_OFFSET[link]
+        if offset is None:
+            ip_start = 0
+        else:
+            ethertype = _ETHERTYPE.unpack_from(frame, offset)[0]
+            while ethertype in _ETH_VLAN:
+                offset += 4
+                ethertype = _ETHERTYPE.unpack_from(frame, offset)[0]
+            if ethertype <= 1500:
+                # 802.3 length field: Scapy follows LLC/SNAP, which can still carry IPv4
+                return UNDECODED
+            if ethertype != _ETH_IPV4:
+                return None
+            ip_start = offset + 2
+        ver_ihl, _, total_length, _, flags_frag, ttl, proto, src, dst = _IPV4.unpack_from(frame, ip_start)
+    except struct.error:
+        return UNDECODED
+
+    header_length = (ver_ihl & 0x0F) * 4
+    if header_length < _IPV4.size:
+        return UNDECODED
+    src = socket.inet_ntoa(src)
+    dst = socket.inet_ntoa(dst)
+
+    # Only first fragments carry the transport header
+    if flags_frag & 0x1FFF or proto not in (_IP_TCP, _IP_UDP):
+        if proto in _IP_ENCAPSULATED and not flags_frag & 0x1FFF:
+            return UNDECODED
+        return DecodedPacket(src, dst, "IP", total_length, ttl, None, None, None, None, None)
+
+    # Like Scapy, the transport header is read from the bytes the IP total length covers
+    transport_start = ip_start + header_length
+    available = min(len(frame), ip_start + total_length) - transport_start
+    if total_length < header_length:
+        available = len(frame) - transport_start
+    if proto == _IP_TCP:
+        if available < _TCP_HEADER_LENGTH:
+            return UNDECODED
+        sport, dport, seq, offset_reserved, flags, window = _TCP.unpack_from(frame, transport_start)
+        # The NS flag is the low bit of the data offset byte
+        flags |= (offset_reserved & 0x01) << 8
+        return DecodedPacket(src, dst, "TCP", total_length, ttl, sport, dport, flags, window, seq)
+    if available < _UDP_HEADER_LENGTH:
+        return UNDECODED
+    sport, dport = _UDP_PORTS.unpack_from(frame, transport_start)
+    return DecodedPacket(src, dst, "UDP", total_length, ttl, sport, dport, None, None, None)
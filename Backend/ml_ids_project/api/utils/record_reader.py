@@ -0,0 +1,124 @@
+"""
+Readers for bulk feature-record uploads.
+
+A request body holds many raw feature records in one of three formats:
+
+- "json":   a JSON array of objects, or {"records": [...]}
+- "ndjson": one JSON object per line (blank lines are skipped)
+- "csv":    a header row of feature names, then one record per row
+
+NDJSON and CSV are read line by line from the stream, so scoring can start
+before the whole body has arrived. Every reader yields (index, record, error)
+in input order: a record that cannot be parsed is reported by its index with
+an error message instead of failing the whole upload.
+"""
+
+import csv
+import json
+
+
+FORMATS = ("json", "ndjson", "csv")
+
+CONTENT_TYPES = {
+    "application/json": "json",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonlines": "ndjson",
+    "application/x-jsonlines": "ndjson",
+    "text/csv": "csv",
+    "application/csv": "csv",
+}
+
+
+def detect_format(content_type):
+    """Record format for a Content-Type header value, or None if unsupported."""
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    return CONTENT_TYPES.get(media_type)
+
+
+def _lines(stream):
+    """Decoded text lines of a binary stream with readline()."""
+    first = True
+    for line in iter(stream.readline, b""):
+        text = line.decode("utf-8")
+        if first:
+            text = text.lstrip("\ufeff")
+            first = False
+        yield text
+
+
+def _read_json(stream):
+    try:
+        data = json.loads(stream.read().decode("utf-8-sig"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid JSON body: {e}")
+    if isinstance(data, dict):
+        data = data.get("records")
+    if not isinstance(data, list):
+        raise ValueError('JSON body must be an array of records or {"records": [...]}')
+    for index, record in enumerate(data):
+        if isinstance(record, dict):
+            yield index, record, None
+        else:
+            yield index, None, "record must be a JSON object"
+
+
+def _read_ndjson(stream):
+    index = 0
+    for line in _lines(stream):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield index, None, f"invalid JSON: {e}"
+        else:
+            if isinstance(record, dict):
+                yield index, record, None
+            else:
+                yield index, None, "record must be a JSON object"
+        index += 1
+
+
+def _read_csv(stream):
+    reader = csv.reader(_lines(stream))
+    header = next(reader, None)
+    if not header:
+        raise ValueError("CSV body must start with a header row")
+    header = [name.strip() for name in header]
+    index = 0
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != len(header):
+            yield index, None, f"expected {len(header)} columns, got {len(row)}"
+        else:
+            # Empty cells count as missing features
+            yield index, {name: (value if value != "" else None) for name, value in zip(header, row)}, None
+        index += 1
+
+
+_READERS = {"json": _read_json, "ndjson": _read_ndjson, "csv": _read_csv}
+
+
+def read_records(stream, fmt, limit=None):
+    """
+    Iterate over the records of an upload.
+
+    Args:
+        stream: Binary stream with read() and readline() (a request body)
+        fmt: One of FORMATS
+        limit: Maximum number of records; a further record raises ValueError
+
+    Yields:
+        (index, record dict or None, error message or None)
+
+    Raises:
+        ValueError: If the body as a whole is malformed, or has more than limit records
+    """
+    if fmt not in _READERS:
+        raise ValueError(f"Unsupported record format '{fmt}'")
+    for item in _READERS[fmt](stream):
+        if limit is not None and item[0] >= limit:
+            raise ValueError(f"Too many records (limit {limit})")
+        yield item
@@ -0,0 +1,190 @@
+"""
+Per-client subscriptions for the live traffic WebSocket.
+
+A client narrows its feed by sending
+
+    {"type": "subscribe",
+     "filters": {"protocol": ["TCP"], "ip": ["10.0.0.0/8"], "status": ["Anomalous"],
+                 "severity": ["High", "Critical"], "min_confidence": 0.8,
+                 "record_type": ["traffic"]},
+     "fields": ["source_ip", "destination_ip", "status"],
+     "sample": 0.1,
+     "encoding": "msgpack"}
+
+Every key is optional; an omitted filter matches everything ("encoding" is
+negotiated by the consumer, see frame_codec). Filters are compiled once into a
+list of predicates, so each record costs a few set and network lookups before
+the consumer buffers and serializes it.
+"""
+
+import ipaddress
+
+
+# Keys kept in every projected record so clients can order and de-duplicate rows
+ALWAYS_FIELDS = ("id", "timestamp", "_type")
+
+RECORD_TYPES = ("traffic", "incident")
+
+
+def _strings(value, name):
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"'{name}' must be a string or a list of strings")
+    return frozenset(v.lower() for v in value)
+
+
+def record_confidence(record):
+    """Confidence of a record in [0, 1]: the KNN probability, or an incident's percentage."""
+    if record.get("_type") == "incident":
+        return float(record.get("confidence") or 0) / 100.0
+    return float(record.get("pred_prob") or 0.0)
+
+
+class Subscription:
+    """Compiled filters, field projection and sampling rate for one client."""
+
+    def __init__(self, protocols=None, ips=None, statuses=None, severities=None,
+                 min_confidence=None, record_types=None, fields=None, sample=1.0):
+        """
+        Initialize the subscription.
+
+        Args:
+            protocols: Protocol names to keep (case-insensitive)
+            ips: IP addresses or CIDR networks; a record matches if either endpoint is in one
+            statuses: Statuses to keep (case-insensitive)
+            severities: Severities to keep (case-insensitive)
+            min_confidence: Minimum record confidence in [0, 1]
+            record_types: "traffic" and/or "incident"
+            fields: Record keys to send (plus ALWAYS_FIELDS); None sends every key
+            sample: Fraction in (0, 1] of matching traffic records to send; incidents are never sampled
+        """
+        if not 0.0 < sample <= 1.0:
+            raise ValueError("'sample' must be in (0, 1]")
+        if min_confidence is not None and not 0.0 <= min_confidence <= 1.0:
+            raise ValueError("'min_confidence' must be in [0, 1]")
+        if record_types is not None and not record_types <= frozenset(RECORD_TYPES):
+            raise ValueError(f"'record_type' must be one of {', '.join(RECORD_TYPES)}")
+        self.protocols = protocols
+        self.networks = [ipaddress.ip_network(ip, strict=False) for ip in ips] if ips else None
+        self.statuses = statuses
+        self.severities = severities
+        self.min_confidence = min_confidence
+        self.record_types = record_types
+        self.fields = tuple(dict.fromkeys(ALWAYS_FIELDS + tuple(fields))) if fields else None
+        self.sample = sample
+        self._credit = 0.0
+        self._predicates = self._compile()
+
+    @classmethod
+    def from_message(cls, message):
+        """
+        Build a subscription from a client "subscribe" message.
+
+        Raises:
+            ValueError: If the message is malformed
+        """
+        filters = message.get("filters") or {}
+        if not isinstance(filters, dict):
+            raise ValueError("'filters' must be an object")
+        unknown = set(filters) - {"protocol", "ip", "status", "severity", "min_confidence", "record_type"}
+        if unknown:
+            raise ValueError(f"Unknown filters: {', '.join(sorted(unknown))}")
+        ips = filters.get("ip")
+        if ips is not None:
+            ips = sorted(_strings(ips, "ip"))
+            for ip in ips:
+                try:
+                    ipaddress.ip_network(ip, strict=False)
+                except ValueError:
+                    raise ValueError(f"Invalid IP address or network: {ip}")
+        fields = message.get("fields")
+        if fields is not None:
+            if not isinstance(fields, list) or not all(isinstance(f, str) for f in fields):
+                raise ValueError("'fields' must be a list of strings")
+        try:
+            min_confidence = filters.get("min_confidence")
+            min_confidence = float(min_confidence) if min_confidence is not None else None
+            sample = float(message.get("sample", 1.0))
+        except (TypeError, ValueError):
+            raise ValueError("'min_confidence' and 'sample' must be numbers")
+
+        def optional(name):
+            return _strings(filters[name], name) if filters.get(name) is not None else None
+
+        return cls(
+            protocols=optional("protocol"),
+            ips=ips,
+            statuses=optional("status"),
+            severities=optional("severity"),
+            min_confidence=min_confidence,
+            record_types=optional("record_type"),
+            fields=fields,
+            sample=sample,
+        )
+
+    def describe(self):
+        """JSON-serializable summary, echoed back to the client on subscribe."""
+        return {
+            "filters": {
+                "protocol": sorted(self.protocols) if self.protocols else None,
+                "ip": [str(n) for n in self.networks] if self.networks else None,
+                "status": sorted(self.statuses) if self.statuses else None,
+                "severity": sorted(self.severities) if self.severities else None,
+                "min_confidence": self.min_confidence,
+                "record_type": sorted(self.record_types) if self.record_types else None,
+            },
+            "fields": list(self.fields) if self.fields else None,
+            "sample": self.sample,
+        }
+
+    def _compile(self):
+        predicates = []
+        if self.record_types is not None:
+            types = self.record_types
+            predicates.append(lambda r: ("incident" if r.get("_type") == "incident" else "traffic") in types)
+        if self.protocols is not None:
+            protocols = self.protocols
+            predicates.append(lambda r: str(r.get("protocol") or "").lower() in protocols)
+        if self.statuses is not None:
+            statuses = self.statuses
+            predicates.append(lambda r: str(r.get("status") or "").lower() in statuses)
+        if self.severities is not None:
+            severities = self.severities
+            predicates.append(lambda r: str(r.get("severity") or "").lower() in severities)
+        if self.min_confidence is not None:
+            threshold = self.min_confidence
+            predicates.append(lambda r: record_confidence(r) >= threshold)
+        if self.networks is not None:
+            predicates.append(self._matches_ip)
+        return predicates
+
+    def _matches_ip(self, record):
+        for key in ("source_ip", "destination_ip"):
+            try:
+                address = ipaddress.ip_address(record.get(key) or "")
+            except ValueError:
+                continue
+            for network in self.networks:
+                if address.version == network.version and address in network:
+                    return True
+        return False
+
+    def accept(self, record):
+        """Whether the record passes the filters and the sampler."""
+        for predicate in self._predicates:
+            if not predicate(record):
+                return False
+        if self.sample < 1.0 and record.get("_type") != "incident":
+            # Deterministic sampling: keep one record each time the credit reaches 1
+            self._credit += self.sample
+            if self._credit < 1.0:
+                return False
+            self._credit -= 1.0
+        return True
+
+    def project(self, record):
+        """The record restricted to the subscribed fields."""
+        if self.fields is None:
+            return record
+        return {key: record[key] for key in self.fields if key in record}
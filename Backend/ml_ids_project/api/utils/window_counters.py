@@ -0,0 +1,94 @@
+"""
+Sliding-window connection counters for the UNSW-NB15 ct_* features.
+
+Each ct_* feature counts how many of the recent connections share some key
+with the current one (same source and service, same destination, ...). Instead
+of rescanning the window per packet, one hash-keyed count table per feature is
+incremented when an event enters the window and decremented when it leaves, so
+every update costs constant time regardless of the window size.
+"""
+
+import threading
+from collections import deque
+
+
+# Counter name -> fields of the event that form its key
+CT_COUNTER_KEYS = {
+    "ct_srv_src": ("src", "service"),
+    "ct_state_ttl": ("state", "ttl"),
+    "ct_dst_ltm": ("dst",),
+    "ct_src_dport_ltm": ("src", "dport"),
+    "ct_dst_sport_ltm": ("dst", "sport"),
+    "ct_dst_src_ltm": ("dst", "src"),
+    "ct_src_ltm": ("src",),
+    # Approximate ct_srv_dst as same source to same destination and same service
+    "ct_srv_dst": ("src", "dst", "service"),
+}
+
+_EVENT_FIELDS = ("src", "dst", "sport", "dport", "service", "state", "ttl")
+
+
+class ConnectionWindow:
+    """Window over the last N events (and/or T seconds) with O(1) ct_* counters."""
+
+    def __init__(self, max_events=100, max_seconds=None):
+        """
+        Initialize the window.
+
+        Args:
+            max_events: Maximum number of events kept (UNSW uses the last 100 connections)
+            max_seconds: Optional age limit; events older than this are evicted
+        """
+        self.max_events = max_events
+        self.max_seconds = max_seconds
+        self._events = deque()
+        self._key_fields = [
+            (name, tuple(_EVENT_FIELDS.index(field) for field in fields))
+            for name, fields in CT_COUNTER_KEYS.items()
+        ]
+        self._counts = [dict() for _ in self._key_fields]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, src, dst, sport, dport, service, state, ttl, timestamp=None):
+        """
+        Append an event and return the ct_* counters including it.
+
+        Returns:
+            Dictionary of counter name -> number of events in the window sharing its key
+        """
+        event = (src, dst, sport, dport, service, state, int(ttl or 0))
+        keys = tuple(tuple(event[i] for i in idx) for _, idx in self._key_fields)
+        with self._lock:
+            if self.max_seconds is not None and timestamp is not None:
+                horizon = timestamp - self.max_seconds
+                while self._events and self._events[0][0] < horizon:
+                    self._evict()
+            if self.max_events is not None:
+                while len(self._events) >= self.max_events:
+                    self._evict()
+
+            self._events.append((timestamp, keys))
+            result = {}
+            for (name, _), counts, key in zip(self._key_fields, self._counts, keys):
+                value = counts.get(key, 0) + 1
+                counts[key] = value
+                result[name] = value
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._events.clear()
+            for counts in self._counts:
+                counts.clear()
+
+    def _evict(self):
+        _, keys = self._events.popleft()
+        for counts, key in zip(self._counts, keys):
+            value = counts[key] - 1
+            if value:
+                counts[key] = value
+            else:
+                del counts[key]
@@ -1,62 +1,106 @@
 # api/views.py
+import itertools
+import json
 import os
+from django.conf import settings
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.renderers import BaseRenderer
 from rest_framework.response import Response
-from django.db.models import Q
-from django.conf import settings
+from rest_framework.settings import api_settings
 from .models import NetworkTraffic, ThreatIncident, ResponseRule, LogEntry
+from .pagination import TimestampCursorPagination
 from .serializers import (
     NetworkTrafficSerializer,
     ThreatIncidentSerializer,
     ResponseRuleSerializer,
     LogEntrySerializer,
 )
-from .utils.knn_classifier import KNNAnomalyDetector
+from .rollups import clear_traffic
+from .search import search_traffic
+from .stats import dashboard_stats
+from .detector import get_detector, model_path, model_version, score_records
+from .instrumentation import registry as metrics_registry
+from .utils.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE
+from .utils.record_reader import FORMATS, detect_format, read_records
+
+def filter_exact(queryset, params, fields):
+    """Apply ?field=value equality filters for the given (indexed) fields."""
+    for field in fields:
+        value = params.get(field)
+        if value:
+            queryset = queryset.filter(**{field: value})
+    return queryset
+
+class NDJSONRenderer(BaseRenderer):
+    """Newline-delimited JSON; lets clients ask for streamed results with Accept: application/x-ndjson."""
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data).encode() + b'\n'
+
+def stream_results(results, ndjson):
+    """Serialize scored records as they are produced: NDJSON lines, or one JSON array."""
+    def encoded():
+        try:
+            for result in results:
+                yield json.dumps(result)
+        except ValueError as e:
+            # The body turned out malformed or too large after streaming started
+            yield json.dumps({'error': str(e)})
+
+    if ndjson:
+        for line in encoded():
+            yield line + '\n'
+        return
+    yield '['
+    for i, item in enumerate(encoded()):
+        yield item if i == 0 else ',' + item
+    yield ']'
 
 class NetworkTrafficViewSet(viewsets.ModelViewSet):
     queryset = NetworkTraffic.objects.all()
     serializer_class = NetworkTrafficSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            qs = filter_exact(qs, self.request.query_params, ("status", "source_ip", "destination_ip"))
+        return qs
 
     @action(detail=False, methods=["get"], url_path="search")
     def search(self, request):
-        q = request.query_params.get("q", "").strip()
-        qs = self.get_queryset()
-        if q:
-            qs = qs.filter(
-                Q(source_ip__icontains=q)
-                | Q(destination_ip__icontains=q)
-                | Q(protocol__icontains=q)
-                | Q(status__icontains=q)
-                | Q(severity__icontains=q)
-            )
+        try:
+            qs = search_traffic(request.query_params, self.get_queryset())
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         qs = qs.order_by("-timestamp")[:500]
         serializer = self.get_serializer(qs, many=True)
         return Response(serializer.data)
 
     @action(detail=False, methods=["delete"], url_path="clear", authentication_classes=[], permission_classes=[])
     def clear(self, request):
-        deleted_count, _ = NetworkTraffic.objects.all().delete()
+        deleted_count = clear_traffic()
         return Response({"deleted": deleted_count})
     
     @action(detail=False, methods=["post"], url_path="detect-anomaly")
     def detect_anomaly(self, request):
         """Detect if a packet/traffic is anomalous using KNN model."""
         try:
-            # Initialize KNN detector with saved model
-            model_dir = os.path.join(settings.BASE_DIR, '..', '..', 'model', 'unsw_tabular')
-            model_path = os.path.join(model_dir, 'model_knn.pkl')
-            features_path = os.path.join(model_dir, 'features_knn.json')
-            scaler_path = os.path.join(model_dir, 'scaler_knn.pkl')
-            
-            # Check if model exists
+            # Shared detector, loaded once per process and reloaded when the artifacts change
             if not os.path.exists(model_path):
                 return Response(
                     {'error': 'Model not found. Please train the model first.'},
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            detector = KNNAnomalyDetector(model_path, features_path, scaler_path)
+            detector = get_detector()
             
             # Get features from request
             features = request.data.get('features', {})
@@ -67,7 +111,8 @@ class NetworkTrafficViewSet(viewsets.ModelViewSet):
             return Response({
                 'status': 'success',
                 'prediction': result,
-                'severity': 'Critical' if result['label'] == 'Anomalous' else 'Low'
+                'severity': 'Critical' if result['label'] == 'Anomalous' else 'Low',
+                'model_version': model_version()['version'],
             })
         
         except FileNotFoundError as e:
@@ -81,9 +126,65 @@ class NetworkTrafficViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @action(detail=False, methods=["post"], url_path="detect-anomaly-batch",
+            renderer_classes=[*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer])
+    def detect_anomaly_batch(self, request):
+        """
+        Score many feature records in one request.
+
+        The body is a JSON array (or {"records": [...]}), NDJSON or CSV, chosen by
+        Content-Type. Records are scored in chunks of IDS_BATCH_CHUNK_SIZE and the
+        results stream back in input order, as a JSON array or as NDJSON when the
+        client sends Accept: application/x-ndjson.
+        """
+        fmt = detect_format(request.content_type)
+        if fmt is None:
+            return Response(
+                {'error': f"Unsupported Content-Type '{request.content_type}'; send one of {', '.join(FORMATS)}"},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+            )
+        try:
+            detector = get_detector()
+            version = model_version()['version']
+        except FileNotFoundError:
+            return Response(
+                {'error': 'Model not found. Please train the model first.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if request.stream is None:
+            return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+        items = read_records(
+            request.stream, fmt,
+            limit=getattr(settings, "IDS_BATCH_MAX_RECORDS", 100000),
+        )
+        # Reject a malformed body (bad JSON, missing CSV header) before streaming starts
+        try:
+            first = next(items, None)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if first is not None:
+            items = itertools.chain([first], items)
+
+        results = score_records(detector, items, chunk_size=getattr(settings, "IDS_BATCH_CHUNK_SIZE", 1000))
+        ndjson = request.accepted_renderer.format == 'ndjson'
+        response = StreamingHttpResponse(
+            stream_results(results, ndjson),
+            content_type='application/x-ndjson' if ndjson else 'application/json',
+        )
+        response['X-Model-Version'] = version
+        return response
+
 class ThreatIncidentViewSet(viewsets.ModelViewSet):
     queryset = ThreatIncident.objects.all()
     serializer_class = ThreatIncidentSerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            qs = filter_exact(qs, self.request.query_params, ("status", "source_ip", "destination_ip"))
+        return qs
 
 class ResponseRuleViewSet(viewsets.ModelViewSet):
     queryset = ResponseRule.objects.all()
@@ -91,4 +192,39 @@ class ResponseRuleViewSet(viewsets.ModelViewSet):
 
 class LogEntryViewSet(viewsets.ModelViewSet):
     queryset = LogEntry.objects.all()
-    serializer_class = LogEntrySerializer
\ No newline at end of file
+    serializer_class = LogEntrySerializer
+    pagination_class = TimestampCursorPagination
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        if self.action == "list":
+            qs = filter_exact(qs, self.request.query_params, ("severity",))
+        return qs
+
+class DetectorViewSet(viewsets.ViewSet):
+    """Which model is serving (GET /api/model/)."""
+
+    def list(self, request):
+        try:
+            return Response(model_version())
+        except FileNotFoundError:
+            return Response(
+                {'error': 'Model not found. Please train the model first.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+class StatsViewSet(viewsets.ViewSet):
+    """Dashboard aggregates computed in the database (GET /api/stats/)."""
+
+    def list(self, request):
+        try:
+            hours = min(max(int(request.query_params.get("hours", 24)), 1), 168)
+        except ValueError:
+            return Response({'error': "'hours' must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(dashboard_stats(hours=hours))
+
+def metrics(request):
+    """Pipeline metrics of this process in the Prometheus text format (GET /metrics)."""
+    if not metrics_registry.enabled:
+        raise Http404("Metrics are disabled (IDS_METRICS_ENABLED)")
+    return HttpResponse(metrics_registry.render(), content_type=METRICS_CONTENT_TYPE)
@@ -137,6 +137,70 @@ CHANNEL_LAYERS = {
     }
 }
 
+# Live detection pipeline
+# KNN inference runs on micro-batches of packets: a batch is classified as soon as it
+# holds IDS_INFERENCE_BATCH_SIZE items or its oldest item has waited IDS_INFERENCE_MAX_WAIT_MS.
+IDS_INFERENCE_BATCH_SIZE = 64
+IDS_INFERENCE_MAX_WAIT_MS = 20
+# Window for the ct_* connection counters: the last N events (UNSW uses 100 connections),
+# optionally also limited to events from the last IDS_CT_WINDOW_SECONDS seconds.
+IDS_CT_WINDOW_EVENTS = 100
+IDS_CT_WINDOW_SECONDS = None
+# Flow table: flows idle for IDS_FLOW_IDLE_TIMEOUT seconds are expired, flows older than
+# IDS_FLOW_ACTIVE_TIMEOUT seconds are closed and restarted, and at most
+# IDS_FLOW_TABLE_MAX_FLOWS flows are live ("evict" the least recently seen or "drop" new ones).
+IDS_FLOW_IDLE_TIMEOUT = 60
+IDS_FLOW_ACTIVE_TIMEOUT = 1800
+IDS_FLOW_TABLE_MAX_FLOWS = 100000
+IDS_FLOW_TABLE_OVERFLOW = "evict"
+# "packet" classifies every packet; "flow" classifies each flow when it ends (FIN/RST or
+# timeout) and optionally at checkpoints every N packets / T seconds (0 disables).
+IDS_CLASSIFY_MODE = "packet"
+IDS_FLOW_CHECKPOINT_PACKETS = 0
+IDS_FLOW_CHECKPOINT_SECONDS = 0
+# How captured frames are decoded: "scapy" dissects every packet; "fast" reads raw frames and
+# unpacks the Ethernet/IPv4/TCP/UDP headers with struct (identical features, falling back to
+# Scapy for tunnels and truncated headers).
+IDS_PACKET_DECODER = "scapy"
+# Worker processes for feature extraction and classification, sharded by flow hash.
+# 0 keeps everything in the capture thread of the ASGI process.
+IDS_PIPELINE_WORKERS = 0
+# One capture service per process publishes to all WebSocket clients. With autostart it is
+# started by the first client; set False when `manage.py run_capture` runs separately
+# (that needs a shared channel layer such as channels_redis).
+IDS_CAPTURE_AUTOSTART = True
+# Records scheduled on the event loop for publishing and persisting; beyond
+# IDS_PUBLISH_MAX_PENDING waiting records new ones are dropped (and counted).
+IDS_PUBLISH_MAX_PENDING = 10000
+# Traffic rows are written with one bulk INSERT per batch of IDS_DB_BATCH_SIZE rows, or
+# after IDS_DB_FLUSH_INTERVAL seconds; beyond IDS_DB_MAX_PENDING buffered rows new ones are dropped.
+IDS_DB_BATCH_SIZE = 500
+IDS_DB_FLUSH_INTERVAL = 1.0
+IDS_DB_MAX_PENDING = 50000
+# WebSocket clients receive batched frames every IDS_WS_FLUSH_MS milliseconds; each client
+# buffers at most IDS_WS_QUEUE_SIZE records and drops the oldest when it falls behind.
+IDS_WS_FLUSH_MS = 250
+IDS_WS_QUEUE_SIZE = 1000
+# The KNN artifacts are loaded once per process; every IDS_MODEL_CHECK_INTERVAL seconds their
+# mtime/size is checked and a changed model is hashed and reloaded in place.
+IDS_MODEL_CHECK_INTERVAL = 2.0
+# POST /api/traffic/detect-anomaly-batch/ scores uploads in chunks of IDS_BATCH_CHUNK_SIZE
+# records and accepts at most IDS_BATCH_MAX_RECORDS records per request.
+IDS_BATCH_CHUNK_SIZE = 1000
+IDS_BATCH_MAX_RECORDS = 100000
+# Response rules are compiled once and recompiled when a rule is saved or deleted, and at least
+# every IDS_RULE_CACHE_SECONDS (edits made by another process). Rule matches are buffered and
+# written by the DB writer thread IDS_RULE_FLUSH_INTERVAL seconds after the first one, or as soon
+# as IDS_RULE_FLUSH_BATCH matches are pending. A failed write is retried IDS_RULE_FLUSH_INTERVAL
+# later; failed batches are dropped (and counted) once IDS_RULE_MAX_PENDING matches are buffered.
+IDS_RULE_CACHE_SECONDS = 30.0
+IDS_RULE_FLUSH_INTERVAL = 1.0
+IDS_RULE_FLUSH_BATCH = 200
+IDS_RULE_MAX_PENDING = 10000
+# Pipeline counters, queue depths and per-stage latency histograms, served in the Prometheus
+# text format at /metrics (per process; `run_capture --metrics-port` serves a standalone capture).
+IDS_METRICS_ENABLED = True
+
 STORAGES = {
     "staticfiles": {
         "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 """
 Test script for KNN anomaly detection API endpoint
+Scores all samples with one request to the batch endpoint
 Generates test data from real UNSW NB15 dataset samples
 Usage: python test_knn_api.py [--url http://localhost:8000] [--samples N]
 """
@@ -107,9 +108,28 @@ def get_synthetic_samples():
     return samples
 
 
+def request_predictions(endpoint, test_samples):
+    """Score all samples with one request to the batch endpoint."""
+    response = requests.post(
+        endpoint,
+        json=[sample['features'] for sample in test_samples],
+        headers={'Accept': 'application/x-ndjson'},
+        timeout=60,
+        stream=True
+    )
+    if response.status_code != 200:
+        return response, {}
+    predictions = {}
+    for line in response.iter_lines():
+        if line:
+            result = json.loads(line)
+            predictions[result.get('index')] = result
+    return response, predictions
+
+
 def test_api(base_url, test_samples):
     """Test the anomaly detection API."""
-    endpoint = f"{base_url}/api/traffic/detect-anomaly/"
+    endpoint = f"{base_url}/api/traffic/detect-anomaly-batch/"
     
     print("="*70)
     print("KNN ANOMALY DETECTION API TEST")
@@ -118,73 +138,74 @@ def test_api(base_url, test_samples):
     
     results = []
     
-    for sample in test_samples:
+    try:
+        # Replace NaN (missing CSV cells) with None so the body is valid JSON
+        for sample in test_samples:
+            sample['features'] = {
+                k: (None if isinstance(v, float) and np.isnan(v) else v)
+                for k, v in sample['features'].items()
+            }
+        response, predictions = request_predictions(endpoint, test_samples)
+    except requests.exceptions.ConnectionError:
+        print(f"Status: [FAIL] Connection Error")
+        print(f"Cannot connect to {base_url}")
+        response, predictions = None, {}
+    
+    for index, sample in enumerate(test_samples):
         print(f"\nTesting: {sample['name']}")
         print(f"Expected: {sample.get('expected', 'Unknown')}")
         print("-" * 70)
         
-        try:
-            # Make request
-            response = requests.post(
-                endpoint,
-                json={'features': sample['features']},
-                timeout=10
-            )
-            
-            # Check status
-            if response.status_code == 200:
-                data = response.json()
-                prediction = data.get('prediction', {})
-                
-                print(f"Status: [OK] Success")
-                print(f"Label: {prediction.get('label', 'Unknown')}")
-                print(f"Confidence: {prediction.get('confidence', 0):.4f}")
-                print(f"Probability (Normal): {prediction.get('probabilities', {}).get('normal', 0):.4f}")
-                print(f"Probability (Anomalous): {prediction.get('probabilities', {}).get('anomalous', 0):.4f}")
-                print(f"Severity: {data.get('severity', 'Unknown')}")
-                
-                results.append({
-                    'name': sample['name'],
-                    'status': 'success',
-                    'expected': sample.get('expected'),
-                    'prediction': prediction.get('label'),
-                    'confidence': prediction.get('confidence')
-                })
-            
-            elif response.status_code == 404:
-                print(f"Status: [FAIL] Model Not Found")
-                print(f"Message: {response.json().get('error', 'Unknown error')}")
-                results.append({
-                    'name': sample['name'],
-                    'status': 'error',
-                    'error': 'Model not found'
-                })
-            
-            else:
-                print(f"Status: [FAIL] Error ({response.status_code})")
-                print(f"Response: {response.text}")
-                results.append({
-                    'name': sample['name'],
-                    'status': 'error',
-                    'error': f'HTTP {response.status_code}'
-                })
-        
-        except requests.exceptions.ConnectionError:
-            print(f"Status: [FAIL] Connection Error")
-            print(f"Cannot connect to {base_url}")
+        prediction = predictions.get(index)
+        if response is None:
             results.append({
                 'name': sample['name'],
                 'status': 'error',
                 'error': 'Connection error'
             })
         
-        except Exception as e:
+        elif response.status_code == 404:
+            print(f"Status: [FAIL] Model Not Found")
+            print(f"Message: {response.json().get('error', 'Unknown error')}")
+            results.append({
+                'name': sample['name'],
+                'status': 'error',
+                'error': 'Model not found'
+            })
+        
+        elif response.status_code != 200:
+            print(f"Status: [FAIL] Error ({response.status_code})")
+            print(f"Response: {response.text}")
+            results.append({
+                'name': sample['name'],
+                'status': 'error',
+                'error': f'HTTP {response.status_code}'
+            })
+        
+        elif prediction is None or 'error' in prediction:
+            error = prediction.get('error') if prediction else 'No result returned'
             print(f"Status: [FAIL] Exception")
-            print(f"Error: {str(e)}")
+            print(f"Error: {error}")
             results.append({
                 'name': sample['name'],
                 'status': 'error',
-                'error': str(e)
+                'error': error
+            })
+        
+        else:
+            print(f"Status: [OK] Success")
+            print(f"Label: {prediction.get('label', 'Unknown')}")
+            print(f"Confidence: {prediction.get('confidence', 0):.4f}")
+            print(f"Probability (Normal): {prediction.get('probabilities', {}).get('normal', 0):.4f}")
+            print(f"Probability (Anomalous): {prediction.get('probabilities', {}).get('anomalous', 0):.4f}")
+            print(f"Severity: {prediction.get('severity', 'Unknown')}")
+            
+            results.append({
+                'name': sample['name'],
+                'status': 'success',
+                'expected': sample.get('expected'),
+                'prediction': prediction.get('label'),
+                'confidence': prediction.get('confidence')
             })
     
     # Summary
@@ -1,59 +1,66 @@
-"""Quick local harness to exercise the AnomalyDetector and print audit info.
+"""Quick local harness to exercise the KNN anomaly detector.
 
 Run this from the Backend folder (where this file lives):
 
     python quick_model_check.py
 
-It will instantiate the detector (which enforces a loaded ML model) and run a few
-synthetic packet feature inferences. Results are printed and a CSV audit line is
-written to `ml_ids_project/logs/model_audit.csv` for each inference.
+It loads the trained KNN artifacts from `model/unsw_tabular` (train them with
+`python manage.py train_knn_model` first) and runs a few synthetic UNSW-style
+feature records through predict() and predict_batch(), printing the results.
 """
 import sys
 import time
 from pathlib import Path
 
 HERE = Path(__file__).resolve().parent
+MODEL_DIR = HERE.parent / "model" / "unsw_tabular"
 # Ensure ml_ids_project is on sys.path
 sys.path.insert(0, str(HERE / "ml_ids_project"))
 
 try:
-    from api.utils.ml_classifier import AnomalyDetector
+    from api.utils.knn_classifier import KNNAnomalyDetector
 except Exception as e:
-    print("Failed to import AnomalyDetector:", e)
+    print("Failed to import KNNAnomalyDetector:", e)
     raise
 
 
 def main():
-    det = AnomalyDetector()
+    paths = [MODEL_DIR / "model_knn.pkl", MODEL_DIR / "features_knn.json", MODEL_DIR / "scaler_knn.pkl"]
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        print("Model artifacts not found:", ", ".join(missing))
+        print("Train the model with: python ml_ids_project/manage.py train_knn_model")
+        return 1
+    det = KNNAnomalyDetector(*[str(p) for p in paths])
 
-    # Create a few synthetic packets with varying sizes/protocols/timestamps
-    ts = time.time()
+    # A few synthetic flows: short web request, bulk transfer, DNS lookup, SYN burst
     samples = [
-        {"src_ip": "10.0.0.1", "dst_ip": "10.0.0.2", "protocol": "TCP", "length": 60, "timestamp": ts},
-        {"src_ip": "10.0.0.1", "dst_ip": "10.0.0.2", "protocol": "TCP", "length": 1500, "timestamp": ts + 0.1},
-        {"src_ip": "192.168.1.5", "dst_ip": "8.8.8.8", "protocol": "UDP", "length": 700, "timestamp": ts + 0.2},
-        {"src_ip": "10.0.0.3", "dst_ip": "10.0.0.4", "protocol": "TCP", "length": 1600, "timestamp": ts + 0.3},
+        {"proto": "tcp", "dur": 0.12, "spkts": 6, "dpkts": 4, "sbytes": 520, "dbytes": 1800, "rate": 75.0,
+         "sttl": 64, "dttl": 64, "smean": 87, "dmean": 450, "ct_state_ttl": 0},
+        {"proto": "tcp", "dur": 4.5, "spkts": 400, "dpkts": 900, "sbytes": 24000, "dbytes": 1300000, "rate": 290.0,
+         "sttl": 64, "dttl": 64, "smean": 60, "dmean": 1444, "ct_state_ttl": 0},
+        {"proto": "udp", "dur": 0.002, "spkts": 1, "dpkts": 1, "sbytes": 70, "dbytes": 180, "rate": 500.0,
+         "sttl": 64, "dttl": 64, "smean": 70, "dmean": 180, "ct_state_ttl": 0},
+        {"proto": "tcp", "dur": 0.0, "spkts": 1, "dpkts": 0, "sbytes": 60, "dbytes": 0, "rate": 100000.0,
+         "sttl": 254, "dttl": 0, "smean": 60, "dmean": 0, "ct_state_ttl": 2},
     ]
 
-    print("Running quick model checks (audit CSV will be appended to ml_ids_project/logs/model_audit.csv)")
+    print("Running quick model checks")
     for i, f in enumerate(samples, 1):
         try:
-            res = det.classify_packet(f)
-            # Support both old (status,severity) and new return (status,severity,probs,pred_idx,pred_prob)
-            if isinstance(res, tuple) and len(res) >= 5:
-                status, sev, probs, pred_idx, pred_prob = res
-            elif isinstance(res, tuple) and len(res) >= 2:
-                status, sev = res[0], res[1]
-                probs, pred_idx, pred_prob = [], -1, 0.0
-            else:
-                raise RuntimeError("Unexpected classifier return value")
-
-            print(f"{i}: status={status}, severity={sev}, pred_idx={pred_idx}, pred_prob={pred_prob:.3f}, src={f['src_ip']}->{f['dst_ip']} proto={f['protocol']} len={f['length']}")
-            if probs:
-                print("    probs=", probs)
+            start = time.perf_counter()
+            res = det.predict(f)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            print(f"{i}: label={res['label']}, prediction={res['prediction']}, confidence={res['confidence']:.3f}, "
+                  f"proto={f['proto']} sbytes={f['sbytes']} ({elapsed_ms:.2f} ms)")
+            print("    probabilities=", res["probabilities"])
         except Exception as e:
             print(f"Inference failed for sample {i}: {e}")
 
+    batch = det.predict_batch(samples)
+    print("predict_batch labels:", batch["labels"])
+    return 0
+
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
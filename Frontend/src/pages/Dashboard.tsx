@@ -16,8 +16,9 @@ import {
 } from 'recharts';
 import { MetricCard } from '../components/UI/MetricCard';
 import { Package, Shield, Ban, AlertTriangle } from 'lucide-react';
-import { ThreatIncident, NetworkTraffic } from '../types';
+import { ThreatIncident } from '../types';
 import { useToast } from '../hooks/useToast';
+import { parseLiveFrame, subscribe } from '../utils/liveFeed';
 
 type ProtocolDataItem = {
   name: string;
@@ -34,9 +35,22 @@ const protocolColors: { [key: string]: string } = {
   Other: '#A9A9A9',
 };
 
+// Response of GET /api/stats/
+type DashboardStats = {
+  total_packets: number;
+  incidents_by_status: Record<string, number>;
+  threat_types: Record<string, number>;
+  protocols: Record<string, number>;
+  hourly: { hour: string; packets: number; threats: number }[];
+};
+
+const hourLabel = (timestamp: string) => {
+  const d = new Date(timestamp);
+  return `${d.getHours().toString().padStart(2, '0')}:00`;
+};
+
 export const Dashboard: React.FC = () => {
   const { showToast } = useToast();
-  const [incidents, setIncidents] = useState<ThreatIncident[]>([]);
   const [metrics, setMetrics] = useState({
     totalPackets: 0,
     activeThreats: 0,
@@ -49,77 +63,38 @@ export const Dashboard: React.FC = () => {
 
   const fetchData = useCallback(async () => {
     try {
-      const incidentsResponse = await axios.get<ThreatIncident[]>('http://127.0.0.1:8000/api/incidents/');
-      const trafficResponse = await axios.get<NetworkTraffic[]>('http://127.0.0.1:8000/api/traffic/?limit=1000');
-
-      const incidentsFetched = incidentsResponse.data;
-      const traffic = trafficResponse.data;
-
-      setIncidents(incidentsFetched);
-
-      // 1. Calculate Metrics
-      const activeThreats = incidentsFetched.filter(i => i.status === 'Active').length;
-      const blockedIps = incidentsFetched.filter(i => i.status === 'Blocked').length;
-      const falsePositives = incidentsFetched.filter(i => i.status === 'False Positive').length;
+      // Aggregates are computed server-side, so the cost does not grow with the tables
+      const { data: stats } = await axios.get<DashboardStats>('http://127.0.0.1:8000/api/stats/');
+      const byStatus = stats.incidents_by_status;
 
       setMetrics({
-        totalPackets: traffic.length,
-        activeThreats,
-        blockedIps,
-        falsePositives,
+        totalPackets: stats.total_packets,
+        activeThreats: byStatus['Active'] || 0,
+        blockedIps: byStatus['Blocked'] || 0,
+        falsePositives: byStatus['False Positive'] || 0,
       });
 
-      // 2. Process data for charts
       // Threat Categories Chart
-      const threatCounts = incidentsFetched.reduce((acc: Record<string, number>, curr) => {
-        acc[curr.threat_type] = (acc[curr.threat_type] || 0) + 1;
-        return acc;
-      }, {});
-      setThreatData(Object.keys(threatCounts).map(key => ({ name: key, count: threatCounts[key] })));
-      
+      setThreatData(Object.keys(stats.threat_types).map(key => ({ name: key, count: stats.threat_types[key] })));
+
       // Protocol Distribution Chart
-      const protocolCounts = traffic.reduce((acc: { [key: string]: number }, curr) => {
-        const protocol = protocolColors[curr.protocol] ? curr.protocol : 'Other';
-        acc[protocol] = (acc[protocol] || 0) + 1;
-        return acc;
-      }, {});
+      const protocolCounts: { [key: string]: number } = {};
+      Object.entries(stats.protocols).forEach(([name, count]) => {
+        const protocol = protocolColors[name] ? name : 'Other';
+        protocolCounts[protocol] = (protocolCounts[protocol] || 0) + count;
+      });
       setProtocolData(Object.keys(protocolCounts).map(key => ({
         name: key,
         value: protocolCounts[key],
         color: protocolColors[key],
       })));
 
-      // Live Traffic Chart (last 24 hours)
-      const now = new Date();
-      const trafficByHour: { [hour: string]: { hour: string; packets: number; threats: number } } = {};
-
-      for (let i = 23; i >= 0; i--) {
-        const date = new Date(now.getTime() - i * 60 * 60 * 1000);
-        const hourKey = `${date.getHours().toString().padStart(2, '0')}:00`;
-        trafficByHour[hourKey] = { hour: hourKey, packets: 0, threats: 0 };
-      }
-
-      traffic.forEach(packet => {
-        const packetDate = new Date(packet.timestamp);
-        if (now.getTime() - packetDate.getTime() < 24 * 60 * 60 * 1000) {
-          const hourKey = `${packetDate.getHours().toString().padStart(2, '0')}:00`;
-          if (trafficByHour[hourKey]) {
-            trafficByHour[hourKey].packets += 1;
-          }
-        }
-      });
-
-      incidentsFetched.forEach(incident => {
-        const incidentDate = new Date(incident.timestamp);
-        if (now.getTime() - incidentDate.getTime() < 24 * 60 * 60 * 1000) {
-          const hourKey = `${incidentDate.getHours().toString().padStart(2, '0')}:00`;
-          if (trafficByHour[hourKey]) {
-            trafficByHour[hourKey].threats += 1;
-          }
-        }
-      });
-      
-      setTrafficData(Object.values(trafficByHour));
+      // Live Traffic Chart (last 24 hours, oldest first)
+      setTrafficData(stats.hourly.map(bucket => ({
+        hour: hourLabel(bucket.hour),
+        packets: bucket.packets,
+        threats: bucket.threats,
+      })));
 
     } catch (error) {
       console.error("Failed to fetch dashboard data:", error);
@@ -140,31 +115,37 @@ export const Dashboard: React.FC = () => {
     const host = window.location.hostname;
     const ws = new WebSocket(`${protocol}://${host}:8000/ws/traffic/`);
 
+    // Only incidents are needed here; traffic totals come from the REST API
+    ws.onopen = () => subscribe(ws, { filters: { record_type: ['incident'] } });
+
     ws.onmessage = (event) => {
       try {
-        const msg = JSON.parse(event.data);
-        if (msg && msg._type === 'incident' && msg.data) {
-          const inc: ThreatIncident = msg.data;
-          setIncidents((prev) => {
-            const next = [inc, ...prev];
-            // Update metrics
-            const activeThreats = next.filter(i => i.status === 'Active').length;
-            const blockedIps = next.filter(i => i.status === 'Blocked').length;
-            const falsePositives = next.filter(i => i.status === 'False Positive').length;
-            setMetrics((m) => ({ ...m, activeThreats, blockedIps, falsePositives }));
-            // Update threat categories
-            const counts = next.reduce((acc: Record<string, number>, curr) => {
-              acc[curr.threat_type] = (acc[curr.threat_type] || 0) + 1;
-              return acc;
-            }, {} as Record<string, number>);
-            setThreatData(Object.keys(counts).map(key => ({ name: key, count: counts[key] })));
-            // Update threats-by-hour in traffic chart
-            setTrafficData((prevTraffic) => {
-              const d = new Date(inc.timestamp);
-              const hourKey = `${d.getHours().toString().padStart(2, '0')}:00`;
-              return prevTraffic.map(row => row.hour === hourKey ? { ...row, threats: row.threats + 1 } : row);
-            });
-            return next;
+        const incoming: ThreatIncident[] = parseLiveFrame(event.data).records
+          .filter((msg) => msg && msg._type === 'incident')
+          .map((msg) => msg.data ?? msg);
+        if (incoming.length) {
+          // Fold live incidents into the aggregates until the next stats refresh
+          const countStatus = (status: string) => incoming.filter(i => i.status === status).length;
+          setMetrics((m) => ({
+            ...m,
+            activeThreats: m.activeThreats + countStatus('Active'),
+            blockedIps: m.blockedIps + countStatus('Blocked'),
+            falsePositives: m.falsePositives + countStatus('False Positive'),
+          }));
+          setThreatData((prev) => {
+            const counts: Record<string, number> = {};
+            prev.forEach((row) => { counts[row.name] = row.count; });
+            incoming.forEach((inc) => { counts[inc.threat_type] = (counts[inc.threat_type] || 0) + 1; });
+            return Object.keys(counts).map(key => ({ name: key, count: counts[key] }));
+          });
+          // Update threats-by-hour in traffic chart
+          setTrafficData((prevTraffic) => {
+            const perHour: Record<string, number> = {};
+            for (const inc of incoming) {
+              const hourKey = hourLabel(String(inc.timestamp));
+              perHour[hourKey] = (perHour[hourKey] || 0) + 1;
+            }
+            return prevTraffic.map(row => perHour[row.hour] ? { ...row, threats: row.threats + perHour[row.hour] } : row);
           });
         }
       } catch (e) {
@@ -180,7 +161,7 @@ export const Dashboard: React.FC = () => {
     <div className="space-y-6">
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-4 gap-6">
         <MetricCard
-          title="Total Packets (1k)"
+          title="Total Packets"
           value={metrics.totalPackets.toLocaleString()}
           icon={Package}
           color="cyan"
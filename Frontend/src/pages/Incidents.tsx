@@ -1,8 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { DataTable } from '../components/UI/DataTable';
 import { Modal } from '../components/UI/Modal';
-import { ThreatIncident } from '../types';
+import { ThreatIncident, Page } from '../types';
 import { format } from 'date-fns';
 import { Eye, Shield, Ban, CheckCircle } from 'lucide-react';
 import { useToast } from '../hooks/useToast';
@@ -12,20 +12,24 @@ export const Incidents: React.FC = () => {
   const [selectedIncident, setSelectedIncident] = useState<ThreatIncident | null>(null);
   const { showToast } = useToast();
 
-  useEffect(() => {
-    const fetchIncidents = async () => {
-      try {
-        const response = await axios.get<ThreatIncident[]>('http://127.0.0.1:8000/api/incidents/');
-        setIncidents(response.data);
-      } catch (error) {
-        console.error("Failed to fetch incidents:", error);
-        showToast('error', 'Could not load incident data.');
-      }
-    };
+  // Cursor of the next (older) page, or null once everything is loaded
+  const [nextPage, setNextPage] = useState<string | null>(null);
 
-    fetchIncidents();
+  const fetchIncidents = useCallback(async (url: string, append: boolean) => {
+    try {
+      const response = await axios.get<Page<ThreatIncident>>(url);
+      setIncidents(prev => (append ? [...prev, ...response.data.results] : response.data.results));
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Failed to fetch incidents:", error);
+      showToast('error', 'Could not load incident data.');
+    }
   }, [showToast]);
 
+  useEffect(() => {
+    fetchIncidents('http://127.0.0.1:8000/api/incidents/', false);
+  }, [fetchIncidents]);
+
   const getSeverityBadge = (severity: ThreatIncident['severity']) => {
     const colors = {
       Low: 'bg-blue-500',
@@ -206,6 +210,16 @@ export const Incidents: React.FC = () => {
           searchable
           pageSize={10}
         />
+        {nextPage && (
+          <div className="mt-4 flex justify-center">
+            <button
+              onClick={() => fetchIncidents(nextPage, true)}
+              className="px-4 py-2 bg-gray-700 hover:bg-gray-600 rounded-md text-white"
+            >
+              Load older incidents
+            </button>
+          </div>
+        )}
       </div>
 
       <Modal
@@ -1,6 +1,10 @@
 import React, { useEffect, useState } from 'react';
 import { useToast } from '../hooks/useToast';
 import { Play, Pause } from 'lucide-react';
+import { LiveFeedDecoder, subscribe } from '../utils/liveFeed';
+
+// Rows kept in the live table; older rows scroll out
+const MAX_LIVE_ROWS = 1000;
 
 interface NetworkTraffic {
   id: number;
@@ -49,6 +53,7 @@ export const LiveTraffic: React.FC = () => {
   const [isPaused, setIsPaused] = useState(false);
   const [searchQuery, setSearchQuery] = useState('');
   const [isBusy, setIsBusy] = useState(false);
+  const [droppedCount, setDroppedCount] = useState(0);
 
   useEffect(() => {
     if (isPaused) {
@@ -59,15 +64,25 @@ export const LiveTraffic: React.FC = () => {
     const host = window.location.hostname;
     const port = 8000; // match Daphne server
     const ws = new WebSocket(`${protocol}://${host}:${port}/ws/traffic/`);
+    ws.binaryType = 'arraybuffer';
+    const decoder = new LiveFeedDecoder();
 
     ws.onopen = () => {
       console.log('WebSocket connected');
+      // Traffic only (incidents are shown on the dashboard), as binary msgpack frames
+      subscribe(ws, { filters: { record_type: ['traffic'] }, encoding: 'msgpack' });
       showToast('success', 'Live traffic feed connected');
     };
 
     ws.onmessage = (event) => {
-      const newTraffic = JSON.parse(event.data);
-      setTraffic((prevTraffic) => [newTraffic, ...prevTraffic]);
+      const { records, dropped } = decoder.decode<NetworkTraffic>(event.data);
+      if (dropped) {
+        setDroppedCount((count) => count + dropped);
+      }
+      if (records.length) {
+        // Records arrive oldest first; the table shows the newest first
+        setTraffic((prevTraffic) => [...records.reverse(), ...prevTraffic].slice(0, MAX_LIVE_ROWS));
+      }
     };
 
     ws.onclose = () => {
@@ -129,12 +144,17 @@ export const LiveTraffic: React.FC = () => {
   return (
     <div className="bg-gray-900 text-white p-6 rounded-lg shadow-lg">
       <div className="flex flex-col md:flex-row md:items-center md:justify-between gap-3 mb-4">
-        <h2 className="text-2xl font-bold">Live Network Traffic</h2>
+        <div>
+          <h2 className="text-2xl font-bold">Live Network Traffic</h2>
+          {droppedCount > 0 && (
+            <p className="text-xs text-yellow-400">{droppedCount} records skipped to keep the feed real-time</p>
+          )}
+        </div>
         <div className="flex items-center gap-2">
           <input
             value={searchQuery}
             onChange={(e) => setSearchQuery(e.target.value)}
-            placeholder="Search IP, protocol, status, severity"
+            placeholder="Search IP, prefix, CIDR, protocol, status, severity"
             className="px-3 py-2 bg-gray-800 rounded-md outline-none border border-gray-700 w-72"
           />
           <button
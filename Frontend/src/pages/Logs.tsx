@@ -1,7 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useCallback } from 'react';
 import axios from 'axios';
 import { DataTable } from '../components/UI/DataTable';
-import { LogEntry } from '../types';
+import { LogEntry, Page } from '../types';
 import { format } from 'date-fns';
 import { Download, Calendar } from 'lucide-react';
 import { useToast } from '../hooks/useToast';
@@ -13,20 +13,24 @@ export const Logs: React.FC = () => {
   const [actionFilter, setActionFilter] = useState('all');
   const { showToast } = useToast();
 
-  useEffect(() => {
-    const fetchLogs = async () => {
-      try {
-        const response = await axios.get<LogEntry[]>('http://127.0.0.1:8000/api/logs/');
-        setLogs(response.data);
-      } catch (error) {
-        console.error("Failed to fetch logs:", error);
-        showToast('error', 'Could not load log data.');
-      }
-    };
+  // Cursor of the next (older) page, or null once everything is loaded
+  const [nextPage, setNextPage] = useState<string | null>(null);
 
-    fetchLogs();
+  const fetchLogs = useCallback(async (url: string, append: boolean) => {
+    try {
+      const response = await axios.get<Page<LogEntry>>(url);
+      setLogs(prev => (append ? [...prev, ...response.data.results] : response.data.results));
+      setNextPage(response.data.next);
+    } catch (error) {
+      console.error("Failed to fetch logs:", error);
+      showToast('error', 'Could not load log data.');
+    }
   }, [showToast]);
 
+  useEffect(() => {
+    fetchLogs('http://127.0.0.1:8000/api/logs/', false);
+  }, [fetchLogs]);
+
   const getSeverityBadge = (severity: LogEntry['severity']) => {
     const colors = {
       Info: 'bg-blue-500',
@@ -210,6 +214,16 @@ export const Logs: React.FC = () => {
           searchable
           pageSize={15}
         />
+        {nextPage && (
+          <div className="mt-4 flex justify-center">
+            <button
+              onClick={() => fetchLogs(nextPage, true)}
+              className="px-4 py-2 bg-gray-700 hover:bg-gray-600 rounded-md text-white"
+            >
+              Load older log entries
+            </button>
+          </div>
+        )}
       </div>
 
       <div className="grid grid-cols-1 md:grid-cols-3 gap-6">
@@ -46,4 +46,10 @@ export interface LogEntry {
   result: 'Success' | 'Failed';
   details: string;
   severity: 'Info' | 'Warning' | 'Error';
-}
\ No newline at end of file
+}
+// Cursor-paginated list response (/api/traffic/, /api/incidents/, /api/logs/)
+export interface Page<T> {
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
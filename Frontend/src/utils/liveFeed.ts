@@ -0,0 +1,72 @@
+// Decoding of frames received on the live traffic WebSocket (ws/traffic/).
+//
+// The server sends {"type": "batch", "records": [...], "dropped": N} every few
+// hundred milliseconds, where N counts records discarded since the previous
+// frame because this client fell behind. Bare single-record frames are still
+// accepted.
+//
+// Clients may narrow the feed by sending a subscription (see subscribe());
+// the server acknowledges it with a "subscribed" or "error" control frame.
+// A subscription may also ask for the binary "msgpack" encoding: batches then
+// arrive as binary frames whose records are [schemaId, ...values] rows, with
+// each schema's key names sent once per connection. Use a LiveFeedDecoder
+// per connection to decode both kinds of frames.
+
+import { decodeMsgpack } from './msgpack';
+
+export interface LiveFrame<T = any> {
+  records: T[];
+  dropped: number;
+}
+
+export interface LiveSubscription {
+  filters?: {
+    protocol?: string[];
+    ip?: string[]; // addresses or CIDR networks, matched against either endpoint
+    status?: string[];
+    severity?: string[];
+    min_confidence?: number; // 0..1
+    record_type?: ('traffic' | 'incident')[];
+  };
+  fields?: string[]; // id, timestamp and _type are always sent
+  sample?: number; // fraction of traffic records to send; incidents are never sampled
+  encoding?: 'json' | 'msgpack'; // the server may fall back to json
+}
+
+export function subscribe(ws: WebSocket, subscription: LiveSubscription): void {
+  ws.send(JSON.stringify({ type: 'subscribe', ...subscription }));
+}
+
+export function parseLiveFrame<T = any>(data: string): LiveFrame<T> {
+  const msg = JSON.parse(data);
+  if (msg && msg.type === 'batch' && Array.isArray(msg.records)) {
+    return { records: msg.records, dropped: msg.dropped || 0 };
+  }
+  if (msg && (msg.type === 'subscribed' || msg.type === 'error')) {
+    if (msg.type === 'error') {
+      console.error('Live feed subscription rejected:', msg.message);
+    }
+    return { records: [], dropped: 0 };
+  }
+  return { records: [msg], dropped: 0 };
+}
+
+export class LiveFeedDecoder {
+  // Record layouts announced so far on this connection, by schema id
+  private schemas: Record<string, string[]> = {};
+
+  decode<T = any>(data: string | ArrayBuffer): LiveFrame<T> {
+    if (typeof data === 'string') {
+      return parseLiveFrame<T>(data);
+    }
+    const frame = decodeMsgpack(data);
+    Object.assign(this.schemas, frame.schemas || {});
+    const records = (frame.rows as any[][]).map((row) => {
+      const keys = this.schemas[String(row[0])];
+      const record: Record<string, any> = {};
+      for (let i = 0; i < keys.length; i++) record[keys[i]] = row[i + 1];
+      return record as T;
+    });
+    return { records, dropped: frame.dropped || 0 };
+  }
+}
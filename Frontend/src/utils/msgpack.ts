@@ -0,0 +1,96 @@
+// Minimal msgpack decoder for the binary live traffic feed.
+//
+// Covers every type the server's encoder emits (nil, booleans, integers,
+// floats, strings, binary, arrays and maps); extension types are rejected.
+
+const textDecoder = new TextDecoder();
+
+class Reader {
+  private view: DataView;
+  private bytes: Uint8Array;
+  private pos = 0;
+
+  constructor(buffer: ArrayBuffer) {
+    this.view = new DataView(buffer);
+    this.bytes = new Uint8Array(buffer);
+  }
+
+  read(): any {
+    const byte = this.view.getUint8(this.pos++);
+    if (byte <= 0x7f) return byte; // positive fixint
+    if (byte >= 0xe0) return byte - 0x100; // negative fixint
+    if ((byte & 0xf0) === 0x80) return this.map(byte & 0x0f);
+    if ((byte & 0xf0) === 0x90) return this.array(byte & 0x0f);
+    if ((byte & 0xe0) === 0xa0) return this.str(byte & 0x1f);
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return this.bin(this.uint(1));
+      case 0xc5: return this.bin(this.uint(2));
+      case 0xc6: return this.bin(this.uint(4));
+      case 0xca: return this.advance(4, () => this.view.getFloat32(this.pos));
+      case 0xcb: return this.advance(8, () => this.view.getFloat64(this.pos));
+      case 0xcc: return this.uint(1);
+      case 0xcd: return this.uint(2);
+      case 0xce: return this.uint(4);
+      case 0xcf: return this.advance(8, () => Number(this.view.getBigUint64(this.pos)));
+      case 0xd0: return this.advance(1, () => this.view.getInt8(this.pos));
+      case 0xd1: return this.advance(2, () => this.view.getInt16(this.pos));
+      case 0xd2: return this.advance(4, () => this.view.getInt32(this.pos));
+      case 0xd3: return this.advance(8, () => Number(this.view.getBigInt64(this.pos)));
+      case 0xd9: return this.str(this.uint(1));
+      case 0xda: return this.str(this.uint(2));
+      case 0xdb: return this.str(this.uint(4));
+      case 0xdc: return this.array(this.uint(2));
+      case 0xdd: return this.array(this.uint(4));
+      case 0xde: return this.map(this.uint(2));
+      case 0xdf: return this.map(this.uint(4));
+      default:
+        throw new Error(`Unsupported msgpack type 0x${byte.toString(16)}`);
+    }
+  }
+
+  private advance<T>(size: number, get: () => T): T {
+    const value = get();
+    this.pos += size;
+    return value;
+  }
+
+  private uint(size: 1 | 2 | 4): number {
+    if (size === 1) return this.advance(1, () => this.view.getUint8(this.pos));
+    if (size === 2) return this.advance(2, () => this.view.getUint16(this.pos));
+    return this.advance(4, () => this.view.getUint32(this.pos));
+  }
+
+  private str(length: number): string {
+    const value = textDecoder.decode(this.bytes.subarray(this.pos, this.pos + length));
+    this.pos += length;
+    return value;
+  }
+
+  private bin(length: number): Uint8Array {
+    const value = this.bytes.slice(this.pos, this.pos + length);
+    this.pos += length;
+    return value;
+  }
+
+  private array(length: number): any[] {
+    const value = new Array(length);
+    for (let i = 0; i < length; i++) value[i] = this.read();
+    return value;
+  }
+
+  private map(length: number): Record<string, any> {
+    const value: Record<string, any> = {};
+    for (let i = 0; i < length; i++) {
+      const key = this.read();
+      value[String(key)] = this.read();
+    }
+    return value;
+  }
+}
+
+export function decodeMsgpack(buffer: ArrayBuffer): any {
+  return new Reader(buffer).read();
+}